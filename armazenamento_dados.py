@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ARMAZENAR_DADOS = os.environ.get("ARMAZENAR_DADOS", "0") == "1"  # grava os lotes gerados/normalizados em disco (opt-in)
+CAMINHO_BANCO = os.environ.get("CAMINHO_BANCO", "dados/pipeline.sqlite")  # fora do controle de versão (.gitignore)
+TAMANHO_TRANSACAO = int(os.environ.get("TAMANHO_TRANSACAO", 50000))  # registros por transação nas inserções
+RETENCAO_HORAS = float(os.environ.get("RETENCAO_HORAS", 24 * 7))  # registros mais antigos são apagados (0 = sem limite)
+
+# Tabela -> colunas, na ordem de inserção
+TABELAS = {
+    "registros_gerados": {
+        "geracao_id": "TEXT", "timestamp": "TEXT", "nome": "TEXT", "idade": "INTEGER", "salario": "REAL",
+        "cidade": "TEXT", "estado": "TEXT", "cargo": "TEXT", "idh": "REAL", "latitude": "REAL", "longitude": "REAL",
+    },
+    # idade/salario com o scaler do lote (que muda entre lotes); os brutos permitem renormalizar na leitura
+    "registros_normalizados": {
+        "normalizacao_id": "TEXT", "geracao_id": "TEXT", "timestamp": "TEXT", "idade": "REAL", "salario": "REAL",
+        "idade_bruta": "REAL", "salario_bruto": "REAL",
+    },
+}
+
+
+class ArmazenamentoDados:
+    """Armazena os lotes do pipeline em SQLite (modo WAL) e lê janelas de tempo para o treino.
+
+    Gerador e normalizador gravam em tabelas diferentes do mesmo arquivo; o WAL permite que o
+    treinador leia de outro processo enquanto há escrita. Todo acesso passa por uma única thread
+    (`executor`), para que os serviços chamem os métodos com `run_in_executor` sem bloquear o
+    event loop.
+    """
+
+    def __init__(self, caminho=CAMINHO_BANCO):
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="armazenamento")
+        self._local = threading.local()
+        self.total_inseridos = 0
+        self.executor.submit(self._criar_esquema).result()
+
+    @property
+    def conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")  # no WAL, só o checkpoint sincroniza o disco
+            self._local.conexao = conexao
+        return conexao
+
+    def _criar_esquema(self):
+        with self.conexao:
+            for tabela, colunas in TABELAS.items():
+                definicao = ", ".join(f"{coluna} {tipo}" for coluna, tipo in colunas.items())
+                self.conexao.execute(f"CREATE TABLE IF NOT EXISTS {tabela} (id INTEGER PRIMARY KEY, {definicao})")
+                # Bancos criados por versões anteriores: acrescenta as colunas novas (linhas antigas ficam NULL)
+                existentes = {linha[1] for linha in self.conexao.execute(f"PRAGMA table_info({tabela})")}
+                for coluna, tipo in colunas.items():
+                    if coluna not in existentes:
+                        self.conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+                self.conexao.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_geracao_id ON {tabela} (geracao_id)")
+                self.conexao.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_timestamp ON {tabela} (timestamp)")
+
+    def inserir(self, tabela, df, **constantes):
+        """Insere o lote com `executemany`, em transações de até TAMANHO_TRANSACAO registros.
+
+        `constantes` preenche colunas com o mesmo valor em todas as linhas (ex.: normalizacao_id).
+        """
+        colunas = list(TABELAS[tabela])
+        dados = df.assign(**constantes)[colunas]
+        # Categóricas e NaN viram tipos nativos / None, que o sqlite3 aceita
+        dados = dados.astype(object).where(dados.notna(), None)
+        linhas = list(dados.itertuples(index=False, name=None))
+        comando = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+        for inicio in range(0, len(linhas), TAMANHO_TRANSACAO):
+            with self.conexao:
+                self.conexao.executemany(comando, linhas[inicio:inicio + TAMANHO_TRANSACAO])
+        self.total_inseridos += len(linhas)
+        if RETENCAO_HORAS > 0:
+            self.podar(tabela, (datetime.now() - timedelta(hours=RETENCAO_HORAS)).isoformat())
+        return len(linhas)
+
+    def podar(self, tabela, antes_de):
+        """Apaga os registros com timestamp anterior a `antes_de` (ISO 8601)."""
+        with self.conexao:
+            return self.conexao.execute(f"DELETE FROM {tabela} WHERE timestamp < ?", (antes_de,)).rowcount
+
+    def ler_janela(self, tabela, desde=None, ate=None, colunas=None, geracao_id=None):
+        """Registros com timestamp em [desde, ate) (ISO 8601), usando o índice de timestamp.
+
+        Sem limites, devolve a tabela inteira; `geracao_id` restringe a uma geração.
+        """
+        colunas = colunas or list(TABELAS[tabela])
+        desconhecidas = set(colunas) - set(TABELAS[tabela])
+        if desconhecidas:
+            raise ValueError(f"Colunas inexistentes em {tabela}: {sorted(desconhecidas)}")
+        condicoes, parametros = [], []
+        if desde is not None:
+            condicoes.append("timestamp >= ?")
+            parametros.append(desde)
+        if ate is not None:
+            condicoes.append("timestamp < ?")
+            parametros.append(ate)
+        if geracao_id is not None:
+            condicoes.append("geracao_id = ?")
+            parametros.append(geracao_id)
+        consulta = f"SELECT {', '.join(colunas)} FROM {tabela}"
+        if condicoes:
+            consulta += " WHERE " + " AND ".join(condicoes)
+        return pd.read_sql_query(consulta + " ORDER BY id", self.conexao, params=parametros)
+
+    def contar(self, tabela):
+        return self.conexao.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+    def fechar(self):
+        def _fechar():
+            conexao = getattr(self._local, "conexao", None)
+            if conexao is not None:
+                conexao.close()
+                self._local.conexao = None
+        self.executor.submit(_fechar).result()
+        self.executor.shutdown(wait=True)
+
+
+async def gravar_lote(armazenamento, tabela, df, **constantes):
+    """Insere o lote fora do event loop; falhas de disco são registradas sem interromper o serviço."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(armazenamento.executor, lambda: armazenamento.inserir(tabela, df, **constantes))
+    except Exception as e:
+        logger.exception(f"Falha ao gravar {len(df)} registros em {tabela}: {e}")
+        return 0
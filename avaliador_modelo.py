@@ -1,61 +1,201 @@
-import requests
-from sklearn.metrics import mean_squared_error, r2_score
-import hashlib
+import argparse
+import time
+
+import httpx
 import numpy as np
 import pandas as pd
 
-def avaliar_modelo_api(X_test, y_test):
-    """Avalia um modelo de machine learning usando a API e MSE e R².
+from cliente_http import URL_TREINADOR
+from registro_modelos import DIRETORIO_MODELOS, RegistroModelos
 
-    Args:
-        X_test (numpy.ndarray): Dados de teste (apenas a coluna 'idade').
-        y_test (numpy.ndarray): Valores reais correspondentes aos dados de teste.
+TAMANHO_BLOCO = 250_000  # registros por bloco lido/avaliado
+TAMANHO_LOTE_API = 100_000  # idades por chamada a /predict/batch
+IDADE_MAXIMA = 120  # mesma faixa aceita pelo treinador
 
-    Returns:
-        tuple: Uma tupla contendo o MSE, o R², e um relatório textual.
+
+class AcumuladorMetricas:
+    """MSE, MAE e R² acumulados bloco a bloco, sem manter o holdout inteiro em memória.
+
+    A soma dos quadrados totais do R² usa a combinação de médias e M2 por bloco (Chan et al.),
+    estável mesmo com salários grandes e milhões de registros.
     """
-    try:
-        y_pred = []
-        for idade in X_test:
-            response = requests.post("http://0.0.0.0:12779/predict", json={"idade": int(idade)})
+
+    def __init__(self):
+        self.n = 0
+        self.soma_erro_quadrado = 0.0
+        self.soma_erro_absoluto = 0.0
+        self.media_y = 0.0
+        self.m2_y = 0.0
+
+    def atualizar(self, y, y_pred):
+        y = np.asarray(y, dtype=float)
+        erro = y - np.asarray(y_pred, dtype=float)
+        self.soma_erro_quadrado += float(erro @ erro)
+        self.soma_erro_absoluto += float(np.abs(erro).sum())
+        n_bloco = len(y)
+        if not n_bloco:
+            return
+        media_bloco = float(y.mean())
+        m2_bloco = float(((y - media_bloco) ** 2).sum())
+        total = self.n + n_bloco
+        delta = media_bloco - self.media_y
+        self.media_y += delta * n_bloco / total
+        self.m2_y += m2_bloco + delta ** 2 * self.n * n_bloco / total
+        self.n = total
+
+    def resultado(self):
+        if not self.n:
+            raise ValueError("Nenhum registro avaliado")
+        return {
+            "n": self.n,
+            "mse": self.soma_erro_quadrado / self.n,
+            "mae": self.soma_erro_absoluto / self.n,
+            "r2": 1 - self.soma_erro_quadrado / self.m2_y if self.m2_y > 0 else float("nan"),
+        }
+
+
+def carregar_versao(versao=None, diretorio=DIRETORIO_MODELOS):
+    """Carrega do registro a versão pedida (ou a fixada/mais recente) como no treinador: modelo, scaler e tabela."""
+    from treinador_stream import ModeloServido  # import tardio: só o modo local precisa do treinador
+
+    registro = RegistroModelos(diretorio)
+    if versao is None:
+        candidatos = registro.candidatos()
+        if not candidatos:
+            raise FileNotFoundError(f"Nenhum modelo carregável em {diretorio}")
+        versao = candidatos[0]["versao"]
+    entrada = registro.indice["modelos"][versao]
+    # O estimador do sklearn (e não a floresta exportada): o relatório usa feature_importances_
+    return ModeloServido(registro.carregar(versao, compartilhado=False), entrada["scaler"], versao, timestamp=entrada["timestamp"])
+
+
+def prever_local(servido):
+    """Função de predição por bloco usando o modelo carregado (tabela por idade, sem HTTP)."""
+    return lambda idades: servido.prever(idades.astype(float))
+
+
+def prever_api(url=URL_TREINADOR, tamanho_lote=TAMANHO_LOTE_API):
+    """Função de predição por bloco via /predict/batch, em lotes de `tamanho_lote` idades."""
+    cliente = httpx.Client(base_url=url, timeout=60)
+
+    def prever(idades):
+        partes = []
+        for inicio in range(0, len(idades), tamanho_lote):
+            response = cliente.post("/predict/batch", json={"idades": idades[inicio:inicio + tamanho_lote].tolist()})
             response.raise_for_status()
-            predicao = response.json()["predicao"]
-            y_pred.append(predicao)
+            partes.append(np.asarray(response.json()["predicoes"], dtype=float))
+        return np.concatenate(partes) if partes else np.empty(0)
+    return prever
+
 
-        mse = mean_squared_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
+def ler_blocos(origem, tamanho_bloco=TAMANHO_BLOCO, desde=None):
+    """Itera DataFrames (idade, salario) de um arquivo Parquet/CSV ou da tabela `registros_gerados` do SQLite."""
+    colunas = ["idade", "salario"]
+    if origem.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for lote in pq.ParquetFile(origem).iter_batches(batch_size=tamanho_bloco, columns=colunas):
+            yield lote.to_pandas()
+    elif origem.endswith((".sqlite", ".db")):
+        import sqlite3
+        consulta = "SELECT idade, salario FROM registros_gerados"
+        parametros = []
+        if desde:
+            consulta += " WHERE timestamp >= ?"
+            parametros.append(desde)
+        with sqlite3.connect(origem) as conexao:
+            yield from pd.read_sql_query(consulta, conexao, params=parametros, chunksize=tamanho_bloco)
+    else:
+        yield from pd.read_csv(origem, usecols=colunas, chunksize=tamanho_bloco)
 
-        #Relatório
-        relatorio = f"""
-        Relatório de Avaliação do Modelo (via API):
 
-        MSE: {mse:.2f}
-        R²: {r2:.2f}
+def holdout_sintetico(n, tamanho_bloco=TAMANHO_BLOCO, semente=42):
+    """Holdout com a mesma distribuição do gerador (idade 18–80, salário uniforme 1000–15000)."""
+    rng = np.random.default_rng(semente)
+    for inicio in range(0, n, tamanho_bloco):
+        tamanho = min(tamanho_bloco, n - inicio)
+        yield pd.DataFrame({"idade": rng.integers(18, 81, tamanho), "salario": np.round(rng.uniform(1000, 15000, tamanho), 2)})
+
+
+def registros_validos(bloco):
+    """Descarta registros sem idade/salário ou com idade fora de 0 a IDADE_MAXIMA."""
+    bloco = bloco.dropna()
+    return bloco[(bloco["idade"] >= 0) & (bloco["idade"] <= IDADE_MAXIMA)]
+
+
+def avaliar(blocos, prever):
+    """Avalia bloco a bloco: uma predição vetorizada por bloco e métricas acumuladas.
+
+    Registros sem idade/salário ou com idade fora de 0 a IDADE_MAXIMA são ignorados.
+    """
+    acumulador = AcumuladorMetricas()
+    for bloco in blocos:
+        bloco = registros_validos(bloco)
+        idades = bloco["idade"].to_numpy(dtype=float)
+        acumulador.atualizar(bloco["salario"].to_numpy(dtype=float), prever(idades))
+    return acumulador.resultado()
+
+
+def gerar_relatorio(metricas, origem):
+    relatorio = f"""
+        Relatório de Avaliação do Modelo ({origem}):
+
+        Registros: {metricas['n']:,}
+        MSE: {metricas['mse']:.2f}
+        MAE: {metricas['mae']:.2f}
+        R²: {metricas['r2']:.4f}
 
         Avaliação:
         """
-        if mse < 1 and r2 > 0.9:
-            relatorio += "O modelo apresenta excelente performance."
-        elif mse < 5 and r2 > 0.7:
-            relatorio += "O modelo apresenta boa performance."
-        elif mse < 10 and r2 > 0.5:
-            relatorio += "O modelo apresenta performance razoável. Considerar melhorias."
-        else:
-            relatorio += "O modelo apresenta baixa performance. Necessário ajustes significativos."
-
-        return mse, r2, relatorio
-    except requests.exceptions.RequestException as e:
+    if metricas['r2'] > 0.9:
+        relatorio += "O modelo apresenta excelente performance."
+    elif metricas['r2'] > 0.7:
+        relatorio += "O modelo apresenta boa performance."
+    elif metricas['r2'] > 0.5:
+        relatorio += "O modelo apresenta performance razoável. Considerar melhorias."
+    else:
+        relatorio += "O modelo apresenta baixa performance. Necessário ajustes significativos."
+    return relatorio
+
+
+def avaliar_modelo_api(X_test, y_test):
+    """Avalia o modelo servido pelo treinador (via /predict/batch) com MSE, MAE e R².
+
+    Args:
+        X_test (numpy.ndarray): Dados de teste (apenas a coluna 'idade').
+        y_test (numpy.ndarray): Valores reais correspondentes aos dados de teste.
+
+    Returns:
+        tuple: Uma tupla contendo o MSE, o R², e um relatório textual.
+    """
+    try:
+        bloco = pd.DataFrame({"idade": np.asarray(X_test).ravel(), "salario": np.asarray(y_test).ravel()})
+        metricas = avaliar([bloco], prever_api())
+        return metricas["mse"], metricas["r2"], gerar_relatorio(metricas, "via API")
+    except httpx.HTTPError as e:
         return None, None, f"Erro ao conectar à API: {e}"
     except Exception as e:
         return None, None, f"Erro na avaliação do modelo: {e}"
 
 
-#Exemplo de uso:
-
-# Dados de teste (substitua pelos seus dados reais)
-X_test = np.linspace(20, 60, 100).reshape(-1,1) # Idade entre 20 e 60
-y_test = 2 * np.linspace(20, 60, 100) + 1 + np.random.normal(0, 100, 100) # Salário com ruído
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Avalia um modelo do registro (ou o servido pela API) em um holdout, em blocos.')
+    parser.add_argument('--versao', help='Versão em modelos/ (padrão: a fixada ou a mais recente).')
+    parser.add_argument('--diretorio', default=DIRETORIO_MODELOS, help='Diretório do registro de modelos.')
+    parser.add_argument('--api', nargs='?', const=URL_TREINADOR, help='Avalia o modelo servido em /predict/batch desta URL em vez de carregar do disco.')
+    parser.add_argument('--holdout', help='Arquivo .parquet/.csv ou banco .sqlite (registros_gerados) com idade e salario.')
+    parser.add_argument('--desde', help='Com --holdout .sqlite: só registros com timestamp >= este ISO 8601.')
+    parser.add_argument('--sintetico', type=int, default=1_000_000, help='Registros do holdout sintético quando não há --holdout.')
+    parser.add_argument('--bloco', type=int, default=TAMANHO_BLOCO, help='Registros por bloco.')
+    args = parser.parse_args()
 
-mse, r2, relatorio = avaliar_modelo_api(X_test, y_test)
+    if args.api:
+        prever, origem = prever_api(args.api), f"via API {args.api}"
+    else:
+        servido = carregar_versao(args.versao, args.diretorio)
+        prever, origem = prever_local(servido), f"modelo {servido.versao}"
+    blocos = ler_blocos(args.holdout, args.bloco, args.desde) if args.holdout else holdout_sintetico(args.sintetico, args.bloco)
 
-print(relatorio)
+    inicio = time.perf_counter()
+    metricas = avaliar(blocos, prever)
+    print(gerar_relatorio(metricas, origem))
+    print(f"\n{metricas['n']:,} registros avaliados em {time.perf_counter() - inicio:.2f} s")
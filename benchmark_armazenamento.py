@@ -0,0 +1,61 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import armazenamento_dados
+from armazenamento_dados import TABELAS, ArmazenamentoDados
+from gerador_stream import gerar_lote
+
+
+def inserir_registro_a_registro(caminho, lote):
+    """Linha de base: um INSERT e um commit por registro, journal padrão (rollback)."""
+    conexao = sqlite3.connect(caminho)
+    colunas = list(TABELAS["registros_gerados"])
+    conexao.execute(f"CREATE TABLE IF NOT EXISTS registros_gerados (id INTEGER PRIMARY KEY, {', '.join(colunas)})")
+    dados = lote[colunas].astype(object).where(lote[colunas].notna(), None)
+    comando = f"INSERT INTO registros_gerados ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    for linha in dados.itertuples(index=False, name=None):
+        conexao.execute(comando, linha)
+        conexao.commit()
+    conexao.close()
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mede a ingestão (registros/s) e a leitura por janela de tempo do armazenamento SQLite.')
+    parser.add_argument('--tamanho', type=int, default=15000, help='Registros por lote.')
+    parser.add_argument('--lotes', type=int, default=20, help='Lotes inseridos.')
+    parser.add_argument('--linha-base', type=int, default=2000, help='Registros da linha de base registro a registro (0 = pular).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        lote = gerar_lote(args.tamanho, "benchmark")
+        if args.linha_base:
+            _, segundos = cronometrar(lambda: inserir_registro_a_registro(os.path.join(diretorio, "base.sqlite"), lote.head(args.linha_base)))
+            print(f"registro a registro (commit por linha): {args.linha_base / segundos:10,.0f} registros/s")
+
+        for tamanho_transacao in (1000, 10000, armazenamento_dados.TAMANHO_TRANSACAO):
+            armazenamento_dados.TAMANHO_TRANSACAO = tamanho_transacao
+            armazenamento = ArmazenamentoDados(os.path.join(diretorio, f"wal_{tamanho_transacao}.sqlite"))
+            inicio = time.perf_counter()
+            for i in range(args.lotes):
+                # Timestamps espaçados de 1 minuto para que as janelas de tempo selecionem uma fração do histórico
+                lote["timestamp"] = (datetime.now() - timedelta(minutes=args.lotes - i)).isoformat()
+                armazenamento.inserir("registros_gerados", lote)
+            segundos = time.perf_counter() - inicio
+            print(f"WAL + executemany, {tamanho_transacao:>6} registros/transação: {args.lotes * args.tamanho / segundos:10,.0f} registros/s")
+
+        total = armazenamento.contar("registros_gerados")
+        for minutos in (1, 5, args.lotes):
+            desde = (datetime.now() - timedelta(minutes=minutos, seconds=1)).isoformat()
+            janela, segundos = cronometrar(lambda: armazenamento.ler_janela("registros_gerados", desde=desde, colunas=["idade", "salario"]))
+            print(f"janela de {minutos:>3} min: {len(janela):8,} de {total:,} registros em {segundos * 1000:7.1f} ms")
+        armazenamento.fechar()
@@ -0,0 +1,51 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from buffer_colunar import BufferColunar
+from gerador_stream import gerar_lote
+
+
+def bytes_dataframe(df):
+    return df.memory_usage(deep=True, index=True).sum()
+
+
+def pico_alocado(funcao):
+    """Executa a função e retorna (resultado, pico de memória alocada em bytes durante a chamada)."""
+    tracemalloc.start()
+    resultado = funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, pico
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara memória por registro: DataFrame substituído por inteiro vs anel colunar.')
+    parser.add_argument('--tamanho', type=int, default=15000, help='Registros por geração (TAMANHO_BUFFER).')
+    parser.add_argument('--geracoes', type=int, default=6, help='Gerações anexadas.')
+    parser.add_argument('--modo', choices=['vetorizado', 'loop'], default='vetorizado')
+    args = parser.parse_args()
+
+    lotes = [gerar_lote(args.tamanho, f"geracao-{i}", args.modo) for i in range(args.geracoes)]
+
+    # Antes: cada geração substitui o DataFrame inteiro (as duas cópias coexistem na troca)
+    objeto = lotes[-1].astype({c: object for c in lotes[-1].columns if lotes[-1][c].dtype.kind not in "if"})
+    print(f"DataFrame (strings como object): {bytes_dataframe(objeto) / len(objeto):7.1f} bytes/registro")
+    print(f"DataFrame (dtypes padrão do pandas): {bytes_dataframe(lotes[-1]) / len(lotes[-1]):7.1f} bytes/registro")
+    print(f"  pico na troca: 2 DataFrames = {2 * bytes_dataframe(lotes[-1]) / 1e6:.1f} MB")
+
+    # Depois: anel colunar com capacidade para duas gerações
+    buffer = BufferColunar(2 * args.tamanho, tipos={'idade': np.int16})
+    for lote in lotes[:-1]:
+        buffer.anexar(lote)
+    _, pico = pico_alocado(lambda: buffer.anexar(lotes[-1]))
+    print(f"Anel colunar ({len(buffer)} registros retidos): {buffer.nbytes / len(buffer):7.1f} bytes/registro "
+          f"({buffer.nbytes / 1e6:.1f} MB no total)")
+    print(f"  pico alocado ao anexar uma geração: {pico / 1e6:.1f} MB")
+
+    inicio = time.perf_counter()
+    for _ in range(100):
+        buffer.fatia(buffer.fim - args.tamanho, buffer.fim)
+    print(f"  fatia de uma geração: {(time.perf_counter() - inicio) * 10:.2f} ms")
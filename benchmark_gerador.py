@@ -0,0 +1,28 @@
+import argparse
+import time
+import uuid
+
+import gerador_stream
+
+
+def medir(modo, tamanho, repeticoes):
+    """Retorna a melhor taxa (registros/s) entre as repetições de um modo de geração."""
+    melhor = 0.0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        dados = gerador_stream.gerar_lote(tamanho, str(uuid.uuid4()), modo)
+        duracao = time.perf_counter() - inicio
+        melhor = max(melhor, len(dados) / duracao)
+    return melhor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara a taxa de geração (registros/s) dos modos do gerador.')
+    parser.add_argument('--tamanho', type=int, default=gerador_stream.TAMANHO_BUFFER, help='Registros por lote.')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Repetições por modo (vale a melhor).')
+    args = parser.parse_args()
+
+    resultados = {modo: medir(modo, args.tamanho, args.repeticoes) for modo in gerador_stream.GERADORES}
+    for modo, taxa in resultados.items():
+        print(f"{modo:>10}: {taxa:>12,.0f} registros/s")
+    print(f"Ganho vetorizado vs loop: {resultados['vetorizado'] / resultados['loop']:.1f}x")
@@ -0,0 +1,71 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from cliente_http import porta_livre
+
+# Serviço -> (variável com a URL do upstream, rota de status)
+SERVICOS = {
+    'normalizador_stream': ('URL_GERADOR', '/status'),
+    'treinador_stream': ('URL_NORMALIZADOR', '/status'),
+    'consumidor_stream': ('URL_TREINADOR', '/api/status'),
+}
+
+
+def medir_servico(modulo, duracao, intervalo):
+    """Sobe o serviço com o upstream fora do ar e mede a latência do status enquanto ele tenta se reconectar."""
+    variavel_upstream, rota = SERVICOS[modulo]
+    porta = porta_livre()
+    env = dict(os.environ, **{
+        variavel_upstream: f"http://localhost:{porta_livre()}",
+        'INTERVALO_NORMALIZACAO': '1', 'INTERVALO_TREINAMENTO': '1', 'ARMAZENAR_DADOS': '0'
+    })
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{modulo}:app', '--port', str(porta), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    latencias = []
+    try:
+        with httpx.Client(base_url=f"http://localhost:{porta}", timeout=10) as cliente:
+            limite_inicio = time.monotonic() + 30
+            while True:
+                try:
+                    cliente.get(rota)
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > limite_inicio:
+                        raise RuntimeError(f"{modulo} não iniciou em 30 segundos")
+                    time.sleep(0.2)
+
+            fim = time.monotonic() + duracao
+            while time.monotonic() < fim:
+                inicio = time.perf_counter()
+                cliente.get(rota).raise_for_status()
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                time.sleep(intervalo)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+    return np.array(latencias)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mede a latência do /status de cada serviço durante uma queda do upstream.')
+    parser.add_argument('--duracao', type=float, default=15, help='Segundos de medição por serviço.')
+    parser.add_argument('--intervalo', type=float, default=0.05, help='Pausa entre requisições (s).')
+    parser.add_argument('--limite-ms', type=float, default=500, help='Latência máxima aceitável (ms).')
+    args = parser.parse_args()
+
+    aprovado = True
+    for modulo in SERVICOS:
+        latencias = medir_servico(modulo, args.duracao, args.intervalo)
+        p50, p99, maximo = np.percentile(latencias, 50), np.percentile(latencias, 99), latencias.max()
+        ok = maximo <= args.limite_ms
+        aprovado &= ok
+        print(f"{modulo:>20}: {len(latencias)} reqs | p50 {p50:.1f} ms | p99 {p99:.1f} ms | máx {maximo:.1f} ms | {'OK' if ok else 'FALHOU'}")
+    sys.exit(0 if aprovado else 1)
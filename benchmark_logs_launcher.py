@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from logs_servicos import LogsServico, criar_pipe, drenar
+
+# Serviço "falante": uma linha de log no formato dos serviços por iteração, o mais rápido possível
+FILHO = """
+import logging, sys, time
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('servico_falante')
+inicio = time.perf_counter()
+for i in range(int(sys.argv[1])):
+    logger.info('Consumo ID: %d - Predição realizada para idade %d: %s', i, i % 80, 'x' * 80)
+print(f'{time.perf_counter() - inicio:.6f}', flush=True)
+"""
+
+
+async def iniciar_filho(linhas, stderr):
+    return await asyncio.create_subprocess_exec(
+        sys.executable, '-c', FILHO, str(linhas),
+        stdout=subprocess.PIPE, stderr=stderr
+    )
+
+
+async def medir_devnull(linhas):
+    """Linha de base: stderr descartado pelo sistema operacional."""
+    processo = await iniciar_filho(linhas, subprocess.DEVNULL)
+    saida, _ = await processo.communicate()
+    return float(saida.decode().strip())
+
+
+async def medir_pipe_sem_leitura(linhas, timeout):
+    """Como o lançador antigo: stderr em PIPE que ninguém lê. Retorna (terminou, linhas escritas)."""
+    processo = await iniciar_filho(linhas, subprocess.PIPE)
+    try:
+        await asyncio.wait_for(processo.wait(), timeout=timeout)
+        terminou = True
+    except asyncio.TimeoutError:
+        terminou = False
+        processo.kill()
+    _, erro = await processo.communicate()
+    return terminou, erro.count(b"\n")
+
+
+async def medir_drenado(linhas, diretorio):
+    """Lançador atual: stderr drenado continuamente para o arquivo rotativo e a cauda em memória.
+
+    Mede também o CPU gasto pelo lançador (leitura, parsing e a thread do arquivo) e o maior
+    atraso do event loop durante a drenagem. Com um único núcleo, esse CPU sai do tempo do filho.
+    """
+    logs = LogsServico("servico_falante", diretorio)
+    atraso_maximo = 0.0
+    ativo = True
+
+    async def relogio():
+        nonlocal atraso_maximo
+        while ativo:
+            antes = time.perf_counter()
+            await asyncio.sleep(0.01)
+            atraso_maximo = max(atraso_maximo, time.perf_counter() - antes - 0.01)
+
+    tarefa_relogio = asyncio.create_task(relogio())
+    cpu_inicio = time.process_time()
+    leitura, escrita = criar_pipe()
+    processo = await iniciar_filho(linhas, escrita)
+    os.close(escrita)
+    tarefa_stderr = asyncio.create_task(drenar(leitura, logs, "stderr"))
+    saida, _ = await processo.communicate()
+    await tarefa_stderr
+    ativo = False
+    await tarefa_relogio
+    logs.fechar()
+    return float(saida.decode().strip()), logs.total_linhas, time.process_time() - cpu_inicio, atraso_maximo
+
+
+async def main(args):
+    base = await medir_devnull(args.linhas)
+    print(f"stderr em /dev/null:    {args.linhas:,} linhas em {base:6.2f} s ({args.linhas / base:10,.0f} linhas/s)")
+
+    terminou, escritas = await medir_pipe_sem_leitura(args.linhas, args.timeout)
+    situacao = "terminou" if terminou else f"bloqueado no write após {args.timeout:.0f} s"
+    print(f"PIPE sem leitura:       {escritas:,} de {args.linhas:,} linhas escritas ({situacao})")
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        segundos, capturadas, cpu, atraso = await medir_drenado(args.linhas, diretorio)
+    print(f"PIPE drenado (lançador): {capturadas:,} linhas em {segundos:6.2f} s ({args.linhas / segundos:10,.0f} linhas/s, "
+          f"{base / segundos:.0%} da linha de base)")
+    print(f"  CPU do lançador: {cpu:.2f} s ({cpu / capturadas * 1e6:.1f} µs/linha, {os.cpu_count()} núcleo(s)) | "
+          f"maior atraso do event loop: {atraso * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mede se um serviço que loga muito é freado pelo lançador que captura sua saída.')
+    parser.add_argument('--linhas', type=int, default=200_000, help='Linhas de log escritas pelo serviço de teste.')
+    parser.add_argument('--timeout', type=float, default=5, help='Segundos de espera no cenário com PIPE sem leitura.')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,72 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import pyarrow as pa
+
+from cliente_http import porta_livre
+from memoria_compartilhada import MIME_SHM
+from transporte import ACCEPT_COLUNAR, MIME_ARROW, MIME_JSON, ler_dataframe
+
+# Transporte -> Accept enviado ao gerador
+TRANSPORTES = {
+    'http_json': MIME_JSON,
+    'http_arrow': MIME_ARROW,
+    'shm': f"{MIME_SHM}, {ACCEPT_COLUNAR}",
+}
+
+
+def medir(cliente, accept, colunas, repeticoes):
+    """Latências (ms), bytes recebidos pelo socket e bytes alocados pelo Arrow na leitura de um lote."""
+    latencias, recebidos, alocados = [], 0, 0
+    for _ in range(repeticoes):
+        antes = pa.total_allocated_bytes()
+        inicio = time.perf_counter()
+        response = cliente.get("/dados", headers={"Accept": accept})
+        response.raise_for_status()
+        df = ler_dataframe(response, colunas=colunas)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        recebidos = len(response.content)
+        alocados = pa.total_allocated_bytes() - antes
+        del df
+    return np.array(latencias), recebidos, alocados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara HTTP (JSON/Arrow) e memória compartilhada na leitura de um lote do gerador.')
+    parser.add_argument('--tamanho', type=int, default=15000, help='Registros por lote (TAMANHO_BUFFER).')
+    parser.add_argument('--repeticoes', type=int, default=30, help='Leituras por transporte.')
+    args = parser.parse_args()
+
+    porta = porta_livre()
+    env = dict(os.environ, TRANSPORTE_DADOS='shm', TAMANHO_BUFFER=str(args.tamanho), INTERVALO_GERACAO='3600', WORKERS_GERACAO='1', ARMAZENAR_DADOS='0')
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'gerador_stream:app', '--port', str(porta), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f"http://localhost:{porta}", timeout=30) as cliente:
+            limite = time.monotonic() + 60
+            while True:
+                try:
+                    if cliente.get("/dados", headers={"Accept": MIME_JSON}).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > limite:
+                    raise RuntimeError("Gerador não publicou dados em 60 segundos")
+                time.sleep(0.5)
+
+            for descricao, colunas in (("lote completo", None), ("colunas do treinador (idade, salario)", ['idade', 'salario'])):
+                print(f"{descricao}, {args.tamanho} registros:")
+                for nome, accept in TRANSPORTES.items():
+                    latencias, recebidos, alocados = medir(cliente, accept, colunas, args.repeticoes)
+                    print(f"  {nome:>10}: p50 {np.percentile(latencias, 50):7.2f} ms | p99 {np.percentile(latencias, 99):7.2f} ms | "
+                          f"{recebidos / 1e3:9.1f} KB pelo socket | {alocados / 1e3:9.1f} KB alocados pelo Arrow")
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
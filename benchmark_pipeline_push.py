@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from cliente_http import porta_livre
+
+ESTAGIOS = ['gerador_stream', 'normalizador_stream', 'treinador_stream']
+
+
+async def observar(url, chegadas):
+    """Assina /eventos do serviço e anota o instante de chegada de cada evento."""
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10, read=None)) as cliente:
+        while True:
+            try:
+                async with cliente.stream("GET", f"{url}/eventos") as response:
+                    async for linha in response.aiter_lines():
+                        if linha.startswith("event:"):
+                            chegadas.append(time.monotonic())
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+
+
+def latencias_ponta_a_ponta(geracoes, modelos):
+    """Para cada geração, tempo até o primeiro modelo servido depois dela (None se não houve)."""
+    resultado = []
+    for instante in geracoes:
+        posteriores = [m for m in modelos if m > instante]
+        resultado.append(posteriores[0] - instante if posteriores else None)
+    return resultado
+
+
+async def medir_modo(modo, args):
+    portas = {estagio: porta_livre() for estagio in ESTAGIOS}
+    urls = {estagio: f"http://localhost:{porta}" for estagio, porta in portas.items()}
+    diretorio = tempfile.mkdtemp(prefix="benchmark_push_")
+    env = dict(os.environ, **{
+        'MODO_PIPELINE': modo,
+        'URL_GERADOR': urls['gerador_stream'],
+        'URL_NORMALIZADOR': urls['normalizador_stream'],
+        'INTERVALO_GERACAO': str(args.intervalo_geracao),
+        'INTERVALO_NORMALIZACAO': str(args.intervalo_polling),
+        'INTERVALO_TREINAMENTO': str(args.intervalo_polling),
+        'TAMANHO_BUFFER': str(args.tamanho),
+        'WORKERS_GERACAO': '1',
+        'N_ESTIMADORES': '20',
+        'DIRETORIO_MODELOS': diretorio,
+        'CAMINHO_SCALER': os.path.join(diretorio, 'scaler_normalizador.joblib'),
+        'CAMINHO_BANCO': os.path.join(diretorio, 'database.sqlite'),
+    })
+    processos = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', f'{estagio}:app', '--port', str(portas[estagio]),
+             '--log-level', 'warning', '--timeout-graceful-shutdown', '1'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        for estagio in ESTAGIOS
+    ]
+    geracoes, modelos = [], []
+    observadores = [
+        asyncio.create_task(observar(urls['gerador_stream'], geracoes)),
+        asyncio.create_task(observar(urls['treinador_stream'], modelos)),
+    ]
+    try:
+        await asyncio.sleep(args.duracao)
+    finally:
+        for tarefa in observadores:
+            tarefa.cancel()
+        for processo in processos:
+            processo.terminate()
+        for processo in processos:
+            try:
+                processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+    return latencias_ponta_a_ponta(geracoes, modelos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mede a latência da geração até o novo modelo servido, em polling e em push.')
+    parser.add_argument('--duracao', type=float, default=120, help='Segundos de medição por modo.')
+    parser.add_argument('--intervalo-geracao', type=int, default=30, help='INTERVALO_GERACAO dos testes (s).')
+    parser.add_argument('--intervalo-polling', type=int, default=15, help='INTERVALO_NORMALIZACAO e INTERVALO_TREINAMENTO (s).')
+    parser.add_argument('--tamanho', type=int, default=2000, help='Registros por geração.')
+    parser.add_argument('--modos', nargs='+', default=['polling', 'push'], choices=['polling', 'push'])
+    args = parser.parse_args()
+
+    for modo in args.modos:
+        latencias = asyncio.run(medir_modo(modo, args))
+        servidas = np.array([l for l in latencias if l is not None])
+        if len(servidas) == 0:
+            print(f"{modo:>8}: {len(latencias)} gerações, nenhum modelo novo observado em {args.duracao:.0f} s")
+            continue
+        print(f"{modo:>8}: {len(servidas)}/{len(latencias)} gerações servidas | geração -> modelo: "
+              f"média {servidas.mean():.2f} s | p50 {np.percentile(servidas, 50):.2f} s | máx {servidas.max():.2f} s")
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from cliente_http import URL_TREINADOR
+from transporte import MIME_ARROW, ler_dataframe, serializar_dataframe
+
+
+def bench_unitario(cliente, idades):
+    """Uma requisição /predict por idade (caminho original)."""
+    inicio = time.perf_counter()
+    for idade in idades:
+        cliente.post("/predict", json={"idade": idade.item()}).raise_for_status()
+    return len(idades) / (time.perf_counter() - inicio)
+
+
+def bench_lote_json(cliente, idades):
+    inicio = time.perf_counter()
+    response = cliente.post("/predict/batch", json={"idades": idades.tolist()})
+    response.raise_for_status()
+    assert len(response.json()["predicoes"]) == len(idades)
+    return len(idades) / (time.perf_counter() - inicio)
+
+
+def bench_lote_arrow(cliente, idades):
+    inicio = time.perf_counter()
+    corpo = serializar_dataframe(pd.DataFrame({"idade": idades}), MIME_ARROW)
+    response = cliente.post("/predict/batch", content=corpo, headers={"Content-Type": MIME_ARROW, "Accept": MIME_ARROW})
+    response.raise_for_status()
+    assert len(ler_dataframe(response)) == len(idades)
+    return len(idades) / (time.perf_counter() - inicio)
+
+
+async def bench_concorrente(url, idades, concorrencia):
+    """Dispara /predict unitários com `concorrencia` requisições em voo; retorna (predições/s, latências em ms).
+
+    Idades inteiras são respondidas pela tabela do modelo; com idades fracionárias as
+    requisições passam pelo micro-batching.
+    """
+    latencias = []
+    fila = iter(idades)
+
+    async def trabalhador(cliente):
+        for idade in fila:
+            inicio = time.perf_counter()
+            response = await cliente.post("/predict", json={"idade": idade.item()})
+            response.raise_for_status()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limites) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[trabalhador(cliente) for _ in range(concorrencia)])
+        duracao = time.perf_counter() - inicio
+    return len(latencias) / duracao, np.array(latencias)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara predições/s do /predict unitário com o /predict/batch.')
+    parser.add_argument('--url', default=URL_TREINADOR, help='URL do treinador.')
+    parser.add_argument('--unitario', type=int, default=500, help='Predições no modo unitário.')
+    parser.add_argument('--lote', type=int, default=100_000, help='Tamanho do lote nos modos batch.')
+    parser.add_argument('--concorrencia', type=int, default=0, help='Se > 0, roda o teste de carga com /predict concorrente.')
+    parser.add_argument('--requisicoes', type=int, default=5000, help='Total de requisições no teste de carga.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng()
+    if args.concorrencia:
+        taxa, latencias = asyncio.run(bench_concorrente(args.url, rng.uniform(18, 81, args.requisicoes), args.concorrencia))  # fracionárias: mede o micro-batching
+        print(f"concorrência {args.concorrencia}: {taxa:,.0f} predições/s | "
+              f"p50 {np.percentile(latencias, 50):.1f} ms | p99 {np.percentile(latencias, 99):.1f} ms")
+        raise SystemExit(0)
+
+    with httpx.Client(base_url=args.url, timeout=60) as cliente:
+        resultados = {
+            "unitario": bench_unitario(cliente, rng.integers(18, 81, args.unitario)),
+            "lote_json": bench_lote_json(cliente, rng.integers(18, 81, args.lote)),
+            "lote_arrow": bench_lote_arrow(cliente, rng.integers(18, 81, args.lote)),
+        }
+    for modo, taxa in resultados.items():
+        print(f"{modo:>10}: {taxa:>12,.0f} predições/s ({taxa / resultados['unitario']:.0f}x)")
@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sklearn.metrics import mean_squared_error
+
+import treinador_stream
+
+
+def gerar_lote(rng, tamanho):
+    """Lote sintético já normalizado: salário depende da idade com ruído."""
+    idade = rng.normal(size=tamanho)
+    salario = 0.6 * idade + 0.3 * np.sin(2 * idade) + rng.normal(scale=0.5, size=tamanho)
+    return idade.reshape(-1, 1), salario
+
+
+def simular(modo, lotes, holdout, janela, diretorio):
+    """Treina sequencialmente sobre os lotes; retorna (tempo total em s, MSE no holdout após o último lote)."""
+    anterior = None
+    historico_x, historico_y = [], []
+    tempo = 0.0
+    for i, (X, y) in enumerate(lotes):
+        caminho = os.path.join(diretorio, f"modelo_{modo}_{i}.joblib")
+        if modo == "completo":
+            # Refit completo sobre a janela deslizante (mesma regra do treinador)
+            historico_x.append(X)
+            historico_y.append(y)
+            while len(historico_y) > 1 and sum(map(len, historico_y)) > janela:
+                historico_x.pop(0)
+                historico_y.pop(0)
+            X, y = np.concatenate(historico_x), np.concatenate(historico_y)
+        inicio = time.perf_counter()
+        treinador_stream.ajustar_e_salvar(
+            X, y, caminho, treinador_stream.N_ESTIMADORES, treinador_stream.N_JOBS_TREINO,
+            modo=modo, caminho_anterior=anterior
+        )
+        tempo += time.perf_counter() - inicio
+        anterior = caminho
+    modelo = treinador_stream.joblib.load(anterior)
+    return tempo, mean_squared_error(holdout[1], modelo.predict(holdout[0]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara refit completo com os modos incrementais do treinador.')
+    parser.add_argument('--lotes', type=int, default=10, help='Número de lotes no fluxo simulado.')
+    parser.add_argument('--tamanho', type=int, default=15000, help='Registros por lote.')
+    parser.add_argument('--janela', type=int, default=60000, help='Registros na janela do refit completo.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    lotes = [gerar_lote(rng, args.tamanho) for _ in range(args.lotes)]
+    holdout = gerar_lote(rng, 50000)
+    with tempfile.TemporaryDirectory() as diretorio:
+        for modo in ("completo", "warm_start", "sgd"):
+            tempo, mse = simular(modo, lotes, holdout, args.janela, diretorio)
+            print(f"{modo:>10}: {tempo:7.2f} s de treino em {args.lotes} lotes | MSE holdout {mse:.4f}")
@@ -0,0 +1,96 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+import numpy as np
+import pandas as pd
+import uvicorn
+from fastapi import FastAPI, Request
+
+from cliente_http import porta_livre
+from transporte import responder_dataframe
+
+# Normalizador simulado: cada requisição entrega um lote novo (ETag diferente), forçando um retreino por ciclo
+normalizador = FastAPI(title="Normalizador simulado")
+TAMANHO_LOTE = 50_000
+
+
+@normalizador.get("/status")
+async def status():
+    return {"status": "ativo"}
+
+
+@normalizador.get("/scaler")
+async def scaler():
+    return {"media": {"idade": 49.0, "salario": 8000.0}, "escala": {"idade": 18.0, "salario": 4000.0}}
+
+
+@normalizador.get("/dados_normalizados")
+async def dados(request: Request):
+    rng = np.random.default_rng()
+    df = pd.DataFrame({"idade": rng.normal(size=TAMANHO_LOTE), "salario": rng.normal(size=TAMANHO_LOTE)})
+    return responder_dataframe(df, request.headers.get("accept"), headers={"ETag": f'"{uuid.uuid4()}"'})
+
+
+def medir(em_processo, porta_normalizador, duracao):
+    """Mede a latência do /predict enquanto o treinador retreina continuamente."""
+    porta = porta_livre()
+    env = dict(os.environ, URL_NORMALIZADOR=f"http://localhost:{porta_normalizador}",
+               INTERVALO_TREINAMENTO="0", TREINO_EM_PROCESSO="1" if em_processo else "0")
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'treinador_stream:app', '--port', str(porta), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    latencias = []
+    try:
+        with httpx.Client(base_url=f"http://localhost:{porta}", timeout=60) as cliente:
+            # Aguarda o primeiro modelo
+            limite = time.monotonic() + 120
+            while time.monotonic() < limite:
+                try:
+                    if cliente.get("/status").json()["modelo_disponivel"]:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.2)
+            else:
+                raise RuntimeError("Treinador não disponibilizou modelo em 120 segundos")
+
+            treinos_inicio = cliente.get("/status").json()["total_treinamentos"]
+            fim = time.monotonic() + duracao
+            while time.monotonic() < fim:
+                inicio = time.perf_counter()
+                cliente.post("/predict", json={"idade": 40}).raise_for_status()
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            treinos = cliente.get("/status").json()["total_treinamentos"] - treinos_inicio
+    finally:
+        processo.terminate()
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:  # no modo event loop o encerramento espera o fit em andamento
+            processo.kill()
+    return np.array(latencias), treinos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latência do /predict durante retreinos: treino no event loop vs em processo separado.')
+    parser.add_argument('--duracao', type=float, default=20, help='Segundos de medição por modo.')
+    parser.add_argument('--tamanho', type=int, default=TAMANHO_LOTE, help='Registros por lote de treino.')
+    args = parser.parse_args()
+    TAMANHO_LOTE = args.tamanho
+
+    porta_normalizador = porta_livre()
+    servidor = uvicorn.Server(uvicorn.Config(normalizador, port=porta_normalizador, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+
+    for em_processo in (False, True):
+        latencias, treinos = medir(em_processo, porta_normalizador, args.duracao)
+        modo = "processo separado" if em_processo else "event loop"
+        print(f"treino no {modo:>17}: {treinos} retreinos | {len(latencias)} predições | "
+              f"p50 {np.percentile(latencias, 50):.1f} ms | p99 {np.percentile(latencias, 99):.1f} ms | máx {latencias.max():.1f} ms")
+    servidor.should_exit = True
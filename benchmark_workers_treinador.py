@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+import numpy as np
+import psutil
+
+from avaliador_modelo import holdout_sintetico
+from benchmark_predicao import bench_concorrente
+from cliente_http import porta_livre
+from modelo_compartilhado import SUFIXO_FLORESTA
+from registro_modelos import RegistroModelos
+from treinador_stream import ajustar_e_salvar
+
+logging.getLogger('httpx').setLevel(logging.WARNING)  # o import do treinador liga o logging INFO
+
+
+def preparar_registro(diretorio, registros, estimadores):
+    """Registra duas versões treinadas em dados sintéticos; retorna (mais antiga, mais recente)."""
+    registro = RegistroModelos(diretorio)
+    versoes = []
+    for semente in (1, 2):
+        df = next(holdout_sintetico(registros, semente=semente))
+        versao = f"bench-{semente}"
+        caminho = os.path.join(diretorio, f"modelo_{versao}.joblib")
+        metricas = ajustar_e_salvar(df[['idade']].values, df['salario'].values, caminho, estimadores, -1)
+        registro.registrar(versao, caminho, metricas, None)
+        versoes.append(versao)
+        time.sleep(0.01)  # timestamps distintos: a segunda é a mais recente
+    return versoes
+
+
+def carga(url, requisicoes, concorrencia):
+    """Executado em um processo cliente: /predict unitários com `concorrencia` requisições em voo."""
+    idades = np.random.default_rng().integers(18, 81, requisicoes)
+    _, latencias = asyncio.run(bench_concorrente(url, idades, concorrencia))
+    return latencias
+
+
+def aguardar_workers(url, workers, timeout=60):
+    """Espera todos os workers servirem um modelo: várias conexões novas seguidas (cada uma cai em um worker) com 200."""
+    limite = time.monotonic() + timeout
+    seguidas = 0
+    with httpx.Client(base_url=url, timeout=5, limits=httpx.Limits(max_keepalive_connections=0)) as cliente:
+        while seguidas < 5 * workers:
+            if time.monotonic() > limite:
+                raise RuntimeError(f"Treinador com {workers} worker(s) não ficou pronto em {timeout} s")
+            try:
+                seguidas = seguidas + 1 if cliente.get("/status").json()["modelo_disponivel"] else 0
+            except httpx.TransportError:
+                seguidas = 0
+                time.sleep(0.2)
+
+
+def medir_propagacao(url, versao, confirmacoes):
+    """Fixa `versao` (a requisição cai em um worker qualquer) e mede até a última resposta com a versão anterior (ms).
+
+    Termina após `confirmacoes` respostas seguidas com a versão nova. Cada /predict usa uma
+    conexão nova, distribuída pelo kernel entre os workers.
+    """
+    with httpx.Client(base_url=url, timeout=10, limits=httpx.Limits(max_keepalive_connections=0)) as cliente:
+        inicio = ultima_antiga = time.perf_counter()
+        cliente.post(f"/modelos/{versao}/fixar").raise_for_status()
+        seguidas = 0
+        while seguidas < confirmacoes:
+            response = cliente.post("/predict", json={"idade": 40})
+            response.raise_for_status()
+            if response.json()["modelo_versao"] == versao:
+                seguidas += 1
+            else:
+                seguidas, ultima_antiga = 0, time.perf_counter()
+        return (ultima_antiga - inicio) * 1000
+
+
+def memoria(processo):
+    """(RSS, PSS) somados do processo uvicorn e seus workers, em MiB; o PSS divide as páginas compartilhadas."""
+    processos = [processo] + processo.children(recursive=True)
+    rss = pss = 0
+    for p in processos:
+        info = p.memory_full_info()
+        rss += info.rss
+        pss += getattr(info, 'pss', info.rss)
+    return rss / 2**20, pss / 2**20
+
+
+def medir(workers, base, versao_antiga, args, pool):
+    with tempfile.TemporaryDirectory() as diretorio:
+        shutil.copytree(base, diretorio, dirs_exist_ok=True)
+        porta = porta_livre()
+        url = f"http://localhost:{porta}"
+        env = dict(os.environ, DIRETORIO_MODELOS=diretorio, WORKERS_TREINADOR=str(workers), INTERVALO_TREINAMENTO='3600',
+                   URL_NORMALIZADOR=f"http://localhost:{porta_livre()}", MODO_PIPELINE='polling', JANELA_TEMPO_TREINO='0')
+        processo = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'treinador_stream:app', '--port', str(porta), '--workers', str(workers), '--log-level', 'warning'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            aguardar_workers(url, workers)
+            list(pool.map(carga, [url] * args.clientes, [args.requisicoes // 10] * args.clientes, [args.concorrencia] * args.clientes))  # aquecimento
+
+            inicio = time.perf_counter()
+            partes = list(pool.map(carga, [url] * args.clientes, [args.requisicoes] * args.clientes, [args.concorrencia] * args.clientes))
+            duracao = time.perf_counter() - inicio
+            latencias = np.concatenate(partes)
+            rss, pss = memoria(psutil.Process(processo.pid))
+            propagacao = medir_propagacao(url, versao_antiga, args.confirmacoes)
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+    return len(latencias) / duracao, latencias, rss, pss, propagacao
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Mede predições/s do /predict do treinador conforme o número de workers uvicorn.')
+    parser.add_argument('--workers', default='1,2,4', help='Números de workers a medir, separados por vírgula.')
+    parser.add_argument('--clientes', type=int, default=os.cpu_count() or 1, help='Processos geradores de carga.')
+    parser.add_argument('--concorrencia', type=int, default=32, help='Requisições em voo por processo cliente.')
+    parser.add_argument('--requisicoes', type=int, default=5000, help='Requisições por processo cliente.')
+    parser.add_argument('--registros', type=int, default=15000, help='Registros de treino de cada modelo.')
+    parser.add_argument('--estimadores', type=int, default=100, help='Árvores de cada modelo.')
+    parser.add_argument('--confirmacoes', type=int, default=50, help='Respostas seguidas com a versão nova para considerar a troca propagada.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base, ProcessPoolExecutor(max_workers=args.clientes) as pool:
+        versao_antiga, _ = preparar_registro(base, args.registros, args.estimadores)
+        tamanho = sum(os.path.getsize(os.path.join(base, arquivo)) for arquivo in os.listdir(base) if arquivo.endswith('.joblib')) / 2 / 2**20
+        floresta = sum(os.path.getsize(os.path.join(base, arquivo)) for arquivo in os.listdir(base) if arquivo.endswith(SUFIXO_FLORESTA)) / 2 / 2**20
+        print(f"{os.cpu_count()} núcleo(s) | {args.clientes} processo(s) cliente × {args.concorrencia} em voo | "
+              f"modelo de {tamanho:.1f} MiB (floresta exportada: {floresta:.2f} MiB)")
+        print(f"{'workers':>7} | {'predições/s':>11} | {'escala':>6} | {'p50':>8} | {'p99':>8} | {'RSS':>9} | {'PSS':>9} | {'PSS/worker':>10} | troca propagada")
+        base_taxa = None
+        for workers in [int(n) for n in args.workers.split(',')]:
+            taxa, latencias, rss, pss, propagacao = medir(workers, base, versao_antiga, args, pool)
+            base_taxa = base_taxa or taxa
+            print(f"{workers:>7} | {taxa:>11,.0f} | {taxa / base_taxa:>5.2f}x | {np.percentile(latencias, 50):>5.1f} ms | "
+                  f"{np.percentile(latencias, 99):>5.1f} ms | {rss:>5.0f} MiB | {pss:>5.0f} MiB | {pss / workers:>6.0f} MiB | {propagacao:.0f} ms")
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+
+class ColunaDicionario:
+    """Coluna de texto codificada por dicionário: códigos int32 no anel e cada valor distinto guardado uma vez.
+
+    O código -1 representa ausente (None/NaN).
+    """
+
+    def __init__(self, capacidade):
+        self.codigos = np.full(capacidade, -1, dtype=np.int32)
+        self.valores = []
+        self.indice = {}
+        self._categorias = None  # pd.Index dos valores, reconstruído só quando o dicionário muda
+
+    def codificar(self, serie):
+        """Converte a série em códigos do dicionário global (os valores novos entram no final)."""
+        categorico = pd.Categorical(serie)
+        mapa = np.empty(len(categorico.categories), dtype=np.int32)
+        for posicao, valor in enumerate(categorico.categories):
+            codigo = self.indice.get(valor)
+            if codigo is None:
+                codigo = self.indice[valor] = len(self.valores)
+                self.valores.append(valor)
+                self._categorias = None
+            mapa[posicao] = codigo
+        codigos_lote = np.asarray(categorico.codes)
+        if not len(mapa):
+            return np.full(len(codigos_lote), -1, dtype=np.int32)
+        return np.where(codigos_lote >= 0, mapa[np.maximum(codigos_lote, 0)], -1).astype(np.int32)
+
+    @property
+    def categorias(self):
+        if self._categorias is None:
+            self._categorias = pd.Index(self.valores, dtype=object)
+        return self._categorias
+
+    def compactar(self, limite):
+        """Descarta do dicionário os valores que já não aparecem no anel (evita crescimento sem limite)."""
+        if len(self.valores) <= limite:
+            return
+        usados = np.unique(self.codigos[self.codigos >= 0])
+        remapeamento = np.full(len(self.valores), -1, dtype=np.int32)
+        remapeamento[usados] = np.arange(len(usados), dtype=np.int32)
+        validos = self.codigos >= 0
+        self.codigos[validos] = remapeamento[self.codigos[validos]]
+        self.valores = [self.valores[i] for i in usados]
+        self.indice = {valor: codigo for codigo, valor in enumerate(self.valores)}
+        self._categorias = None
+
+    @property
+    def nbytes(self):
+        return self.codigos.nbytes + sum(len(v) for v in self.valores if isinstance(v, str))
+
+
+class BufferColunar:
+    """Anel colunar pré-alocado com offsets lógicos crescentes.
+
+    Colunas numéricas ficam em arrays NumPy do mesmo dtype do primeiro lote; as demais (texto,
+    ou só None) são codificadas por dicionário. O produtor anexa lotes e os registros mais antigos
+    são sobrescritos ao passar da capacidade. `fatia` devolve views dos arrays sem cópia, exceto
+    quando o intervalo atravessa o fim do anel.
+
+    Não é thread-safe: nos serviços, escrita e leitura acontecem no event loop, e a fatia é
+    serializada antes do próximo `anexar`.
+    """
+
+    def __init__(self, capacidade, tipos=None):
+        if capacidade < 1:
+            raise ValueError("A capacidade do buffer deve ser positiva")
+        self.capacidade = capacidade
+        self.tipos = tipos or {}  # dtype forçado por coluna numérica (ex.: {'idade': np.int16})
+        self.colunas = None  # ordem das colunas, definida pelo primeiro lote
+        self.numericas = {}
+        self.dicionarios = {}
+        self.inicio = 0  # offset do registro mais antigo ainda no anel
+        self.fim = 0  # offset do próximo registro a ser escrito
+
+    def __len__(self):
+        return self.fim - self.inicio
+
+    @property
+    def vazio(self):
+        return self.fim == self.inicio
+
+    def _alocar(self, lote):
+        self.colunas = list(lote.columns)
+        for coluna in self.colunas:
+            serie = lote[coluna]
+            if coluna in self.tipos or (pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)):
+                self.numericas[coluna] = np.empty(self.capacidade, dtype=self.tipos.get(coluna, serie.dtype))
+            else:
+                self.dicionarios[coluna] = ColunaDicionario(self.capacidade)
+
+    def anexar(self, lote):
+        """Escreve o lote no anel; retorna o intervalo de offsets [inicio, fim) que ele ocupa."""
+        if self.colunas is None:
+            self._alocar(lote)
+        elif list(lote.columns) != self.colunas:
+            raise ValueError(f"Colunas do lote ({list(lote.columns)}) diferem das do buffer ({self.colunas})")
+        inicio_lote = self.fim
+        # Um lote maior que a capacidade só deixa no anel os seus últimos registros
+        descartados = max(0, len(lote) - self.capacidade)
+        valores = {}
+        for coluna in self.colunas:
+            serie = lote[coluna].iloc[descartados:]
+            if coluna in self.numericas:
+                dtype = self.numericas[coluna].dtype
+                ausente = np.nan if dtype.kind == "f" else pd.api.extensions.no_default
+                valores[coluna] = serie.to_numpy(dtype=dtype, na_value=ausente)
+            else:
+                valores[coluna] = self.dicionarios[coluna].codificar(serie)
+
+        escrever_de = self.fim + descartados
+        for destino, origem in self._segmentos(escrever_de, escrever_de + len(lote) - descartados):
+            for coluna, array in valores.items():
+                alvo = self.numericas[coluna] if coluna in self.numericas else self.dicionarios[coluna].codigos
+                alvo[destino] = array[origem]
+
+        self.fim += len(lote)
+        self.inicio = max(self.inicio, self.fim - self.capacidade)
+        for dicionario in self.dicionarios.values():
+            dicionario.compactar(2 * self.capacidade)
+        return inicio_lote, self.fim
+
+    def _segmentos(self, inicio, fim):
+        """Pares (slice no anel, slice relativo ao intervalo) que cobrem os offsets [inicio, fim)."""
+        posicao = inicio % self.capacidade
+        total = fim - inicio
+        primeiro = min(total, self.capacidade - posicao)
+        segmentos = [(slice(posicao, posicao + primeiro), slice(0, primeiro))]
+        if primeiro < total:
+            segmentos.append((slice(0, total - primeiro), slice(primeiro, total)))
+        return segmentos
+
+    def _coluna(self, coluna, segmentos):
+        if coluna in self.numericas:
+            partes = [self.numericas[coluna][destino] for destino, _ in segmentos]
+            return partes[0] if len(partes) == 1 else np.concatenate(partes)
+        dicionario = self.dicionarios[coluna]
+        partes = [dicionario.codigos[destino] for destino, _ in segmentos]
+        codigos = partes[0] if len(partes) == 1 else np.concatenate(partes)
+        return pd.Categorical.from_codes(codigos, categories=dicionario.categorias, validate=False)
+
+    def fatia(self, inicio=None, fim=None):
+        """DataFrame com os registros dos offsets [inicio, fim), limitado ao que ainda está no anel.
+
+        Colunas de texto voltam como `Categorical` sobre o dicionário (sem recriar as strings).
+        """
+        inicio = self.inicio if inicio is None else max(inicio, self.inicio)
+        fim = self.fim if fim is None else min(fim, self.fim)
+        if self.colunas is None or fim <= inicio:
+            return pd.DataFrame(columns=self.colunas or [])
+        segmentos = self._segmentos(inicio, fim)
+        return pd.DataFrame({coluna: self._coluna(coluna, segmentos) for coluna in self.colunas}, copy=False)
+
+    @property
+    def nbytes(self):
+        """Bytes ocupados: arrays do anel mais o texto dos dicionários."""
+        return sum(a.nbytes for a in self.numericas.values()) + sum(d.nbytes for d in self.dicionarios.values())
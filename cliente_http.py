@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import os
+import socket
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# URLs dos serviços (sobrescrevíveis para rodar com as portas do stream_pipeline_launcher)
+URL_GERADOR = os.environ.get("URL_GERADOR", "http://localhost:8001")
+URL_NORMALIZADOR = os.environ.get("URL_NORMALIZADOR", "http://localhost:8002")
+URL_TREINADOR = os.environ.get("URL_TREINADOR", "http://localhost:12779")
+
+TIMEOUT_HTTP = float(os.environ.get("TIMEOUT_HTTP", 5))  # segundos por chamada
+ESPERA_INICIAL = float(os.environ.get("ESPERA_INICIAL", 1))  # backoff: primeira espera (s)
+ESPERA_MAXIMA = float(os.environ.get("ESPERA_MAXIMA", 10))  # backoff: teto da espera (s)
+MAX_CONEXOES = int(os.environ.get("MAX_CONEXOES", 20))
+
+
+def espera_backoff(tentativa):
+    """Espera exponencial (com teto) antes da próxima tentativa."""
+    return min(ESPERA_MAXIMA, ESPERA_INICIAL * 2 ** tentativa)
+
+
+def porta_livre():
+    """Reserva e libera uma porta local (usada pelos benchmarks como upstream inexistente ou porta de um serviço)."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+class ClienteServico:
+    """Cliente HTTP assíncrono de longa duração, com pool de conexões keep-alive, para um serviço do pipeline."""
+
+    def __init__(self, base_url, timeout=TIMEOUT_HTTP):
+        self.base_url = base_url
+        self._cliente = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=MAX_CONEXOES, max_keepalive_connections=MAX_CONEXOES)
+        )
+
+    async def get(self, caminho, **kwargs):
+        return await self._cliente.get(caminho, **kwargs)
+
+    async def post(self, caminho, **kwargs):
+        return await self._cliente.post(caminho, **kwargs)
+
+    def stream(self, metodo, caminho, **kwargs):
+        """Resposta em streaming (ex.: Server-Sent Events), sem timeout de leitura."""
+        kwargs.setdefault("timeout", httpx.Timeout(self._cliente.timeout.connect, read=None))
+        return self._cliente.stream(metodo, caminho, **kwargs)
+
+    async def requisitar(self, metodo, caminho, tentativas=3, **kwargs):
+        """Executa a requisição com retry e backoff não bloqueante.
+
+        Repete em erros de transporte e respostas 5xx; respostas < 500 são devolvidas ao chamador.
+        """
+        for tentativa in range(tentativas):
+            try:
+                response = await self._cliente.request(metodo, caminho, **kwargs)
+                if response.status_code < 500:
+                    return response
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                if tentativa == tentativas - 1:
+                    raise
+                espera = espera_backoff(tentativa)
+                logger.warning(f"{metodo} {self.base_url}{caminho} falhou: {e}. Tentativa {tentativa+1}/{tentativas}. Tentando novamente em {espera:.1f} segundos...")
+                await asyncio.sleep(espera)
+
+    async def fechar(self):
+        await self._cliente.aclose()
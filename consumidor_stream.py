@@ -1,13 +1,16 @@
 import uvicorn
 from fastapi import FastAPI, HTTPException
-import requests
+import httpx
 import asyncio
 import logging
 from datetime import datetime
 from pydantic import BaseModel
 import random
 import uuid
-import time
+import os
+from cliente_http import ClienteServico, URL_TREINADOR, espera_backoff
+from eventos import MODO_PIPELINE, Gatilho, assinar_eventos
+from metricas import RegistroMetricas, instrumentar
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -15,6 +18,8 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Consumidor")
 
+INTERVALO_CONSUMO = int(os.environ.get("INTERVALO_CONSUMO", 60)) # segundos
+
 class EstadoConsumidor:
     """Armazena o estado do consumidor."""
     def __init__(self):
@@ -22,8 +27,12 @@ class EstadoConsumidor:
         self.total_consumos = 0
         self.ultima_tentativa = None
         self.erros = 0
+        self.cliente_treinador = None
+        self.gatilho = Gatilho()  # em modo push, disparado a cada novo modelo do treinador
+        self.metricas = RegistroMetricas("consumidor")  # exposto em /metrics
 
 estado = EstadoConsumidor()
+instrumentar(app, estado.metricas)
 
 class StatusResponse(BaseModel):
     """Modelo para a resposta de status."""
@@ -46,11 +55,12 @@ async def consumir_predicoes():
             treinador_ativo = await verificar_status_treinador()
             if not treinador_ativo:
                 logger.error(f"Treinador indisponível após múltiplas tentativas.")
-                await asyncio.sleep(60)
+                await estado.gatilho.aguardar(INTERVALO_CONSUMO)
                 continue
 
             # Tenta consumir a predição com tratamento de exceções e retry
-            resultado = await consumir_predicao(idade, consumo_id)
+            with estado.metricas.cronometrar("consumo"):
+                resultado = await consumir_predicao(idade, consumo_id)
             if resultado:
                 estado.ultima_predicao = resultado['predicao']
                 estado.total_consumos += 1
@@ -63,45 +73,49 @@ async def consumir_predicoes():
             estado.erros += 1
             logger.exception(f"Consumo ID: {consumo_id} - Erro inesperado ao consumir modelo: {e}")
 
-        await asyncio.sleep(60)
+        await estado.gatilho.aguardar(INTERVALO_CONSUMO)
 
 async def verificar_status_treinador():
     """Verifica o status do treinador com retry."""
     for attempt in range(3):
         try:
-            status_response = requests.get("http://localhost:12779/status", timeout=5)
+            status_response = await estado.cliente_treinador.get("/status")
             status_response.raise_for_status()
             status = status_response.json()
             if status["status"] == "ativo":
                 return True
-            logger.warning(f"Treinador indisponível. Tentativa {attempt+1}/3. Tentando novamente em 5 segundos...")
-            time.sleep(5)
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Erro ao verificar status do treinador: {e}. Tentando novamente em 5 segundos...")
-            time.sleep(5)
+            logger.warning(f"Treinador indisponível. Tentativa {attempt+1}/3. Tentando novamente em {espera_backoff(attempt):.1f} segundos...")
+            await asyncio.sleep(espera_backoff(attempt))
+        except httpx.HTTPError as e:
+            logger.warning(f"Erro ao verificar status do treinador: {e}. Tentando novamente em {espera_backoff(attempt):.1f} segundos...")
+            await asyncio.sleep(espera_backoff(attempt))
     return False
 
 async def consumir_predicao(idade, consumo_id):
     """Consome a predição do treinador com retry."""
     for attempt in range(3):
         try:
-            response = requests.post(
-                "http://localhost:12779/predict",
-                json={"idade": idade},
-                timeout=5
-            )
+            response = await estado.cliente_treinador.post("/predict", json={"idade": idade})
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Consumo ID: {consumo_id} - Tentativa {attempt+1}/3 falhou: {e}. Tentando novamente em 5 segundos...")
-            time.sleep(5)
+        except httpx.HTTPError as e:
+            logger.warning(f"Consumo ID: {consumo_id} - Tentativa {attempt+1}/3 falhou: {e}. Tentando novamente em {espera_backoff(attempt):.1f} segundos...")
+            await asyncio.sleep(espera_backoff(attempt))
     return None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Inicia a tarefa de consumir predições ao iniciar o aplicativo."""
+    estado.cliente_treinador = ClienteServico(URL_TREINADOR)
     asyncio.create_task(consumir_predicoes())
+    if MODO_PIPELINE == "push":
+        asyncio.create_task(assinar_eventos(estado.cliente_treinador, estado.gatilho))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Fecha o pool de conexões com o treinador."""
+    await estado.cliente_treinador.fechar()
 
 @app.get("/api/status", response_model=StatusResponse)
 async def get_status():
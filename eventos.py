@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+from fastapi.responses import StreamingResponse
+
+from cliente_http import espera_backoff
+
+logger = logging.getLogger(__name__)
+
+# "polling": cada estágio acorda no seu intervalo fixo; "push": acorda assim que o estágio anterior avisa
+MODO_PIPELINE = os.environ.get("MODO_PIPELINE", "polling")
+KEEPALIVE_EVENTOS = float(os.environ.get("KEEPALIVE_EVENTOS", 15))  # segundos entre comentários de keep-alive no SSE
+MAX_EVENTOS_PENDENTES = 100  # por assinante; os mais antigos são descartados se ele não acompanhar
+
+
+class CanalEventos:
+    """Publica eventos do serviço para os assinantes conectados em `/eventos` (Server-Sent Events)."""
+
+    def __init__(self):
+        self.assinantes = set()
+        self.total_publicados = 0
+
+    def publicar(self, nome, dados):
+        mensagem = f"event: {nome}\ndata: {json.dumps(dados)}\n\n"
+        for fila in self.assinantes:
+            if fila.full():
+                fila.get_nowait()
+            fila.put_nowait(mensagem)
+        self.total_publicados += 1
+
+    def fechar(self):
+        """Encerra os streams abertos (usado no shutdown do serviço)."""
+        for fila in self.assinantes:
+            if fila.full():
+                fila.get_nowait()
+            fila.put_nowait(None)
+
+    async def _stream(self):
+        fila = asyncio.Queue(maxsize=MAX_EVENTOS_PENDENTES)
+        self.assinantes.add(fila)
+        try:
+            yield ": conectado\n\n"
+            while True:
+                try:
+                    mensagem = await asyncio.wait_for(fila.get(), KEEPALIVE_EVENTOS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if mensagem is None:
+                    break
+                yield mensagem
+        finally:
+            self.assinantes.discard(fila)
+
+    def resposta(self):
+        return StreamingResponse(
+            self._stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+
+class Gatilho:
+    """Acorda o laço de um estágio: por aviso do estágio anterior (push) ou ao fim do intervalo (polling)."""
+
+    def __init__(self):
+        self._evento = asyncio.Event()
+        self.disparos = 0
+
+    def disparar(self):
+        self.disparos += 1
+        self._evento.set()
+
+    async def aguardar(self, intervalo):
+        """Espera um disparo ou `intervalo` segundos, o que vier primeiro.
+
+        Em modo polling ninguém dispara e isto equivale a `asyncio.sleep(intervalo)`; em push o
+        intervalo continua valendo como rede de segurança caso um aviso se perca.
+        """
+        try:
+            await asyncio.wait_for(self._evento.wait(), intervalo)
+        except asyncio.TimeoutError:
+            pass
+        self._evento.clear()
+
+
+async def assinar_eventos(cliente, gatilho, caminho="/eventos"):
+    """Mantém a assinatura SSE no estágio anterior e dispara o gatilho a cada evento recebido.
+
+    Ao (re)conectar dispara uma vez, para recuperar o que tenha sido publicado enquanto a conexão
+    estava fora; como os estágios leem com cursor/ETag, um disparo sem novidade custa um 304.
+    """
+    tentativa = 0
+    while True:
+        try:
+            async with cliente.stream("GET", caminho) as response:
+                response.raise_for_status()
+                logger.info(f"Assinatura de eventos ativa em {cliente.base_url}{caminho}")
+                tentativa = 0
+                gatilho.disparar()
+                async for linha in response.aiter_lines():
+                    if linha.startswith("data:"):
+                        gatilho.disparar()
+            logger.warning(f"Stream de eventos de {cliente.base_url} encerrado pelo servidor")
+        except httpx.HTTPError as e:
+            logger.warning(f"Assinatura de eventos em {cliente.base_url}{caminho} falhou: {e}. Reconectando em {espera_backoff(tentativa):.1f} segundos...")
+        await asyncio.sleep(espera_backoff(tentativa))
+        tentativa += 1
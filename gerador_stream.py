@@ -1,5 +1,5 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Query
 from faker import Faker
 import pandas as pd
 import asyncio
@@ -9,6 +9,15 @@ import random
 from pydantic import BaseModel
 import os
 import uuid
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from transporte import responder_dataframe, responder_referencia_shm
+from memoria_compartilhada import PublicadorShm, aceita_shm, shm_ativo
+from armazenamento_dados import ARMAZENAR_DADOS, ArmazenamentoDados, gravar_lote
+from eventos import CanalEventos
+from buffer_colunar import BufferColunar
+from metricas import RegistroMetricas, instrumentar
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -20,6 +29,10 @@ app = FastAPI(title="Gerador de Dados")
 fake = Faker('pt_BR')
 TAMANHO_BUFFER = int(os.environ.get("TAMANHO_BUFFER", 15000)) # Aumentando o buffer para 15000
 INTERVALO_GERACAO = int(os.environ.get("INTERVALO_GERACAO", 300))  # segundos (5 minutos)
+MODO_GERACAO = os.environ.get("MODO_GERACAO", "vetorizado")  # "vetorizado" ou "loop"
+TAMANHO_VOCABULARIO = int(os.environ.get("TAMANHO_VOCABULARIO", 5000))  # nomes pré-gerados para o modo vetorizado
+WORKERS_GERACAO = int(os.environ.get("WORKERS_GERACAO", os.cpu_count() or 1))  # processos do pool de geração
+CAPACIDADE_BUFFER = int(os.environ.get("CAPACIDADE_BUFFER", 2 * TAMANHO_BUFFER))  # registros mantidos no anel (últimas gerações)
 
 # Carregando dados geográficos do Brasil (substitua pelo seu caminho)
 logger.warning("Leitura de shapefile desabilitada conforme solicitação do usuário. Usando dados sintéticos.")
@@ -28,12 +41,24 @@ cidades = pd.DataFrame({'cidade': [fake.city() for _ in range(15000)], 'geometry
 
 class EstadoGerador:
     def __init__(self):
-        self.dados_atuais = pd.DataFrame()
+        # Anel colunar com as gerações recentes; o buffer atual é a última geração anexada
+        self.buffer = BufferColunar(CAPACIDADE_BUFFER, tipos={'idade': np.int16})
         self.ultima_geracao = None
         self.total_geracoes = 0
         self.registros_gerados = 0
+        self.pool = None
+        # Log sequencial: a última geração cobre os offsets [offset_inicial, offset_final)
+        self.geracao_id = None
+        self.execucao_id = uuid.uuid4().hex  # muda a cada início do processo: offsets de outra execução não valem aqui
+        self.offset_inicial = 0
+        self.offset_final = 0
+        self.eventos = CanalEventos()  # avisa os assinantes de /eventos a cada nova geração
+        self.publicador = PublicadorShm("gerador") if shm_ativo() else None  # cópia Arrow das gerações em memória compartilhada
+        self.armazenamento = None  # ArmazenamentoDados (SQLite) com o histórico das gerações
+        self.metricas = RegistroMetricas("gerador")  # exposto em /metrics
 
 estado = EstadoGerador()
+instrumentar(app, estado.metricas)
 
 class StatusResponse(BaseModel):
     status: str
@@ -41,42 +66,130 @@ class StatusResponse(BaseModel):
     total_geracoes: int
     registros_atuais: int
 
+# Vocabulários pré-construídos para o modo vetorizado (amostrados via índices NumPy)
+vocab_nomes = np.array([fake.name() for _ in range(TAMANHO_VOCABULARIO)], dtype=object)
+vocab_cargos = np.array(sorted(set(fake.job() for _ in range(TAMANHO_VOCABULARIO))), dtype=object)
+vocab_estados = np.array(sorted(set(fake.state() for _ in range(1000))), dtype=object)
+vocab_cidades = cidades["cidade"].to_numpy(dtype=object)
+rng = np.random.default_rng()
+
+
+def gerar_lote_loop(tamanho, geracao_id):
+    """Gera o lote registro a registro com Faker (caminho original)."""
+    dados = []
+    for _ in range(tamanho):
+        cidade = random.choice(cidades["cidade"])
+        # Dados sintéticos de IDH (substitua por dados reais se disponíveis)
+        idh = round(random.uniform(0.5, 0.9), 2)
+
+        # Dados geográficos (latitude e longitude aproximadas)
+        latitude = None
+        longitude = None
+
+        registro = {
+            'nome': fake.name(),
+            'idade': fake.random_int(18, 80),
+            'salario': round(random.uniform(1000, 15000), 2),
+            'cidade': cidade,
+            'estado': fake.state(), # adicionando estado
+            #'regiao': fake.region(), # removendo região
+            'cargo': fake.job(),
+            'idh': idh, # adicionando IDH
+            'latitude': latitude, # adicionando latitude
+            'longitude': longitude, # adicionando longitude
+            'timestamp': datetime.now().isoformat(),
+            'geracao_id': geracao_id
+        }
+        dados.append(registro)
+    return pd.DataFrame(dados)
+
+
+def timestamps_lote(inicio, tamanho):
+    """Um timestamp ISO 8601 por registro: `inicio` mais deslocamentos crescentes até agora.
+
+    Reparte o tempo gasto na geração entre os registros, como no modo loop, em que cada registro
+    recebe o próprio datetime.now(); com pelo menos 1 µs entre registros vizinhos, a ordem se mantém.
+    """
+    inicio = np.datetime64(inicio, 'us')
+    decorrido = int((np.datetime64(datetime.now(), 'us') - inicio) / np.timedelta64(1, 'us'))
+    deslocamentos = np.linspace(0, max(decorrido, tamanho - 1), tamanho).astype(np.int64)
+    return np.datetime_as_string(inicio + deslocamentos.astype('timedelta64[us]'), unit='us')
+
+
+def gerar_lote_vetorizado(tamanho, geracao_id):
+    """Gera o lote coluna a coluna, amostrando os vocabulários com arrays de índices."""
+    inicio = datetime.now()
+    dados = pd.DataFrame({
+        'nome': vocab_nomes[rng.integers(0, len(vocab_nomes), tamanho)],
+        'idade': rng.integers(18, 81, tamanho),
+        'salario': np.round(rng.uniform(1000, 15000, tamanho), 2),
+        'cidade': vocab_cidades[rng.integers(0, len(vocab_cidades), tamanho)],
+        'estado': vocab_estados[rng.integers(0, len(vocab_estados), tamanho)],
+        'cargo': vocab_cargos[rng.integers(0, len(vocab_cargos), tamanho)],
+        'idh': np.round(rng.uniform(0.5, 0.9, tamanho), 2),
+        'latitude': None,
+        'longitude': None,
+        'geracao_id': geracao_id
+    })
+    dados.insert(len(dados.columns) - 1, 'timestamp', timestamps_lote(inicio, tamanho))
+    return dados
+
+
+GERADORES = {
+    "loop": gerar_lote_loop,
+    "vetorizado": gerar_lote_vetorizado,
+}
+
+
+def gerar_lote(tamanho, geracao_id, modo=None):
+    modo = modo or MODO_GERACAO
+    if modo not in GERADORES:
+        raise ValueError(f"MODO_GERACAO inválido: {modo}. Use um de {list(GERADORES)}")
+    return GERADORES[modo](tamanho, geracao_id)
+
+
+def _inicializar_worker():
+    """Ressemeia os geradores aleatórios de cada processo do pool, para que não repitam a mesma sequência."""
+    global rng
+    rng = np.random.default_rng()
+    random.seed()
+    fake.seed_instance()
+
+
+async def gerar_buffer(tamanho, geracao_id):
+    """Divide o buffer em shards, gera cada um em um processo do pool e junta o resultado."""
+    shards = [len(s) for s in np.array_split(np.arange(tamanho), WORKERS_GERACAO) if len(s)]
+    loop = asyncio.get_running_loop()
+    partes = await asyncio.gather(*[
+        loop.run_in_executor(estado.pool, gerar_lote, shard, geracao_id, MODO_GERACAO)
+        for shard in shards
+    ])
+    return pd.concat(partes, ignore_index=True)
+
+
 async def gerar_dados_background():
     while True:
         try:
             geracao_id = str(uuid.uuid4())
-            dados = []
-            for _ in range(TAMANHO_BUFFER):
-                cidade = random.choice(cidades["cidade"])
-                # Dados sintéticos de IDH (substitua por dados reais se disponíveis)
-                idh = round(random.uniform(0.5, 0.9), 2)  
-                
-                # Dados geográficos (latitude e longitude aproximadas)
-                latitude = None
-                longitude = None
-
-                registro = {
-                    'nome': fake.name(),
-                    'idade': fake.random_int(18, 80),
-                    'salario': round(random.uniform(1000, 15000), 2),
-                    'cidade': cidade,
-                    'estado': fake.state(), # adicionando estado
-                    #'regiao': fake.region(), # removendo região
-                    'cargo': fake.job(),
-                    'idh': idh, # adicionando IDH
-                    'latitude': latitude, # adicionando latitude
-                    'longitude': longitude, # adicionando longitude
-                    'timestamp': datetime.now().isoformat(),
-                    'geracao_id': geracao_id
-                }
-                dados.append(registro)
-
-            estado.dados_atuais = pd.DataFrame(dados)
+            with estado.metricas.cronometrar("geracao"):
+                dados = await gerar_buffer(TAMANHO_BUFFER, geracao_id)
+
+            # Anexa ao anel sem await no meio: /dados nunca vê uma geração pela metade
+            estado.offset_inicial, estado.offset_final = estado.buffer.anexar(dados)
+            estado.geracao_id = geracao_id
+            if estado.publicador is not None:
+                # Mesma fatia do anel que /dados serve por HTTP (categóricas e tipos compactos), não o lote bruto
+                publicado = max(estado.offset_inicial, estado.buffer.inicio)
+                estado.publicador.publicar(estado.buffer.fatia(publicado, estado.offset_final), publicado)
+                estado.publicador.descartar_anteriores(estado.buffer.inicio)
             estado.ultima_geracao = datetime.now().isoformat()
             estado.total_geracoes += 1
             estado.registros_gerados += len(dados)
+            estado.eventos.publicar("dados", {"geracao_id": geracao_id, "offset_final": estado.offset_final, "timestamp": estado.ultima_geracao})
 
-            logger.info(f"Geração ID: {geracao_id}, Gerados {len(dados)} novos registros. Tamanho do buffer: {TAMANHO_BUFFER}, Intervalo de geração: {INTERVALO_GERACAO} segundos. Total de registros gerados: {estado.registros_gerados}")
+            logger.info(f"Geração ID: {geracao_id}, Gerados {len(dados)} novos registros (modo {MODO_GERACAO}, {WORKERS_GERACAO} workers). Tamanho do buffer: {TAMANHO_BUFFER}, Intervalo de geração: {INTERVALO_GERACAO} segundos. Total de registros gerados: {estado.registros_gerados}")
+            if estado.armazenamento is not None:
+                await gravar_lote(estado.armazenamento, "registros_gerados", dados)
 
         except Exception as e:
             logger.exception(f"Erro na geração de dados: {str(e)}") # Log com traceback
@@ -85,13 +198,64 @@ async def gerar_dados_background():
 
 @app.on_event("startup")
 async def startup_event():
+    # spawn, como no treinador: fork dentro do event loop em execução copiaria o loop, threads e sockets do servidor
+    estado.pool = ProcessPoolExecutor(max_workers=WORKERS_GERACAO, initializer=_inicializar_worker,
+                                      mp_context=multiprocessing.get_context("spawn"))
+    if ARMAZENAR_DADOS:
+        estado.armazenamento = ArmazenamentoDados()
     asyncio.create_task(gerar_dados_background())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    estado.eventos.fechar()
+    if estado.publicador is not None:
+        estado.publicador.fechar()
+    if estado.armazenamento is not None:
+        estado.armazenamento.fechar()
+    if estado.pool is not None:
+        estado.pool.shutdown(wait=False, cancel_futures=True)
+
 @app.get("/dados")
-async def get_dados():
-    if estado.dados_atuais.empty:
+async def get_dados(
+    request: Request,
+    since: int | None = Query(None, ge=0, description="Offset a partir do qual retornar registros"),
+    limit: int | None = Query(None, ge=1, description="Máximo de registros retornados"),
+    execucao: str | None = Query(None, description="X-Execucao da resposta em que o cursor `since` foi obtido")
+):
+    if estado.buffer.vazio:
         raise HTTPException(status_code=503, detail="Dados ainda não gerados")
-    return estado.dados_atuais.to_dict(orient='records')
+
+    etag = f'"{estado.execucao_id}:{estado.geracao_id}"'
+    headers = {"ETag": etag, "X-Offset-Final": str(estado.offset_final), "X-Execucao": estado.execucao_id}
+
+    if since is None:
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        inicio = estado.offset_inicial
+    elif (execucao is not None and execucao != estado.execucao_id) or since > estado.offset_final:
+        # Cursor de uma execução anterior do gerador (os offsets recomeçaram do zero): recomeça da geração atual
+        inicio = estado.offset_inicial
+    else:
+        # Registros que já saíram do anel foram descartados
+        inicio = max(since, estado.buffer.inicio)
+
+    if inicio >= estado.offset_final:
+        return Response(status_code=304, headers=headers)
+
+    fim = estado.offset_final if limit is None else min(inicio + limit, estado.offset_final)
+    headers["X-Offset-Inicio"] = str(inicio)
+    headers["X-Proximo-Offset"] = str(fim)
+    if estado.publicador is not None and aceita_shm(request.headers.get("accept")):
+        segmentos = estado.publicador.referencia(inicio, fim)
+        if segmentos is not None:
+            return responder_referencia_shm(segmentos, headers=headers)
+    dados = estado.buffer.fatia(inicio, fim)
+    return responder_dataframe(dados, request.headers.get("accept"), headers=headers)
+
+@app.get("/eventos")
+async def get_eventos():
+    """Stream SSE com um evento `dados` a cada nova geração (usado pelo normalizador em modo push)."""
+    return estado.eventos.resposta()
 
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
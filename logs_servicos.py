@@ -0,0 +1,133 @@
+import asyncio
+import fcntl
+import logging
+import os
+import queue
+import re
+from collections import deque
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+DIRETORIO_LOGS = os.environ.get("DIRETORIO_LOGS", "logs")  # um arquivo rotativo por serviço
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))  # tamanho de cada arquivo antes de rotacionar
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", 5))  # arquivos rotacionados mantidos por serviço
+LINHAS_TAIL = int(os.environ.get("LINHAS_TAIL", 1000))  # últimas linhas por serviço mantidas em memória
+LIMITE_LINHA = 1024 * 1024  # bytes; linhas maiores são registradas em pedaços
+TAMANHO_LEITURA = 256 * 1024  # bytes lidos do pipe por vez
+TAMANHO_PIPE = int(os.environ.get("TAMANHO_PIPE", 1024 * 1024))  # buffer do pipe de cada filho (Linux; até /proc/sys/fs/pipe-max-size)
+INTERVALO_DRENAGEM = float(os.environ.get("INTERVALO_DRENAGEM", 0.02))  # segundos entre leituras de um pipe vazio
+
+NIVEIS = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+# "2024-11-06 06:58:52,083 - gerador_stream - INFO - mensagem" (basicConfig dos serviços)
+PADRAO_LOGGING = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d+ - (?P<origem>\S+) - (?P<nivel>[A-Z]+) - (?P<mensagem>.*)$")
+# "INFO:     Started server process [123]" (uvicorn)
+PADRAO_UVICORN = re.compile(r"^(?P<nivel>[A-Z]+):\s+(?P<mensagem>.*)$")
+
+
+class LogsServico:
+    """Destino da saída de um serviço filho: arquivo rotativo e cauda em memória.
+
+    Cada linha vira um registro estruturado (timestamp, serviço, fluxo, nível, origem,
+    mensagem). O nível e a origem vêm do formato de log dos serviços ou do uvicorn; linhas
+    sem formato (tracebacks, prints) herdam o nível da linha anterior do mesmo fluxo. As linhas
+    chegam em blocos (ver `drenar`) e cada bloco vai ao arquivo como uma única escrita, feita
+    em uma thread (QueueListener): quem lê o pipe nunca espera o disco.
+    """
+
+    def __init__(self, servico, diretorio=DIRETORIO_LOGS, linhas_tail=LINHAS_TAIL):
+        os.makedirs(diretorio, exist_ok=True)
+        self.servico = servico
+        self.caminho = os.path.join(diretorio, f"{servico}.log")
+        self.tail = deque(maxlen=linhas_tail)  # tuplas (timestamp, fluxo, nível, origem, mensagem)
+        self.total_linhas = 0
+        self._ultimo_nivel = {"stdout": "INFO", "stderr": "INFO"}
+
+        arquivo = RotatingFileHandler(self.caminho, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        arquivo.setFormatter(logging.Formatter("%(message)s"))  # linhas já formatadas em `registrar`
+        fila = queue.SimpleQueue()
+        self.logger = logging.getLogger(f"servicos.{servico}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.handlers[:] = [QueueHandler(fila)]
+        self.listener = QueueListener(fila, arquivo)
+        self.listener.start()
+
+    def registrar(self, fluxo, linhas):
+        """Registra um bloco de linhas (bytes, sem o \\n) lidas de `fluxo` ("stdout" ou "stderr")."""
+        timestamp = datetime.now()
+        iso = timestamp.isoformat()
+        prefixo = timestamp.strftime("%Y-%m-%d %H:%M:%S,") + f"{timestamp.microsecond // 1000:03d} - {self.servico} - "
+        nivel = self._ultimo_nivel[fluxo]
+        saida = []
+        for bruta in linhas:
+            linha = bruta.decode("utf-8", errors="replace").rstrip("\r")
+            origem, mensagem = "-", linha
+            formatado = PADRAO_LOGGING.match(linha) or PADRAO_UVICORN.match(linha)
+            if formatado and formatado["nivel"] in NIVEIS:
+                nivel, mensagem = formatado["nivel"], formatado["mensagem"]
+                origem = formatado.groupdict().get("origem", "-")
+            self.tail.append((iso, fluxo, nivel, origem, mensagem))
+            saida.append(f"{prefixo}{nivel} - {fluxo} - {origem} - {mensagem}")
+        self._ultimo_nivel[fluxo] = nivel
+        self.total_linhas += len(saida)
+        if saida:
+            self.logger.info("\n".join(saida))
+
+    def ultimas(self, linhas=100, nivel=None):
+        """Últimas `linhas` da cauda como dicionários, opcionalmente só de um nível."""
+        registros = self.tail if nivel is None else [r for r in self.tail if r[2] == nivel]
+        return [
+            {"timestamp": r[0], "servico": self.servico, "fluxo": r[1], "nivel": r[2], "origem": r[3], "mensagem": r[4]}
+            for r in list(registros)[-linhas:]
+        ] if linhas > 0 else []
+
+    def fechar(self):
+        self.listener.stop()  # grava o que ainda está na fila
+        for handler in self.listener.handlers:
+            handler.close()
+
+
+def criar_pipe(tamanho=TAMANHO_PIPE):
+    """Pipe para o stdout/stderr de um filho: (fd de leitura não bloqueante, fd de escrita).
+
+    O buffer ampliado (F_SETPIPE_SZ, só no Linux) absorve o que o filho escreve entre duas
+    leituras de `drenar`; se o sistema recusar o tamanho, fica o padrão (64 KiB).
+    """
+    leitura, escrita = os.pipe()
+    if hasattr(fcntl, "F_SETPIPE_SZ"):
+        try:
+            fcntl.fcntl(leitura, fcntl.F_SETPIPE_SZ, tamanho)
+        except OSError:
+            pass
+    os.set_blocking(leitura, False)
+    return leitura, escrita
+
+
+async def drenar(fd, logs, fluxo):
+    """Lê o pipe do filho até o EOF, para que ele nunca encha e bloqueie o serviço; fecha o fd no fim.
+
+    Lê tudo o que houver em blocos de TAMANHO_LEITURA e, com o pipe vazio, dorme
+    INTERVALO_DRENAGEM. Um StreamReader do asyncio acordaria o event loop a cada `write` do
+    filho (uma troca de contexto por linha de log); assim o filho escreve no buffer do pipe
+    sem esperar o lançador e o custo por linha fica em poucos microssegundos.
+    """
+    resto = b""
+    try:
+        while True:
+            try:
+                bloco = os.read(fd, TAMANHO_LEITURA)
+            except BlockingIOError:
+                await asyncio.sleep(INTERVALO_DRENAGEM)
+                continue
+            if not bloco:
+                if resto:
+                    logs.registrar(fluxo, [resto])
+                return
+            linhas = (resto + bloco).split(b"\n")
+            resto = linhas.pop()
+            if len(resto) > LIMITE_LINHA:  # linha sem fim à vista: registra o que já chegou
+                linhas.append(resto)
+                resto = b""
+            logs.registrar(fluxo, linhas)
+    finally:
+        os.close(fd)
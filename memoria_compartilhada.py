@@ -0,0 +1,121 @@
+import glob
+import json
+import logging
+import os
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # sem pyarrow o transporte por memória compartilhada fica desativado
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# "http": dados trafegam no corpo das respostas; "shm": o produtor publica lotes Arrow em memória
+# compartilhada e responde só a referência (HTTP fica para controle e status)
+TRANSPORTE_DADOS = os.environ.get("TRANSPORTE_DADOS", "http")
+DIRETORIO_SHM = os.environ.get("DIRETORIO_SHM", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+MIME_SHM = "application/vnd.pipeline.shm+json"
+
+
+def shm_ativo():
+    return TRANSPORTE_DADOS == "shm" and pa is not None
+
+
+def aceita_shm(accept):
+    return bool(accept) and MIME_SHM in accept
+
+
+def processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # existe, mas é de outro usuário
+        return True
+    return True
+
+
+class PublicadorShm:
+    """Publica lotes como arquivos Arrow IPC em memória compartilhada (tmpfs) e os descarta quando saem do anel.
+
+    Cada lote ocupa um intervalo de offsets do produtor. Os leitores abrem o arquivo com memory-map
+    e leem os buffers das colunas direto das páginas compartilhadas, sem cópia. Os arquivos levam
+    o pid do produtor no nome; ao iniciar, os de produtores que já morreram (ex.: após um crash,
+    sem `fechar`) são removidos.
+    """
+
+    def __init__(self, prefixo, diretorio=DIRETORIO_SHM):
+        self.diretorio = diretorio
+        self.prefixo = f"{prefixo}_{os.getpid()}"
+        self.lotes = []  # (inicio, fim, caminho) em ordem de offset
+        self._remover_orfaos(prefixo)
+
+    def _remover_orfaos(self, prefixo):
+        removidos = 0
+        for caminho in glob.glob(os.path.join(self.diretorio, f"{glob.escape(prefixo)}_*_*.arrow*")):
+            pid = os.path.basename(caminho)[len(prefixo) + 1:].split("_", 1)[0]
+            if not pid.isdigit() or processo_vivo(int(pid)):
+                continue
+            try:
+                os.remove(caminho)
+                removidos += 1
+            except FileNotFoundError:  # outro produtor iniciando ao mesmo tempo
+                pass
+        if removidos:
+            logger.info(f"{removidos} arquivo(s) de memória compartilhada de processos encerrados removido(s) de {self.diretorio}")
+
+    def publicar(self, df, inicio):
+        """Grava o lote (offsets [inicio, inicio + len(df))) de forma atômica; retorna o caminho."""
+        caminho = os.path.join(self.diretorio, f"{self.prefixo}_{inicio}.arrow")
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        temporario = f"{caminho}.tmp"
+        with pa.OSFile(temporario, "wb") as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as writer:
+            writer.write_table(tabela)
+        os.replace(temporario, caminho)
+        self.lotes.append((inicio, inicio + len(df), caminho))
+        return caminho
+
+    def descartar_anteriores(self, offset):
+        """Remove os lotes inteiramente anteriores ao offset (leitores com o arquivo aberto não são afetados)."""
+        while self.lotes and self.lotes[0][1] <= offset:
+            _, _, caminho = self.lotes.pop(0)
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def referencia(self, inicio, fim):
+        """Segmentos que cobrem os offsets [inicio, fim), ou None se algum trecho não estiver publicado."""
+        segmentos = []
+        proximo = inicio
+        for lote_inicio, lote_fim, caminho in self.lotes:
+            if lote_fim <= proximo or lote_inicio >= fim:
+                continue
+            if lote_inicio > proximo:
+                return None
+            ate = min(fim, lote_fim)
+            segmentos.append({"arquivo": caminho, "offset": proximo - lote_inicio, "linhas": ate - proximo})
+            proximo = ate
+        return segmentos if proximo >= fim else None
+
+    def fechar(self):
+        self.descartar_anteriores(float("inf"))
+
+
+def ler_segmentos(conteudo, colunas=None):
+    """Monta o DataFrame a partir da referência publicada por um `PublicadorShm`.
+
+    Levanta FileNotFoundError se um lote já tiver sido descartado; o chamador deve então pedir os
+    dados no corpo da resposta.
+    """
+    tabelas = []
+    for segmento in json.loads(conteudo)["segmentos"]:
+        # Os buffers da tabela mantêm o mapeamento vivo mesmo depois de o produtor remover o arquivo
+        tabela = pa.ipc.open_file(pa.memory_map(segmento["arquivo"], "r")).read_all()
+        if colunas:
+            tabela = tabela.select(colunas)
+        tabelas.append(tabela.slice(segmento["offset"], segmento["linhas"]))
+    # split_blocks evita consolidar colunas numéricas em um bloco novo (mantém views quando possível)
+    return pa.concat_tables(tabelas).to_pandas(split_blocks=True)
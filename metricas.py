@@ -0,0 +1,177 @@
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from fastapi import Response
+
+METRICAS_HTTP = os.environ.get("METRICAS_HTTP", "1") == "1"  # middleware de contagem/latência por rota (0 = só os estágios)
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (s) dos baldes; os das requisições cobrem do /predict por tabela (sub-ms) ao /dados grande
+BUCKETS_REQUISICAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_ESTAGIO = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histograma:
+    """Histograma de baldes fixos no formato do Prometheus (contagens por balde, soma e total)."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # o último balde é o +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{rotulos},le="{limite:g}"}} {acumulado}'
+        yield f'{nome}_bucket{{{rotulos},le="+Inf"}} {self.total}'
+        yield f"{nome}_sum{{{rotulos}}} {self.soma:.6f}"
+        yield f"{nome}_count{{{rotulos}}} {self.total}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(**valores):
+    return ",".join(f'{chave}="{_escapar(valor)}"' for chave, valor in valores.items())
+
+
+class RegistroMetricas:
+    """Métricas de um serviço: requisições HTTP por rota e duração dos estágios do pipeline.
+
+    Só é atualizado no event loop (middleware e tarefas de background do serviço), então os
+    contadores são inteiros simples, sem locks. Estágios executados em outro processo (ex.: o
+    `fit` do treinador) medem o próprio tempo e o serviço o registra com `observar_estagio`.
+    """
+
+    def __init__(self, servico):
+        self.servico = servico
+        self.requisicoes = defaultdict(int)  # (método, rota, status) -> total
+        self.latencias = {}  # (método, rota) -> Histograma
+        self.bytes_recebidos = defaultdict(int)  # (método, rota) -> bytes do corpo das requisições
+        self.bytes_enviados = defaultdict(int)  # (método, rota) -> bytes do corpo das respostas
+        self.em_andamento = 0
+        self.estagios = {}  # estágio -> Histograma
+
+    def observar_requisicao(self, metodo, rota, status, segundos, recebidos, enviados):
+        chave = (metodo, rota)
+        histograma = self.latencias.get(chave)
+        if histograma is None:
+            histograma = self.latencias[chave] = Histograma(BUCKETS_REQUISICAO)
+        histograma.observar(segundos)
+        self.requisicoes[(metodo, rota, status)] += 1
+        self.bytes_recebidos[chave] += recebidos
+        self.bytes_enviados[chave] += enviados
+
+    def observar_estagio(self, estagio, segundos):
+        histograma = self.estagios.get(estagio)
+        if histograma is None:
+            histograma = self.estagios[estagio] = Histograma(BUCKETS_ESTAGIO)
+        histograma.observar(segundos)
+
+    @contextmanager
+    def cronometrar(self, estagio):
+        """Registra a duração do bloco (inclusive awaits) como uma observação do estágio."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar_estagio(estagio, time.perf_counter() - inicio)
+
+    def exportar(self):
+        """Todas as métricas no formato de texto do Prometheus."""
+        servico = self.servico
+        linhas = [
+            "# HELP pipeline_requisicoes_total Requisições HTTP atendidas, por rota e status.",
+            "# TYPE pipeline_requisicoes_total counter",
+        ]
+        for (metodo, rota, status), total in sorted(self.requisicoes.items()):
+            linhas.append(f"pipeline_requisicoes_total{{{_rotulos(servico=servico, metodo=metodo, rota=rota, status=status)}}} {total}")
+        linhas += [
+            "# HELP pipeline_duracao_requisicao_segundos Latência das requisições HTTP, por rota.",
+            "# TYPE pipeline_duracao_requisicao_segundos histogram",
+        ]
+        for (metodo, rota), histograma in sorted(self.latencias.items()):
+            linhas.extend(histograma.linhas("pipeline_duracao_requisicao_segundos", _rotulos(servico=servico, metodo=metodo, rota=rota)))
+        for nome, contadores, descricao in (
+            ("pipeline_bytes_recebidos_total", self.bytes_recebidos, "Bytes do corpo das requisições recebidas."),
+            ("pipeline_bytes_enviados_total", self.bytes_enviados, "Bytes do corpo das respostas enviadas."),
+        ):
+            linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} counter"]
+            for (metodo, rota), total in sorted(contadores.items()):
+                linhas.append(f"{nome}{{{_rotulos(servico=servico, metodo=metodo, rota=rota)}}} {total}")
+        linhas += [
+            "# HELP pipeline_requisicoes_em_andamento Requisições HTTP em andamento (inclui streams SSE abertos).",
+            "# TYPE pipeline_requisicoes_em_andamento gauge",
+            f"pipeline_requisicoes_em_andamento{{{_rotulos(servico=servico)}}} {self.em_andamento}",
+            "# HELP pipeline_duracao_estagio_segundos Duração dos estágios do pipeline (geração, normalização, ajuste, dump).",
+            "# TYPE pipeline_duracao_estagio_segundos histogram",
+        ]
+        for estagio, histograma in sorted(self.estagios.items()):
+            linhas.extend(histograma.linhas("pipeline_duracao_estagio_segundos", _rotulos(servico=servico, estagio=estagio)))
+        return "\n".join(linhas) + "\n"
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI puro que conta requisições, latência, bytes e requisições em andamento.
+
+    Evita o `BaseHTTPMiddleware` (que cria tarefas e filas por requisição): o custo no
+    `/predict` é o de dois `perf_counter`, um `bisect` e alguns incrementos. A rota é o
+    template (`/modelos/{versao}`), não o caminho, para manter a cardinalidade dos rótulos fixa.
+    """
+
+    def __init__(self, app, registro):
+        self.app = app
+        self.registro = registro
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        status = 500
+        recebidos = enviados = 0
+
+        async def receive_contando():
+            nonlocal recebidos
+            mensagem = await receive()
+            recebidos += len(mensagem.get("body", b""))
+            return mensagem
+
+        async def send_contando(mensagem):
+            nonlocal status, enviados
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                enviados += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        self.registro.em_andamento += 1
+        try:
+            await self.app(scope, receive_contando, send_contando)
+        finally:
+            self.registro.em_andamento -= 1
+            rota = getattr(scope.get("route"), "path", "desconhecida")
+            self.registro.observar_requisicao(scope["method"], rota, status, time.perf_counter() - inicio, recebidos, enviados)
+
+
+def instrumentar(app, registro):
+    """Instala o middleware (se METRICAS_HTTP) e expõe `GET /metrics` com as métricas do registro."""
+    if METRICAS_HTTP:
+        app.add_middleware(MiddlewareMetricas, registro=registro)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        return Response(registro.exportar(), media_type=CONTENT_TYPE_PROMETHEUS)
+
+    return registro
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AgrupadorPredicoes:
+    """Agrupa chamadas unitárias concorrentes em uma única predição vetorizada.
+
+    Cada chamada a `prever` entra em uma fila; o laço `executar` junta até `tamanho_maximo`
+    itens ou o que chegar em `espera_maxima_ms`, roda `funcao_lote` em um executor (fora do
+    event loop) e devolve a cada chamador o seu resultado. Até `lotes_em_voo` lotes rodam ao
+    mesmo tempo (padrão: o número de workers do executor), enquanto o próximo é coletado.
+    """
+
+    def __init__(self, funcao_lote, executor, tamanho_maximo=256, espera_maxima_ms=2.0, lotes_em_voo=None):
+        self.funcao_lote = funcao_lote
+        self.executor = executor
+        self.tamanho_maximo = tamanho_maximo
+        self.espera_maxima = espera_maxima_ms / 1000
+        self.lotes_em_voo = lotes_em_voo or getattr(executor, "_max_workers", 1)
+        self.fila = asyncio.Queue()
+        self.total_lotes = 0
+        self.total_itens = 0
+
+    async def prever(self, valor):
+        futuro = asyncio.get_running_loop().create_future()
+        await self.fila.put((valor, futuro))
+        return await futuro
+
+    async def _coletar_lote(self):
+        lote = [await self.fila.get()]
+        loop = asyncio.get_running_loop()
+        prazo = loop.time() + self.espera_maxima
+        while len(lote) < self.tamanho_maximo:
+            # Drena o que já está na fila sem esperar
+            while len(lote) < self.tamanho_maximo and not self.fila.empty():
+                lote.append(self.fila.get_nowait())
+            restante = prazo - loop.time()
+            if len(lote) >= self.tamanho_maximo or restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self.fila.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _executar_lote(self, lote, vagas):
+        try:
+            valores = np.array([valor for valor, _ in lote], dtype=float)
+            try:
+                resultados = await asyncio.get_running_loop().run_in_executor(self.executor, self.funcao_lote, valores)
+            except Exception as e:
+                logger.exception("Erro na predição agrupada")
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                return
+            for (_, futuro), resultado in zip(lote, resultados):
+                if not futuro.done():  # o chamador pode ter desistido (ex.: conexão encerrada)
+                    futuro.set_result(float(resultado))
+            self.total_lotes += 1
+            self.total_itens += len(lote)
+        finally:
+            vagas.release()
+
+    async def executar(self):
+        vagas = asyncio.Semaphore(self.lotes_em_voo)
+        tarefas = set()
+        try:
+            while True:
+                # Espera uma vaga antes de coletar: com o executor ocupado, o lote seguinte cresce na fila
+                await vagas.acquire()
+                try:
+                    lote = await self._coletar_lote()
+                except BaseException:
+                    vagas.release()
+                    raise
+                tarefa = asyncio.create_task(self._executar_lote(lote, vagas))
+                tarefas.add(tarefa)
+                tarefa.add_done_callback(tarefas.discard)
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
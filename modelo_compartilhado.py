@@ -0,0 +1,141 @@
+import fcntl
+import mmap
+import os
+import struct
+
+import numpy as np
+
+WORKERS_TREINADOR = int(os.environ.get("WORKERS_TREINADOR", 1))  # processos uvicorn do treinador (> 1 = um treina, todos predizem)
+INTERVALO_VERIFICACAO_MODELO = float(os.environ.get("INTERVALO_VERIFICACAO_MODELO", 0.1))  # segundos entre leituras do contador
+
+# Arquivos no diretório do registro de modelos, compartilhados pelos workers
+ARQUIVO_GERACAO = "geracao.bin"
+ARQUIVO_TREINO = "treino.lock"
+
+# Floresta exportada como função em degraus, ao lado do .joblib, e mapeada pelos workers
+SUFIXO_FLORESTA = ".floresta.npy"
+
+# geração (uint64, ímpar enquanto a versão é gravada) + versão servida (UTF-8 completada com zeros)
+FORMATO_GERACAO = struct.Struct("<Q64s")
+FORMATO_CONTADOR = struct.Struct("<Q")
+
+
+class ContadorGeracao:
+    """Versão do modelo servido e um contador de geração, em um arquivo mapeado (mmap) por todos os workers.
+
+    Quem troca o modelo chama `publicar`; os demais leem só os 8 bytes de `geracao` a cada
+    INTERVALO_VERIFICACAO_MODELO e, quando ela muda, carregam a versão do registro (que o
+    joblib mapeia do disco somente leitura). A escrita segue um seqlock: a geração fica ímpar
+    enquanto a versão é gravada, e `ler` descarta a leitura se a pegar ímpar ou alterada no meio.
+    Escritores concorrentes são serializados por flock no próprio arquivo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < FORMATO_GERACAO.size:
+            os.ftruncate(self._fd, FORMATO_GERACAO.size)
+        self._mmap = mmap.mmap(self._fd, FORMATO_GERACAO.size)
+
+    @property
+    def geracao(self):
+        return FORMATO_CONTADOR.unpack_from(self._mmap)[0]
+
+    def ler(self):
+        """(geração, versão) consistentes entre si, ou None com uma publicação em andamento.
+
+        A versão é None enquanto nada foi publicado.
+        """
+        geracao, versao = FORMATO_GERACAO.unpack_from(self._mmap)
+        if geracao % 2 or self.geracao != geracao:
+            return None
+        return geracao, versao.rstrip(b"\0").decode() or None
+
+    def publicar(self, versao):
+        """Grava a versão servida e avança a geração; retorna a nova geração."""
+        dados = versao.encode()
+        if len(dados) > FORMATO_GERACAO.size - FORMATO_CONTADOR.size:
+            raise ValueError(f"Versão longa demais para o contador de geração: {versao}")
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            geracao = self.geracao + (self.geracao % 2)  # um escritor morto no meio deixa a geração ímpar
+            FORMATO_CONTADOR.pack_into(self._mmap, 0, geracao + 1)
+            self._mmap[FORMATO_CONTADOR.size:FORMATO_GERACAO.size] = dados.ljust(FORMATO_GERACAO.size - FORMATO_CONTADOR.size, b"\0")
+            FORMATO_CONTADOR.pack_into(self._mmap, 0, geracao + 2)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return geracao + 2
+
+    def fechar(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+
+def assumir_treino(caminho):
+    """Tenta ser o worker que treina, travando `caminho` (flock) pelo resto da vida do processo.
+
+    Retorna o descritor (mantê-lo aberto mantém a trava) ou None se outro processo já treina
+    com este registro. O sistema solta a trava quando o processo morre, e o worker que o
+    uvicorn sobe no lugar a assume na inicialização.
+    """
+    fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def caminho_floresta(caminho_modelo):
+    """Arquivo da floresta exportada para um modelo `modelo_<versao>.joblib`."""
+    return os.path.splitext(caminho_modelo)[0] + SUFIXO_FLORESTA
+
+
+def exportar_floresta(modelo, caminho):
+    """Grava a floresta de uma feature como função em degraus (.npy); retorna False se o modelo não é uma.
+
+    Cada árvore é constante entre dois limiares consecutivos, então a média delas também é:
+    basta a união ordenada dos limiares e o valor predito em cada intervalo. O arquivo tem duas
+    linhas, os limiares (com +inf no fim) e os valores, e a predição é um `searchsorted`,
+    idêntica à do sklearn (que compara as features em float32).
+    """
+    if not hasattr(modelo, "estimators_") or modelo.n_features_in_ != 1:
+        return False
+    limiares = np.unique(np.concatenate([
+        arvore.tree_.threshold[arvore.tree_.children_left >= 0] for arvore in modelo.estimators_
+    ]))
+    # Representante de cada intervalo (limiares[i-1], limiares[i]]: o maior float32 <= limiares[i]
+    representantes = limiares.astype(np.float32)
+    representantes = np.where(representantes > limiares, np.nextafter(representantes, np.float32(-np.inf)), representantes)
+    ultimo = np.float32(limiares[-1]) if len(limiares) else np.float32(0)
+    if len(limiares) and ultimo <= limiares[-1]:
+        ultimo = np.nextafter(ultimo, np.float32(np.inf))
+    representantes = np.append(representantes, ultimo)
+    degraus = np.vstack([np.append(limiares, np.inf), modelo.predict(representantes.reshape(-1, 1))])
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "wb") as arquivo:
+        np.save(arquivo, degraus)
+    os.replace(temporario, caminho)
+    return True
+
+
+class FlorestaMapeada:
+    """Predição de uma floresta exportada por `exportar_floresta`, lida do arquivo mapeado somente leitura.
+
+    O sklearn copia os arrays das árvores para buffers próprios ao desserializar (mesmo com
+    `mmap_mode`), então cada worker teria uma cópia privada do modelo. Os degraus ficam em um
+    memmap: as páginas vêm do page cache, compartilhadas por todos os processos que servem a versão.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.degraus = np.load(caminho, mmap_mode="r")
+        if self.degraus.ndim != 2 or len(self.degraus) != 2:
+            raise ValueError(f"Floresta exportada com formato inesperado: {self.degraus.shape}")
+        self.limiares, self.valores = self.degraus
+        self.n_features_in_ = 1
+
+    def predict(self, X):
+        x = np.asarray(X, dtype=np.float32).reshape(len(X), -1)[:, 0]
+        return np.asarray(self.valores[np.searchsorted(self.limiares, x, side="left")])
@@ -1,7 +1,8 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 import pandas as pd
-import requests
+import numpy as np
+import httpx
 import asyncio
 from sklearn.preprocessing import StandardScaler
 import logging
@@ -9,29 +10,128 @@ from datetime import datetime
 from pydantic import BaseModel
 import os
 import uuid
-import time
+import joblib
+import json
+from transporte import ACCEPT_COLUNAR, ACCEPT_DADOS, impressao_digital, ler_dataframe, responder_dataframe, responder_referencia_shm
+from memoria_compartilhada import PublicadorShm, aceita_shm, shm_ativo
+from armazenamento_dados import ARMAZENAR_DADOS, ArmazenamentoDados, gravar_lote
+from cliente_http import ClienteServico, URL_GERADOR, espera_backoff
+from eventos import MODO_PIPELINE, CanalEventos, Gatilho, assinar_eventos
+from buffer_colunar import BufferColunar
+from metricas import RegistroMetricas, instrumentar
 
 app = FastAPI(title="Normalizador")
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+INTERVALO_NORMALIZACAO = int(os.environ.get("INTERVALO_NORMALIZACAO", 60)) # segundos
+LIMITE_PAGINA = int(os.environ.get("LIMITE_PAGINA", 0)) # registros por requisição ao gerador (0 = sem limite)
+MODO_NORMALIZACAO = os.environ.get("MODO_NORMALIZACAO", "online") # "online" (partial_fit acumulado) ou "lote"
+CAMINHO_SCALER = os.environ.get("CAMINHO_SCALER", os.path.join("modelos", "scaler_normalizador.joblib"))
+COLUNAS_NUMERICAS = ['idade', 'salario']
+CAPACIDADE_NORMALIZADOS = int(os.environ.get("CAPACIDADE_NORMALIZADOS", 30000)) # registros normalizados mantidos no anel
+
+def carregar_scaler():
+    """Restaura o scaler persistido (modo online) ou cria um novo."""
+    if MODO_NORMALIZACAO == "online" and os.path.exists(CAMINHO_SCALER):
+        try:
+            scaler = joblib.load(CAMINHO_SCALER)
+            logger.info(f"Scaler restaurado de {CAMINHO_SCALER} ({int(np.max(scaler.n_samples_seen_))} amostras acumuladas)")
+            return scaler
+        except Exception as e:
+            logger.warning(f"Falha ao restaurar scaler de {CAMINHO_SCALER}: {e}. Iniciando um novo.")
+    return StandardScaler()
+
+def salvar_scaler(scaler):
+    """Persiste o scaler de forma atômica (arquivo temporário + os.replace)."""
+    os.makedirs(os.path.dirname(CAMINHO_SCALER) or ".", exist_ok=True)
+    temporario = f"{CAMINHO_SCALER}.tmp"
+    joblib.dump(scaler, temporario)
+    os.replace(temporario, CAMINHO_SCALER)
+
+def parametros_scaler(scaler, normalizacao_id):
+    """Parâmetros da transformação (z = (x - media) / escala) no formato de /scaler."""
+    colunas = list(scaler.feature_names_in_) if hasattr(scaler, "feature_names_in_") else COLUNAS_NUMERICAS
+    return {
+        "modo": MODO_NORMALIZACAO,
+        "normalizacao_id": normalizacao_id,
+        "colunas": colunas,
+        "media": dict(zip(colunas, scaler.mean_.tolist())),
+        "variancia": dict(zip(colunas, scaler.var_.tolist())),
+        "escala": dict(zip(colunas, scaler.scale_.tolist())),
+        "n_amostras": int(np.max(scaler.n_samples_seen_))
+    }
+
 class EstadoNormalizador:
     def __init__(self):
-        self.dados_normalizados = pd.DataFrame()
-        self.scaler = StandardScaler()
+        self.buffer = BufferColunar(CAPACIDADE_NORMALIZADOS)  # anel colunar com os lotes normalizados recentes
+        self.lote_atual = (0, 0)  # offsets [inicio, fim) do último lote normalizado no anel
+        self.publicador = PublicadorShm("normalizador") if shm_ativo() else None  # lotes normalizados em memória compartilhada
+        self.armazenamento = None  # ArmazenamentoDados (SQLite) com o histórico normalizado, lido pelo treinador
+        self.scaler = carregar_scaler()
         self.ultima_normalizacao = None
         self.total_normalizacoes = 0
         self.registros_processados = 0
+        self.normalizacao_id = None
+        self.parametros_scaler = None  # parâmetros do scaler de quando o lote atual foi normalizado
+        self.cursor_gerador = 0  # próximo offset a ser lido do log do gerador
+        self.execucao_gerador = None  # X-Execucao do gerador a que o cursor se refere
+        self.cliente_gerador = None
+        self.impressao_entrada = None  # impressão digital do último lote normalizado
+        self.ciclos_ignorados = 0  # ciclos sem trabalho (gerador sem novidade ou lote repetido)
+        self.acertos_impressao = 0  # dos ignorados, os que tinham a mesma impressão digital
+        self.gatilho = Gatilho()  # em modo push, disparado pelos eventos do gerador
+        self.eventos = CanalEventos()  # avisa o treinador a cada nova normalização
+        self.metricas = RegistroMetricas("normalizador")  # exposto em /metrics
 
 estado = EstadoNormalizador()
+instrumentar(app, estado.metricas)
 
 class StatusResponse(BaseModel):
     status: str
     ultima_normalizacao: str
     total_normalizacoes: int
     registros_processados: int
+    ciclos_ignorados: int
+    acertos_impressao: int
 
-INTERVALO_NORMALIZACAO = int(os.environ.get("INTERVALO_NORMALIZACAO", 60)) # segundos
+async def coletar_novos_registros():
+    """Lê do gerador apenas os registros posteriores ao cursor.
+
+    Retorna (dados, novo_cursor, execucao); dados é None quando o gerador responde 304 (nada
+    novo). O cursor só vale para a execução do gerador em que foi obtido: enviado com
+    `execucao`, um gerador reiniciado o ignora e responde a partir da geração atual.
+    """
+    cursor = estado.cursor_gerador
+    execucao = estado.execucao_gerador
+    partes = []
+    while True:
+        params = {"since": cursor}
+        if execucao is not None:
+            params["execucao"] = execucao
+        if LIMITE_PAGINA:
+            params["limit"] = LIMITE_PAGINA
+        response = await estado.cliente_gerador.requisitar("GET", "/dados", params=params, headers={"Accept": ACCEPT_DADOS})
+        if response.headers.get("X-Execucao", execucao) != execucao:
+            if execucao is not None:
+                logger.warning(f"Gerador reiniciado (execução {response.headers['X-Execucao']}); cursor {cursor} descartado")
+            execucao = response.headers["X-Execucao"]
+        if response.status_code == 304:
+            break
+        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        try:
+            partes.append(ler_dataframe(response))
+        except FileNotFoundError:
+            # Lote já descartado da memória compartilhada: pede os mesmos registros no corpo da resposta
+            response = await estado.cliente_gerador.requisitar("GET", "/dados", params=params, headers={"Accept": ACCEPT_COLUNAR})
+            response.raise_for_status()
+            partes.append(ler_dataframe(response))
+        cursor = int(response.headers["X-Proximo-Offset"])
+        if cursor >= int(response.headers["X-Offset-Final"]):
+            break
+    if not partes:
+        return None, cursor, execucao
+    return pd.concat(partes, ignore_index=True), cursor, execucao
 
 async def coletar_e_normalizar():
     while True:
@@ -42,66 +142,148 @@ async def coletar_e_normalizar():
             # Verificação de status do gerador
             for attempt in range(3):
                 try:
-                    status_response = requests.get("http://localhost:8001/status", timeout=5)
+                    status_response = await estado.cliente_gerador.get("/status")
                     status_response.raise_for_status()
                     status = status_response.json()
                     if status["status"] == "ativo":
                         break
-                    logger.warning(f"Gerador indisponível. Tentativa {attempt+1}/3. Tentando novamente em 5 segundos...")
-                    time.sleep(5)
-                except requests.exceptions.RequestException as e:
-                    logger.warning(f"Erro ao verificar status do gerador: {e}. Tentando novamente em 5 segundos...")
-                    time.sleep(5)
+                    logger.warning(f"Gerador indisponível. Tentativa {attempt+1}/3. Tentando novamente em {espera_backoff(attempt):.1f} segundos...")
+                    await asyncio.sleep(espera_backoff(attempt))
+                except httpx.HTTPError as e:
+                    logger.warning(f"Erro ao verificar status do gerador: {e}. Tentando novamente em {espera_backoff(attempt):.1f} segundos...")
+                    await asyncio.sleep(espera_backoff(attempt))
             else:
                 logger.error(f"Gerador indisponível após múltiplas tentativas.")
-                await asyncio.sleep(INTERVALO_NORMALIZACAO)
+                await estado.gatilho.aguardar(INTERVALO_NORMALIZACAO)
                 continue
 
-            response = requests.get("http://localhost:8001/dados", timeout=5)
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            dados = pd.DataFrame(response.json())
+            dados, cursor, execucao = await coletar_novos_registros()
+            if dados is None:
+                estado.ciclos_ignorados += 1
+                logger.info(f"Normalização ID: {normalizacao_id} - Nenhum registro novo no gerador (cursor {cursor}). Normalização ignorada.")
+                await estado.gatilho.aguardar(INTERVALO_NORMALIZACAO)
+                continue
             
-            colunas_numericas = ['idade', 'salario']
+            colunas_numericas = COLUNAS_NUMERICAS
             if not all(col in dados.columns for col in colunas_numericas):
                 logger.warning(f"Normalização ID: {normalizacao_id} - Algumas colunas numéricas não encontradas: {set(colunas_numericas) - set(dados.columns)}")
                 continue # Pula para a próxima iteração se as colunas não existirem
 
+            impressao = impressao_digital(dados, colunas_numericas)
+            if impressao == estado.impressao_entrada:
+                # Mesmo conteúdo do último lote: mantém a saída em cache (e não reacumula o scaler online)
+                estado.cursor_gerador, estado.execucao_gerador = cursor, execucao
+                estado.ciclos_ignorados += 1
+                estado.acertos_impressao += 1
+                logger.info(f"Normalização ID: {normalizacao_id} - Lote idêntico ao anterior (impressão {impressao}). Normalização ignorada.")
+                await estado.gatilho.aguardar(INTERVALO_NORMALIZACAO)
+                continue
+
             # Normaliza apenas as colunas numéricas
             dados_numericos = dados[colunas_numericas]
-            dados_normalizados_numericos = estado.scaler.fit_transform(dados_numericos)
+            if MODO_NORMALIZACAO == "online":
+                # Acumula média/variância entre lotes: a escala só muda com novos dados
+                with estado.metricas.cronometrar("normalizacao"):
+                    estado.scaler.partial_fit(dados_numericos)
+                    dados_normalizados_numericos = estado.scaler.transform(dados_numericos)
+                with estado.metricas.cronometrar("dump_scaler"):
+                    salvar_scaler(estado.scaler)
+            else:
+                with estado.metricas.cronometrar("normalizacao"):
+                    dados_normalizados_numericos = estado.scaler.fit_transform(dados_numericos)
             dados[colunas_numericas] = dados_normalizados_numericos
+            if len(dados) > CAPACIDADE_NORMALIZADOS:
+                logger.warning(f"Normalização ID: {normalizacao_id} - Lote de {len(dados)} registros maior que CAPACIDADE_NORMALIZADOS ({CAPACIDADE_NORMALIZADOS}); apenas os mais recentes serão servidos.")
             
-            estado.dados_normalizados = dados
+            # Grava antes de publicar: o treinador pode ler a janela de tempo assim que vê o lote novo,
+            # e uma falha na gravação não deixa o estado apontando para um lote que não está no banco
+            if estado.armazenamento is not None:
+                # Com os valores brutos: o scaler muda entre lotes, e quem lê uma janela renormaliza tudo com um só
+                brutos = dados.assign(idade_bruta=dados_numericos["idade"].to_numpy(), salario_bruto=dados_numericos["salario"].to_numpy())
+                await gravar_lote(estado.armazenamento, "registros_normalizados", brutos, normalizacao_id=normalizacao_id)
+            # Daqui até o evento não há await: quem lê o estado vê o lote anterior ou este, por inteiro
+            estado.lote_atual = estado.buffer.anexar(dados)
+            if estado.publicador is not None:
+                publicado = max(estado.lote_atual[0], estado.buffer.inicio)  # lote maior que o anel: só o que ficou nele
+                estado.publicador.publicar(estado.buffer.fatia(publicado, estado.lote_atual[1]), publicado)
+                estado.publicador.descartar_anteriores(publicado)  # só o último lote é servido
+            estado.normalizacao_id = normalizacao_id
+            estado.parametros_scaler = parametros_scaler(estado.scaler, normalizacao_id)
+            estado.cursor_gerador, estado.execucao_gerador = cursor, execucao
+            estado.impressao_entrada = impressao
             estado.ultima_normalizacao = datetime.now().isoformat()
             estado.total_normalizacoes += 1
             estado.registros_processados = len(dados)
+            estado.eventos.publicar("dados_normalizados", {"normalizacao_id": normalizacao_id, "registros": len(dados), "timestamp": estado.ultima_normalizacao})
             
             logger.info(f"Normalização ID: {normalizacao_id} - Normalizados {len(dados)} registros. Total de registros processados: {estado.registros_processados}")
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Normalização ID: {normalizacao_id} - Erro ao obter dados do gerador: {e}")
         except Exception as e:
             logger.exception(f"Normalização ID: {normalizacao_id} - Erro na normalização: {str(e)}") # Log com traceback
         
-        await asyncio.sleep(INTERVALO_NORMALIZACAO)
+        await estado.gatilho.aguardar(INTERVALO_NORMALIZACAO)
 
 @app.on_event("startup")
 async def startup_event():
+    estado.cliente_gerador = ClienteServico(URL_GERADOR)
+    if ARMAZENAR_DADOS:
+        estado.armazenamento = ArmazenamentoDados()
     asyncio.create_task(coletar_e_normalizar())
+    if MODO_PIPELINE == "push":
+        asyncio.create_task(assinar_eventos(estado.cliente_gerador, estado.gatilho))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    estado.eventos.fechar()
+    if estado.publicador is not None:
+        estado.publicador.fechar()
+    if estado.armazenamento is not None:
+        estado.armazenamento.fechar()
+    await estado.cliente_gerador.fechar()
 
 @app.get("/dados_normalizados")
-async def get_dados_normalizados():
-    if estado.dados_normalizados.empty:
+async def get_dados_normalizados(request: Request):
+    if estado.buffer.vazio:
         raise HTTPException(status_code=503, detail="Dados ainda não normalizados")
-    return estado.dados_normalizados.to_dict(orient='records')
+    etag = f'"{estado.normalizacao_id}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    # O scaler vai junto com o lote: um partial_fit posterior não o desencontra dos dados
+    headers = {"ETag": etag, "X-Scaler": json.dumps(estado.parametros_scaler)}
+    if estado.publicador is not None and aceita_shm(request.headers.get("accept")):
+        segmentos = estado.publicador.referencia(*estado.lote_atual)
+        if segmentos is not None:
+            return responder_referencia_shm(segmentos, headers=headers)
+    return responder_dataframe(estado.buffer.fatia(*estado.lote_atual), request.headers.get("accept"), headers=headers)
+
+@app.get("/eventos")
+async def get_eventos():
+    """Stream SSE com um evento `dados_normalizados` a cada lote normalizado (usado pelo treinador em modo push)."""
+    return estado.eventos.resposta()
+
+@app.get("/scaler")
+async def get_scaler():
+    """Parâmetros da transformação aplicada ao lote atual de /dados_normalizados (z = (x - media) / escala).
+
+    `normalizacao_id` identifica o lote (é o ETag de /dados_normalizados sem aspas).
+    """
+    if estado.parametros_scaler is not None:
+        return estado.parametros_scaler
+    if not hasattr(estado.scaler, "mean_"):
+        raise HTTPException(status_code=503, detail="Scaler ainda não ajustado")
+    return parametros_scaler(estado.scaler, estado.normalizacao_id)  # restaurado do disco, antes do primeiro lote
 
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
     return {
-        "status": "ativo" if not estado.dados_normalizados.empty else "aguardando",
+        "status": "ativo" if not estado.buffer.vazio else "aguardando",
         "ultima_normalizacao": estado.ultima_normalizacao or datetime.now().isoformat(),
         "total_normalizacoes": estado.total_normalizacoes,
-        "registros_processados": estado.registros_processados
+        "registros_processados": estado.registros_processados,
+        "ciclos_ignorados": estado.ciclos_ignorados,
+        "acertos_impressao": estado.acertos_impressao
     }
 
 if __name__ == "__main__":
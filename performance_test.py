@@ -1,90 +1,228 @@
-import joblib
-import dash
-from dash import dcc, html
-import plotly.graph_objects as go
+import argparse
 import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import pandas as pd
-from sklearn.metrics import mean_squared_error, r2_score
-
-# Carrega o último modelo
-model_path = "modelos/modelo_20241106_060145.joblib"
-model = joblib.load(model_path)
-
-# Gera dados de teste (substitua por seus dados reais)
-X_test = np.linspace(0, 10, 100)
-y_test = 2 * X_test + 1 + np.random.normal(0, 1, 100)
-y_pred = model.predict(X_test.reshape(-1,1))
-
-# Dados adicionais para outros gráficos
-feature_importance = np.random.rand(5)  # Importância das features (aleatório)
-residuals = y_test - y_pred
-predictions_df = pd.DataFrame({'y_test': y_test, 'y_pred': y_pred})
-
-# Calcula métricas
-mse = mean_squared_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
-
-# Cria os gráficos
-fig1 = go.Figure()
-fig1.add_trace(go.Scatter(x=X_test, y=y_test, mode='markers', name='Valores Reais'))
-fig1.add_trace(go.Scatter(x=X_test, y=y_pred, mode='lines', name='Previsões'))
-fig1.update_layout(title='Previsões vs. Valores Reais', xaxis_title='X', yaxis_title='Y')
-
-fig2 = go.Figure()
-fig2.add_trace(go.Histogram(x=residuals, name='Resíduos'))
-fig2.update_layout(title='Histograma dos Resíduos', xaxis_title='Resíduos', yaxis_title='Frequência')
-
-fig3 = go.Figure()
-fig3.add_trace(go.Box(y=residuals, name='Resíduos'))
-fig3.update_layout(title='Boxplot dos Resíduos', yaxis_title='Resíduos')
-
-fig4 = go.Figure()
-fig4.add_trace(go.Scatter(x=X_test, y=residuals, mode='markers', name='Resíduos'))
-fig4.update_layout(title='Resíduos vs. X', xaxis_title='X', yaxis_title='Resíduos')
-
-fig5 = go.Figure()
-fig5.add_trace(go.Bar(x=np.arange(len(feature_importance)), y=feature_importance, name='Importância das Features'))
-fig5.update_layout(title='Importância das Features', xaxis_title='Feature', yaxis_title='Importância')
-
-fig6 = go.Figure()
-fig6.add_trace(go.Scatter(x=predictions_df['y_test'], y=predictions_df['y_pred'], mode='markers', name='Previsões vs. Reais'))
-fig6.update_layout(title='Dispersão Previsões vs. Reais', xaxis_title='Valores Reais', yaxis_title='Previsões')
-
-fig7 = go.Figure()
-fig7.add_trace(go.Violin(y=residuals, name='Resíduos'))
-fig7.update_layout(title='Violin Plot dos Resíduos', yaxis_title='Resíduos')
-
-fig8 = go.Figure()
-fig8.add_trace(go.Scatter(x=np.arange(len(y_test)), y=y_test, mode='lines+markers', name='Valores Reais'))
-fig8.add_trace(go.Scatter(x=np.arange(len(y_pred)), y=y_pred, mode='lines+markers', name='Previsões'))
-fig8.update_layout(title='Série Temporal de Previsões', xaxis_title='Tempo', yaxis_title='Valor')
-
-fig9 = go.Figure()
-fig9.add_trace(go.Scatter(x=X_test, y=abs(residuals), mode='markers', name='Erro Absoluto'))
-fig9.update_layout(title='Erro Absoluto vs. X', xaxis_title='X', yaxis_title='Erro Absoluto')
-
-fig10 = go.Figure()
-fig10.add_trace(go.Scatter(x=X_test, y=y_test/y_pred, mode='markers', name='Razão'))
-fig10.update_layout(title='Razão entre Valores Reais e Previsões', xaxis_title='X', yaxis_title='Razão')
-
-
-# Gera um hash único para o nome do arquivo
-hash_object = hashlib.sha256(str(mse).encode())
-unique_hash = hash_object.hexdigest()
-
-# Salva os gráficos
-fig1.write_image(f"performance/grafico_1_{unique_hash}.png")
-fig2.write_image(f"performance/grafico_2_{unique_hash}.png")
-fig3.write_image(f"performance/grafico_3_{unique_hash}.png")
-fig4.write_image(f"performance/grafico_4_{unique_hash}.png")
-fig5.write_image(f"performance/grafico_5_{unique_hash}.png")
-fig6.write_image(f"performance/grafico_6_{unique_hash}.png")
-fig7.write_image(f"performance/grafico_7_{unique_hash}.png")
-fig8.write_image(f"performance/grafico_8_{unique_hash}.png")
-fig9.write_image(f"performance/grafico_9_{unique_hash}.png")
-fig10.write_image(f"performance/grafico_10_{unique_hash}.png")
-
-print(f"Gráficos salvos na pasta performance com hash: {unique_hash}")
-print(f"MSE: {mse}")
-print(f"R2: {r2}")
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from avaliador_modelo import AcumuladorMetricas, carregar_versao, holdout_sintetico, ler_blocos, registros_validos
+from registro_modelos import DIRETORIO_MODELOS
+
+DIRETORIO_RELATORIOS = os.environ.get("DIRETORIO_RELATORIOS", "performance")
+MAX_PONTOS = int(os.environ.get("MAX_PONTOS", 5000))  # pontos por série desenhada (séries maiores são reduzidas)
+WORKERS_RELATORIO = int(os.environ.get("WORKERS_RELATORIO", min(4, os.cpu_count() or 1)))  # processos de exportação PNG
+BINS_HISTOGRAMA = 50
+
+
+class HistogramaResiduos:
+    """Histograma de `bins` faixas acumulado bloco a bloco, sem conhecer a faixa dos resíduos de antemão.
+
+    Quando um bloco cai fora da faixa atual, a largura das faixas dobra (pares vizinhos são somados)
+    e a faixa cresce para o lado do valor novo, até cobri-lo; as contagens continuam exatas.
+    """
+
+    def __init__(self, bins=BINS_HISTOGRAMA):
+        self.bins = bins + bins % 2
+        self.contagens = None
+
+    def atualizar(self, valores):
+        if not len(valores):
+            return
+        minimo, maximo = float(valores.min()), float(valores.max())
+        if self.contagens is None:
+            self.inicio = minimo
+            self.largura = (maximo - minimo) / self.bins or 1.0
+            self.contagens = np.zeros(self.bins, dtype=np.int64)
+        while minimo < self.inicio or maximo > self.inicio + self.bins * self.largura:
+            pares = self.contagens.reshape(-1, 2).sum(axis=1)
+            vazias = np.zeros(self.bins // 2, dtype=np.int64)
+            if minimo < self.inicio:
+                self.inicio -= self.bins * self.largura
+                self.contagens = np.concatenate([vazias, pares])
+            else:
+                self.contagens = np.concatenate([pares, vazias])
+            self.largura *= 2
+        fim = self.inicio + self.bins * self.largura
+        self.contagens += np.histogram(valores, bins=self.bins, range=(self.inicio, fim))[0]
+
+    def resultado(self):
+        """(contagens, centros das faixas)."""
+        if self.contagens is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return self.contagens, self.inicio + (np.arange(self.bins) + 0.5) * self.largura
+
+
+def preparar_dados(servido, blocos, max_pontos=MAX_PONTOS):
+    """Prediz o holdout bloco a bloco e devolve só o que os gráficos desenham: métricas completas, amostra e histograma.
+
+    Registros inválidos são descartados como em `avaliar`. As métricas e o histograma dos resíduos
+    usam todos os registros válidos; as séries ponto a ponto usam uma amostra determinística de até
+    `max_pontos` registros, ordenada por idade. A amostra é tirada em cada bloco (registros de índice
+    múltiplo de `passo`) e o passo dobra sempre que ela passa de 2 × max_pontos, então a memória
+    não cresce com o tamanho do holdout.
+    """
+    acumulador = AcumuladorMetricas()
+    histograma = HistogramaResiduos(BINS_HISTOGRAMA)
+    amostra, passo, vistos = [], 1, 0
+    for bloco in blocos:
+        bloco = registros_validos(bloco)
+        idades = bloco["idade"].to_numpy(dtype=float)
+        y_test = bloco["salario"].to_numpy(dtype=float)
+        y_pred = np.asarray(servido.prever(idades), dtype=float)
+        acumulador.atualizar(y_test, y_pred)
+        histograma.atualizar(y_test - y_pred)
+
+        indices = np.arange(vistos, vistos + len(idades))
+        selecao = indices % passo == 0
+        amostra.append(np.column_stack([indices[selecao], idades[selecao], y_test[selecao], y_pred[selecao]]))
+        vistos += len(idades)
+        while sum(len(parte) for parte in amostra) > 2 * max_pontos:
+            passo *= 2
+            amostra = [parte[parte[:, 0] % passo == 0] for parte in amostra]
+
+    pontos = np.concatenate(amostra) if amostra else np.zeros((0, 4))
+    if len(pontos) > max_pontos:
+        pontos = pontos[np.linspace(0, len(pontos) - 1, max_pontos).astype(int)]
+    pontos = pontos[np.argsort(pontos[:, 1], kind="stable")]
+    x, y_test, y_pred = pontos[:, 1], pontos[:, 2], pontos[:, 3]
+    importancias = getattr(servido.modelo, "feature_importances_", None)
+    return {
+        "metricas": acumulador.resultado(),
+        "x": x,
+        "y_test": y_test,
+        "y_pred": y_pred,
+        "residuos": y_test - y_pred,
+        "histograma": histograma.resultado(),
+        "importancias": np.asarray(importancias if importancias is not None else [np.nan]),
+    }
+
+
+def chave_relatorio(versao, dados):
+    """Hash do modelo + dados desenhados: relatórios com a mesma chave não são gerados de novo."""
+    h = hashlib.blake2b(versao.encode(), digest_size=16)
+    for nome in ("x", "y_test", "y_pred", "importancias"):
+        h.update(np.ascontiguousarray(dados[nome]).tobytes())
+    h.update(np.ascontiguousarray(dados["histograma"][0]).tobytes())
+    return h.hexdigest()
+
+
+def criar_figura(numero, dados):
+    """Monta o gráfico `numero` (1 a 10) a partir dos dados já reduzidos."""
+    x, y_test, y_pred, residuos = dados["x"], dados["y_test"], dados["y_pred"], dados["residuos"]
+    fig = go.Figure()
+    if numero == 1:
+        fig.add_trace(go.Scattergl(x=x, y=y_test, mode='markers', name='Valores Reais'))
+        fig.add_trace(go.Scattergl(x=x, y=y_pred, mode='lines', name='Previsões'))
+        fig.update_layout(title='Previsões vs. Valores Reais', xaxis_title='Idade', yaxis_title='Salário')
+    elif numero == 2:
+        contagens, centros = dados["histograma"]
+        fig.add_trace(go.Bar(x=centros, y=contagens, name='Resíduos'))
+        fig.update_layout(title='Histograma dos Resíduos', xaxis_title='Resíduos', yaxis_title='Frequência', bargap=0)
+    elif numero == 3:
+        fig.add_trace(go.Box(y=residuos, name='Resíduos'))
+        fig.update_layout(title='Boxplot dos Resíduos', yaxis_title='Resíduos')
+    elif numero == 4:
+        fig.add_trace(go.Scattergl(x=x, y=residuos, mode='markers', name='Resíduos'))
+        fig.update_layout(title='Resíduos vs. Idade', xaxis_title='Idade', yaxis_title='Resíduos')
+    elif numero == 5:
+        importancias = dados["importancias"]
+        fig.add_trace(go.Bar(x=np.arange(len(importancias)), y=importancias, name='Importância das Features'))
+        fig.update_layout(title='Importância das Features', xaxis_title='Feature', yaxis_title='Importância')
+    elif numero == 6:
+        fig.add_trace(go.Scattergl(x=y_test, y=y_pred, mode='markers', name='Previsões vs. Reais'))
+        fig.update_layout(title='Dispersão Previsões vs. Reais', xaxis_title='Valores Reais', yaxis_title='Previsões')
+    elif numero == 7:
+        fig.add_trace(go.Violin(y=residuos, name='Resíduos'))
+        fig.update_layout(title='Violin Plot dos Resíduos', yaxis_title='Resíduos')
+    elif numero == 8:
+        fig.add_trace(go.Scattergl(x=np.arange(len(y_test)), y=y_test, mode='lines+markers', name='Valores Reais'))
+        fig.add_trace(go.Scattergl(x=np.arange(len(y_pred)), y=y_pred, mode='lines+markers', name='Previsões'))
+        fig.update_layout(title='Série de Previsões', xaxis_title='Registro', yaxis_title='Valor')
+    elif numero == 9:
+        fig.add_trace(go.Scattergl(x=x, y=np.abs(residuos), mode='markers', name='Erro Absoluto'))
+        fig.update_layout(title='Erro Absoluto vs. Idade', xaxis_title='Idade', yaxis_title='Erro Absoluto')
+    elif numero == 10:
+        fig.add_trace(go.Scattergl(x=x, y=y_test / y_pred, mode='markers', name='Razão'))
+        fig.update_layout(title='Razão entre Valores Reais e Previsões', xaxis_title='Idade', yaxis_title='Razão')
+    else:
+        raise ValueError(f"Gráfico inexistente: {numero}")
+    return fig
+
+
+NUMEROS_GRAFICOS = range(1, 11)
+
+
+def _exportar_grupo(numeros, dados, caminhos):
+    """Executado em um processo do pool: monta os gráficos do grupo e exporta todos em uma única sessão do exportador."""
+    pio.write_images([criar_figura(numero, dados) for numero in numeros], caminhos)
+    return len(caminhos)
+
+
+def gerar_pngs(dados, chave, diretorio=DIRETORIO_RELATORIOS, workers=WORKERS_RELATORIO):
+    """Exporta os gráficos que ainda não existem para esta chave, divididos entre `workers` processos."""
+    caminhos = {numero: os.path.join(diretorio, f"grafico_{numero}_{chave}.png") for numero in NUMEROS_GRAFICOS}
+    pendentes = [numero for numero, caminho in caminhos.items() if not os.path.exists(caminho)]
+    if not pendentes:
+        return list(caminhos.values()), 0
+    grupos = [list(grupo) for grupo in np.array_split(pendentes, min(workers, len(pendentes))) if len(grupo)]
+    if len(grupos) == 1:
+        _exportar_grupo(grupos[0], dados, [caminhos[n] for n in grupos[0]])
+    else:
+        with ProcessPoolExecutor(max_workers=len(grupos)) as pool:
+            futuros = [pool.submit(_exportar_grupo, grupo, dados, [caminhos[n] for n in grupo]) for grupo in grupos]
+            for futuro in futuros:
+                futuro.result()
+    return list(caminhos.values()), len(pendentes)
+
+
+def gerar_html(dados, chave, versao, diretorio=DIRETORIO_RELATORIOS):
+    """Grava um único HTML autocontido (plotly.js embutido uma vez) com os dez gráficos e as métricas."""
+    caminho = os.path.join(diretorio, f"relatorio_{chave}.html")
+    if os.path.exists(caminho):
+        return caminho, False
+    metricas = dados["metricas"]
+    partes = [
+        "<html><head><meta charset='utf-8'><title>Relatório de performance</title></head><body>",
+        f"<h1>Modelo {versao}</h1>",
+        f"<p>Registros: {metricas['n']:,} | MSE: {metricas['mse']:.2f} | MAE: {metricas['mae']:.2f} | R²: {metricas['r2']:.4f}</p>",
+    ]
+    for numero in NUMEROS_GRAFICOS:
+        partes.append(criar_figura(numero, dados).to_html(full_html=False, include_plotlyjs=(numero == 1)))
+    partes.append("</body></html>")
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write("\n".join(partes))
+    os.replace(temporario, caminho)
+    return caminho, True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gera os gráficos de performance de um modelo do registro.')
+    parser.add_argument('--versao', help='Versão em modelos/ (padrão: a fixada ou a mais recente).')
+    parser.add_argument('--diretorio-modelos', default=DIRETORIO_MODELOS)
+    parser.add_argument('--holdout', help='Arquivo .parquet/.csv ou banco .sqlite com idade e salario (padrão: holdout sintético).')
+    parser.add_argument('--sintetico', type=int, default=100_000, help='Registros do holdout sintético.')
+    parser.add_argument('--max-pontos', type=int, default=MAX_PONTOS, help='Pontos por série desenhada.')
+    parser.add_argument('--html', action='store_true', help='Gera um único HTML autocontido em vez dos PNGs.')
+    parser.add_argument('--workers', type=int, default=WORKERS_RELATORIO, help='Processos de exportação PNG.')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    os.makedirs(DIRETORIO_RELATORIOS, exist_ok=True)
+    servido = carregar_versao(args.versao, args.diretorio_modelos)
+    blocos = ler_blocos(args.holdout) if args.holdout else holdout_sintetico(args.sintetico)
+    dados = preparar_dados(servido, blocos, args.max_pontos)
+    chave = chave_relatorio(servido.versao, dados)
+
+    if args.html:
+        caminho, gerado = gerar_html(dados, chave, servido.versao)
+        print(f"Relatório {'gerado' if gerado else 'já existente (cache)'}: {caminho}")
+    else:
+        _, gerados = gerar_pngs(dados, chave, workers=args.workers)
+        print(f"Gráficos salvos na pasta {DIRETORIO_RELATORIOS} com hash: {chave} ({gerados} gerados, {10 - gerados} do cache)")
+    print(f"MSE: {dados['metricas']['mse']}")
+    print(f"R2: {dados['metricas']['r2']}")
+    print(f"Tempo total: {time.perf_counter() - inicio:.2f} s")
@@ -0,0 +1,196 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import joblib
+
+from modelo_compartilhado import FlorestaMapeada, caminho_floresta
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_MODELOS = os.environ.get("DIRETORIO_MODELOS", "modelos")
+MAX_MODELOS = int(os.environ.get("MAX_MODELOS", 10))  # versões mantidas em disco (além da fixada)
+
+
+class ArtefatoInvalido(Exception):
+    """O arquivo da versão existe mas não é um modelo utilizável (truncado, ilegível ou incompatível).
+
+    Falhas de E/S e uma versão que sumiu do índice (ex.: corrida com outro worker) não são
+    convertidas nesta exceção, pois podem ser passageiras.
+    """
+
+
+class RegistroModelos:
+    """Índice dos artefatos em `modelos/` com metadados, política de retenção e versão fixada.
+
+    O índice fica em `indice.json` no próprio diretório e é regravado de forma atômica. Cada
+    alteração relê o índice sob uma trava de arquivo, então vários processos (ex.: os workers do
+    treinador) podem compartilhar o diretório sem perder as alterações uns dos outros.
+    Arquivos `modelo_*.joblib` sem entrada no índice (ex.: de versões antigas do treinador)
+    são indexados como `legado`: aparecem na listagem, mas não são carregados automaticamente
+    por não terem os parâmetros do scaler, e a retenção nunca os apaga.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_MODELOS, max_modelos=MAX_MODELOS):
+        self.diretorio = diretorio
+        self.max_modelos = max_modelos
+        self.caminho_indice = os.path.join(diretorio, "indice.json")
+        self.caminho_trava = os.path.join(diretorio, "indice.lock")
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        with self._alterando():
+            self._indexar_orfaos()
+
+    def _ler_indice(self):
+        if not os.path.exists(self.caminho_indice):
+            return {"fixado": None, "modelos": {}}
+        try:
+            with open(self.caminho_indice) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Índice de modelos ilegível ({e}). Reconstruindo a partir dos arquivos.")
+            return {"fixado": None, "modelos": {}}
+
+    @contextmanager
+    def _alterando(self):
+        """Relê o índice sob trava (de threads e de processos) e o grava ao fim do bloco."""
+        with self._lock, open(self.caminho_trava, "a") as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            self.indice = self._ler_indice()
+            yield
+            self._gravar_indice()
+
+    def recarregar(self):
+        """Relê o índice gravado por outro processo."""
+        with self._lock:
+            self.indice = self._ler_indice()
+
+    def _gravar_indice(self):
+        temporario = f"{self.caminho_indice}.tmp"
+        with open(temporario, "w") as f:
+            json.dump(self.indice, f, indent=2)
+        os.replace(temporario, self.caminho_indice)
+
+    def _indexar_orfaos(self):
+        conhecidos = {entrada["arquivo"] for entrada in self.indice["modelos"].values()}
+        novos = 0
+        for caminho in glob.glob(os.path.join(self.diretorio, "modelo_*.joblib")):
+            arquivo = os.path.basename(caminho)
+            if arquivo in conhecidos:
+                continue
+            versao = arquivo[len("modelo_"):-len(".joblib")]
+            self.indice["modelos"][versao] = {
+                "versao": versao,
+                "arquivo": arquivo,
+                "timestamp": datetime.fromtimestamp(os.path.getmtime(caminho)).isoformat(),
+                "tamanho_bytes": os.path.getsize(caminho),
+                "metricas": None,
+                "scaler": None,
+                "status": "legado"
+            }
+            novos += 1
+        # Entradas cujo arquivo sumiu do disco
+        for versao, entrada in list(self.indice["modelos"].items()):
+            if not os.path.exists(os.path.join(self.diretorio, entrada["arquivo"])):
+                del self.indice["modelos"][versao]
+        if novos:
+            logger.info(f"{novos} arquivo(s) de modelo sem metadados indexado(s) como legado")
+
+    def caminho(self, versao):
+        return os.path.join(self.diretorio, self.indice["modelos"][versao]["arquivo"])
+
+    def registrar(self, versao, arquivo, metricas, scaler, impressao=None):
+        """Adiciona uma versão treinada ao índice e aplica a política de retenção."""
+        with self._alterando():
+            self.indice["modelos"][versao] = {
+                "versao": versao,
+                "arquivo": os.path.basename(arquivo),
+                "timestamp": datetime.now().isoformat(),
+                "tamanho_bytes": os.path.getsize(arquivo),
+                "metricas": metricas,
+                "scaler": scaler,
+                "impressao": impressao,
+                "status": "ok"
+            }
+            self._aplicar_retencao()
+
+    def marcar_corrompido(self, versao):
+        """Tira a versão dos candidatos de vez; use só após um ArtefatoInvalido."""
+        with self._alterando():
+            self.indice["modelos"][versao]["status"] = "corrompido"
+
+    def _aplicar_retencao(self):
+        """Mantém as `max_modelos` versões mais recentes (e a fixada); remove os demais arquivos.
+
+        Versões `legado` não foram gravadas pelo registro (podem estar versionadas no git) e ficam fora.
+        """
+        ordenadas = sorted(
+            (e for e in self.indice["modelos"].values() if e["status"] != "legado"),
+            key=lambda e: e["timestamp"], reverse=True
+        )
+        for entrada in ordenadas[self.max_modelos:]:
+            if entrada["versao"] == self.indice["fixado"]:
+                continue
+            caminho = os.path.join(self.diretorio, entrada["arquivo"])
+            for arquivo in (caminho, caminho_floresta(caminho)):
+                try:
+                    os.remove(arquivo)
+                except FileNotFoundError:
+                    pass
+            del self.indice["modelos"][entrada["versao"]]
+            logger.info(f"Retenção: modelo {entrada['versao']} removido")
+
+    def listar(self):
+        return sorted(self.indice["modelos"].values(), key=lambda e: e["timestamp"], reverse=True)
+
+    @property
+    def fixado(self):
+        return self.indice["fixado"]
+
+    def fixar(self, versao):
+        with self._alterando():
+            if versao is not None and versao not in self.indice["modelos"]:
+                raise KeyError(versao)
+            self.indice["fixado"] = versao
+
+    def candidatos(self):
+        """Versões carregáveis, em ordem de preferência: a fixada e depois as mais recentes com status ok."""
+        ordenadas = [e for e in self.listar() if e["status"] == "ok"]
+        fixada = self.indice["modelos"].get(self.indice["fixado"] or "")
+        if fixada is not None and fixada["status"] != "corrompido":
+            ordenadas = [fixada] + [e for e in ordenadas if e["versao"] != fixada["versao"]]
+        return ordenadas
+
+    def carregar(self, versao, compartilhado=True):
+        """Carrega o modelo da versão.
+
+        Com `compartilhado`, usa a floresta exportada ao lado do artefato, se houver: um memmap
+        somente leitura cujas páginas todos os workers dividem. Sem ela (ou para inspecionar o
+        estimador do sklearn), desserializa o .joblib, que fica inteiro na memória do processo.
+        Um arquivo que não pode ser lido como modelo gera ArtefatoInvalido; erros de E/S passam adiante.
+        """
+        caminho = self.caminho(versao)
+        if compartilhado and os.path.exists(caminho_floresta(caminho)):
+            caminho = caminho_floresta(caminho)
+        try:
+            if caminho.endswith(".npy"):
+                return FlorestaMapeada(caminho)
+            return joblib.load(caminho)
+        except OSError:
+            raise
+        except Exception as e:  # o unpickler gera tipos variados com bytes inválidos
+            raise ArtefatoInvalido(f"{os.path.basename(caminho)}: {e!r}") from e
+
+
+def caminho_mais_recente(diretorio=DIRETORIO_MODELOS):
+    """Caminho do modelo mais recente registrado (útil para scripts de avaliação)."""
+    registro = RegistroModelos(diretorio)
+    candidatos = registro.candidatos() or registro.listar()
+    if not candidatos:
+        raise FileNotFoundError(f"Nenhum modelo encontrado em {diretorio}")
+    return os.path.join(diretorio, candidatos[0]["arquivo"])
@@ -1,3 +1,6 @@
+import asyncio
+import math
+import random
 import requests
 import time
 import os
@@ -8,6 +11,7 @@ import seaborn as snsw
 import pandas as pd
 from datetime import datetime
 import uuid
+import httpx
 import logging
 from pathlib import Path
 import numpy as np
@@ -24,14 +28,68 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger('SpiderTest')
+logging.getLogger('httpx').setLevel(logging.WARNING)  # um log por requisição distorceria o teste de carga
 
 # Inicialização do colorama e rich console
 init()
 console = Console()
 
+PERCENTIS = (50, 90, 99, 99.9)
+
+
+class HistogramaLatencia:
+    """Histograma de latências no estilo HDR: baldes logarítmicos com erro relativo fixo.
+
+    Cada latência cai no balde floor(log(v) / log(1 + precisao)), então a memória depende só da
+    faixa de valores (alguns milhares de baldes entre 1 µs e minutos), não do número de
+    requisições, e todo percentil tem erro relativo de no máximo `precisao`.
+    Mínimo, máximo e média são exatos.
+    """
+
+    def __init__(self, precisao=0.001):
+        self.precisao = precisao
+        self._log_base = math.log1p(precisao)
+        self.baldes = {}
+        self.total = 0
+        self.soma = 0.0
+        self.minimo = math.inf
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        micros = max(segundos * 1e6, 1.0)
+        indice = int(math.log(micros) / self._log_base)
+        self.baldes[indice] = self.baldes.get(indice, 0) + 1
+        self.total += 1
+        self.soma += segundos
+        self.minimo = min(self.minimo, segundos)
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        """Latência (s) abaixo da qual estão `p`% das amostras (limite superior do balde)."""
+        if not self.total:
+            return float("nan")
+        alvo = math.ceil(self.total * p / 100)
+        acumulado = 0
+        for indice in sorted(self.baldes):
+            acumulado += self.baldes[indice]
+            if acumulado >= alvo:
+                return min((1 + self.precisao) ** (indice + 1) / 1e6, self.maximo)
+        return self.maximo
+
+    def resumo_ms(self):
+        """p50/p90/p99/p999, mínimo, máximo e média em milissegundos."""
+        nan = float("nan")
+        resumo = {f"p{p:g}".replace(".", ""): round(self.percentil(p) * 1000, 3) for p in PERCENTIS}
+        resumo.update({
+            "min": round(self.minimo * 1000, 3) if self.total else nan,
+            "max": round(self.maximo * 1000, 3) if self.total else nan,
+            "media": round(self.soma / self.total * 1000, 3) if self.total else nan,
+        })
+        return resumo
+
 class SpiderTest:
-    def __init__(self, num_iterations=10):
-        self.base_url = "http://localhost:12779"  # URL do treinador
+    def __init__(self, num_iterations=10, base_url="http://localhost:12779"):
+        self.base_url = base_url  # URL do treinador
         self.test_id = str(uuid.uuid4())
         self.report_dir = self._create_report_dir()
         self.metrics_history = []
@@ -112,24 +170,21 @@ class SpiderTest:
         try:
             # Gerando dados de teste (mais robusto)
             test_ages = np.random.randint(18, 80, size=10)
-            test_results = []
             
-            # Realizando predições
-            for age in test_ages:
-                response = requests.post(
-                    f"{self.base_url}/predict",
-                    json={"idade": int(age)}
-                )
-                if response.status_code == 200:
-                    prediction = response.json()
-                    test_results.append({
-                        "idade": age,
-                        "predicao": prediction["predicao"],
-                        "timestamp": prediction["timestamp"]
-                    })
-                else:
-                    self.console.print(f"[red]❌ Erro na requisição: {response.status_code} - {response.text}[/red]")
-                    return
+            # Realizando predições (uma chamada em lote)
+            response = requests.post(
+                f"{self.base_url}/predict/batch",
+                json={"idades": test_ages.tolist()}
+            )
+            if response.status_code == 200:
+                prediction = response.json()
+                test_results = [
+                    {"idade": age, "predicao": predicao, "timestamp": prediction["timestamp"]}
+                    for age, predicao in zip(test_ages, prediction["predicoes"])
+                ]
+            else:
+                self.console.print(f"[red]❌ Erro na requisição: {response.status_code} - {response.text}[/red]")
+                return
             
             # Calculando métricas
             predictions = np.array([r["predicao"] for r in test_results])
@@ -184,11 +239,125 @@ class SpiderTest:
                 progress.update(task, advance=1)
                 time.sleep(1)
 
+    async def _requisitar(self, cliente, endpoint, tamanho_lote):
+        """Uma predição; devolve None em caso de sucesso ou a descrição do erro."""
+        try:
+            if endpoint == "/predict/batch":
+                response = await cliente.post(endpoint, json={"idades": [random.randint(18, 80) for _ in range(tamanho_lote)]})
+            else:
+                response = await cliente.post(endpoint, json={"idade": random.randint(18, 80)})
+            return None if response.status_code == 200 else f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            return type(e).__name__
+
+    async def run_load_test(self, duracao=30, aquecimento=5, concorrencia=10, rps=None,
+                            endpoint="/predict", tamanho_lote=10, timeout=10):
+        """Gera carga no treinador e mede latência, erros e vazão.
+
+        Sem `rps`, `concorrencia` workers fazem requisições uma após a outra (carga fechada: mede a
+        vazão máxima). Com `rps`, as requisições são disparadas em instantes fixos, independentemente
+        das respostas (carga aberta), com no máximo `concorrencia` em voo; a latência é contada a
+        partir do instante agendado, então a espera por uma vaga entra na medição em vez de esconder
+        a saturação. Requisições agendadas nos primeiros `aquecimento` segundos não entram nas métricas.
+        """
+        histograma = HistogramaLatencia()
+        erros = {}
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+        inicio_medicao = inicio + aquecimento
+        fim = inicio_medicao + duracao
+        limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+
+        async def medir(cliente, agendado):
+            erro = await self._requisitar(cliente, endpoint, tamanho_lote)
+            if agendado < inicio_medicao:
+                return
+            if erro is None:
+                histograma.registrar(loop.time() - agendado)
+            else:
+                erros[erro] = erros.get(erro, 0) + 1
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=timeout, limits=limites) as cliente:
+            if rps:
+                vagas = asyncio.Semaphore(concorrencia)
+
+                async def disparar(agendado):
+                    async with vagas:
+                        await medir(cliente, agendado)
+
+                tarefas, i = set(), 0
+                while (agendado := inicio + i / rps) < fim:
+                    await asyncio.sleep(max(0, agendado - loop.time()))
+                    tarefa = asyncio.create_task(disparar(agendado))
+                    tarefas.add(tarefa)
+                    tarefa.add_done_callback(tarefas.discard)
+                    i += 1
+                await asyncio.gather(*tarefas)
+            else:
+                async def worker():
+                    while (agendado := loop.time()) < fim:
+                        await medir(cliente, agendado)
+
+                await asyncio.gather(*(worker() for _ in range(concorrencia)))
+        decorrido = loop.time() - inicio_medicao
+
+        total_erros = sum(erros.values())
+        requisicoes = histograma.total + total_erros
+        predicoes_por_requisicao = tamanho_lote if endpoint == "/predict/batch" else 1
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "modo": "carga aberta" if rps else "carga fechada",
+            "url": self.base_url,
+            "endpoint": endpoint,
+            "tamanho_lote": predicoes_por_requisicao,
+            "rps_alvo": rps,
+            "concorrencia": concorrencia,
+            "duracao_s": duracao,
+            "aquecimento_s": aquecimento,
+            "requisicoes": requisicoes,
+            "sucessos": histograma.total,
+            "erros": total_erros,
+            "taxa_erro": round(total_erros / requisicoes, 6) if requisicoes else 0.0,
+            "erros_por_tipo": erros,
+            "vazao_rps": round(histograma.total / decorrido, 2),
+            "predicoes_por_s": round(histograma.total * predicoes_por_requisicao / decorrido, 2),
+            "latencia_ms": histograma.resumo_ms(),
+        }
+
+    def run_load(self, **parametros):
+        """Executa o teste de carga, exibe o resumo e salva o relatório em JSON e YAML."""
+        self.console.print(f"🕷️ Teste de carga em {self.base_url}{parametros.get('endpoint', '/predict')}...")
+        metrics = asyncio.run(self.run_load_test(**parametros))
+        latencia = metrics["latencia_ms"]
+        self.console.print(Panel.fit(
+            f"⚡ Resultado da Carga ({metrics['modo']}):\n"
+            f"Requisições: {metrics['requisicoes']} ({metrics['erros']} erros, taxa {metrics['taxa_erro']:.2%})\n"
+            f"Vazão: {metrics['vazao_rps']:.1f} req/s ({metrics['predicoes_por_s']:.1f} predições/s)\n"
+            f"Latência (ms): p50 {latencia['p50']:.2f} | p90 {latencia['p90']:.2f} | "
+            f"p99 {latencia['p99']:.2f} | p999 {latencia['p999']:.2f} | máx {latencia['max']:.2f}",
+            style="bold green"
+        ))
+        self._save_metrics(metrics, 'json')
+        self._save_metrics(metrics, 'yaml')
+        return metrics
+
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Executa testes no modelo.')
     parser.add_argument('--iterations', type=int, default=10, help='Número de iterações dos testes.')
+    parser.add_argument('--url', default="http://localhost:12779", help='URL do treinador.')
+    parser.add_argument('--carga', action='store_true', help='Executa o teste de carga em vez dos testes funcionais.')
+    parser.add_argument('--duracao', type=float, default=30, help='Carga: segundos de medição.')
+    parser.add_argument('--aquecimento', type=float, default=5, help='Carga: segundos iniciais descartados das métricas.')
+    parser.add_argument('--concorrencia', type=int, default=10, help='Carga: requisições simultâneas (workers ou máximo em voo).')
+    parser.add_argument('--rps', type=float, help='Carga: taxa fixa de requisições por segundo (padrão: carga fechada, o mais rápido possível).')
+    parser.add_argument('--endpoint', default='/predict', choices=['/predict', '/predict/batch'])
+    parser.add_argument('--tamanho-lote', type=int, default=10, help='Carga: idades por requisição em /predict/batch.')
     args = parser.parse_args()
-    spider = SpiderTest(args.iterations)
-    spider.run_tests()
+    spider = SpiderTest(args.iterations, args.url)
+    if args.carga:
+        spider.run_load(duracao=args.duracao, aquecimento=args.aquecimento, concorrencia=args.concorrencia,
+                        rps=args.rps, endpoint=args.endpoint, tamanho_lote=args.tamanho_lote)
+    else:
+        spider.run_tests()
@@ -1,14 +1,15 @@
-import subprocess
-import time
 import logging
 from datetime import datetime
 import os
-from multiprocessing import Process
 import signal
-import sys
 import asyncio
-import requests
+import httpx
 import socket
+import argparse
+from contextlib import contextmanager
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query
+from logs_servicos import LogsServico, criar_pipe, drenar
 
 # Configuração de logging
 logging.basicConfig(
@@ -21,6 +22,7 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger('StreamPipelineLauncher')
+logging.getLogger('httpx').setLevel(logging.WARNING)  # sem uma linha por verificação de /status
 
 # Configuração dos serviços com novas portas
 SERVICES = [
@@ -30,7 +32,9 @@ SERVICES = [
         'port': 12777,
         'process': None,
         'max_retries': 3,
-        'retry_delay': 10
+        'retry_delay': 10,
+        'depends_on': [],  # só inicia depois que estes responderem /status
+        'status_path': '/status'
     },
     {
         'name': 'Normalizador',
@@ -38,7 +42,9 @@ SERVICES = [
         'port': 12778,
         'process': None,
         'max_retries': 3,
-        'retry_delay': 10
+        'retry_delay': 10,
+        'depends_on': ['gerador_stream'],
+        'status_path': '/status'
     },
     {
         'name': 'Treinador',
@@ -46,7 +52,10 @@ SERVICES = [
         'port': 12779,
         'process': None,
         'max_retries': 3,
-        'retry_delay': 10
+        'retry_delay': 10,
+        'depends_on': ['normalizador_stream'],
+        'status_path': '/status',
+        'workers': int(os.environ.get('WORKERS_TREINADOR', 1))  # processos uvicorn; um treina e todos predizem
     },
     {
         'name': 'Consumidor',
@@ -54,18 +63,51 @@ SERVICES = [
         'port': 12780,
         'process': None,
         'max_retries': 3,
-        'retry_delay': 10
+        'retry_delay': 10,
+        'depends_on': ['treinador_stream'],
+        'status_path': '/api/status'
     }
 ]
 
+# "polling" (intervalos fixos) ou "push" (cada estágio acorda com os eventos SSE do anterior)
+MODO_PIPELINE = os.environ.get("MODO_PIPELINE", "polling")
+# "http" (dados no corpo das respostas) ou "shm" (lotes Arrow em memória compartilhada; HTTP só para controle)
+TRANSPORTE_DADOS = os.environ.get("TRANSPORTE_DADOS", "http")
+
+TIMEOUT_PRONTIDAO = float(os.environ.get("TIMEOUT_PRONTIDAO", 60))  # segundos até o primeiro /status 200 de um serviço
+INTERVALO_PRONTIDAO = 0.2  # segundos entre tentativas enquanto o serviço sobe
+PORTA_LAUNCHER = int(os.environ.get("PORTA_LAUNCHER", 12781))  # API do lançador (cauda dos logs e estado dos processos)
+TIMEOUT_DRENAGEM = 5  # segundos para ler o resto dos pipes de um serviço encerrado
+INTERVALO_SAUDE = float(os.environ.get("INTERVALO_SAUDE", 15))  # segundos entre verificações de /status dos serviços
+FALHAS_SAUDE = int(os.environ.get("FALHAS_SAUDE", 3))  # verificações seguidas sem resposta até reiniciar o serviço
+TIMEOUT_STATUS = 5  # segundos por requisição de /status
+TEMPO_ESTAVEL = 60  # segundos no ar para que uma queda não conte como falha seguida
+
+
+def ambiente_servicos():
+    """Variáveis de ambiente dos serviços: modo do pipeline, transporte de dados e URLs nas portas definidas em SERVICES."""
+    portas = {service['file']: service['port'] for service in SERVICES}
+    env = os.environ.copy()
+    env.update({
+        'MODO_PIPELINE': MODO_PIPELINE,
+        'TRANSPORTE_DADOS': TRANSPORTE_DADOS,
+        'URL_GERADOR': f"http://localhost:{portas['gerador_stream']}",
+        'URL_NORMALIZADOR': f"http://localhost:{portas['normalizador_stream']}",
+        'URL_TREINADOR': f"http://localhost:{portas['treinador_stream']}",
+    })
+    return env
+
 
 def check_port(port):
     """Verifica se a porta está em uso usando sockets"""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         return s.connect_ex(('localhost', port)) == 0
 
-def start_service(service):
-    """Inicia um serviço específico com tratamento de erros e reinicialização"""
+async def start_service(service):
+    """Inicia o processo uvicorn de um serviço e a leitura contínua do stdout/stderr para service['logs'].
+
+    Não espera a inicialização (ver SupervisorPipeline.aguardar_pronto).
+    """
     try:
         # Verifica se o arquivo existe antes de tentar executar
         module_path = f"{service['file']}.py"
@@ -73,99 +115,300 @@ def start_service(service):
             logger.error(f"Arquivo {module_path} não encontrado")
             return None
 
-        process = subprocess.Popen(
-            ['python', '-m', 'uvicorn', f"{service['file']}:app", '--host', '0.0.0.0', '--port', str(service['port'])],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
-        time.sleep(2)  # Aguarda inicialização
-        
-        # Verifica se o processo está rodando
-        if process.poll() is None:
-            logger.info(f"Iniciado {service['name']} na porta {service['port']} (PID: {process.pid})")
-            return process
-        else:
-            logger.error(f"Falha ao iniciar {service['name']}")
-            return None
-            
+        pipes = {fluxo: criar_pipe() for fluxo in ('stdout', 'stderr')}
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'python', '-m', 'uvicorn', f"{service['file']}:app", '--host', '0.0.0.0', '--port', str(service['port']),
+                '--timeout-graceful-shutdown', '5',  # streams SSE abertos não seguram o encerramento
+                *(['--workers', str(service['workers'])] if service.get('workers', 1) > 1 else []),
+                env=ambiente_servicos(),
+                stdout=pipes['stdout'][1],
+                stderr=pipes['stderr'][1],
+                start_new_session=True  # grupo próprio: workers e pools do serviço são encerrados juntos
+            )
+        except Exception:
+            for leitura, _ in pipes.values():
+                os.close(leitura)
+            raise
+        finally:
+            for _, escrita in pipes.values():
+                os.close(escrita)  # só o filho escreve; sem isso o EOF nunca chegaria
+        service['drenos'] = [
+            asyncio.create_task(drenar(leitura, service['logs'], fluxo)) for fluxo, (leitura, _) in pipes.items()
+        ]
+        logger.info(f"Iniciando {service['name']} na porta {service['port']} (PID: {process.pid})")
+        return process
+
     except Exception as e:
         logger.error(f"Erro ao iniciar {service['name']}: {str(e)}")
         return None
 
-def stop_service(service):
+async def wait_process(service, timeout=None):
+    """Espera o processo do serviço terminar e seus pipes serem lidos até o fim; retorna o código de saída."""
+    codigo = await asyncio.wait_for(service['process'].wait(), timeout=timeout)
+    # Netos que herdaram os pipes (ex.: o pool de geração) podem segurá-los abertos: não espera para sempre
+    _, pendentes = await asyncio.wait(service['drenos'], timeout=TIMEOUT_DRENAGEM)
+    for tarefa in pendentes:
+        tarefa.cancel()
+    return codigo
+
+def matar_grupo(process):
+    """SIGKILL no grupo do serviço (o uvicorn, seus workers e os processos dos pools).
+
+    Só no processo principal, um SIGKILL deixaria os filhos órfãos segurando a porta, e o
+    reinício falharia. Sem membros vivos no grupo, não faz nada.
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+async def stop_service(service):
     """Para um serviço específico"""
-    if service['process']:
+    process = service['process']
+    if process and process.returncode is None:
         try:
-            service['process'].terminate()
-            service['process'].wait(timeout=5)
+            process.terminate()  # o uvicorn encerra os próprios workers
+            await wait_process(service, timeout=10)
             logger.info(f"Serviço {service['name']} finalizado")
-        except subprocess.TimeoutExpired:
-            service['process'].kill()
+        except asyncio.TimeoutError:
+            matar_grupo(process)
+            await wait_process(service)
             logger.warning(f"Forçando finalização do serviço {service['name']}")
         except Exception as e:
             logger.error(f"Erro ao parar o serviço {service['name']}: {e}")
-        service['process'] = None
-
-def start_pipeline(wait_time=5):
-    """Inicia todo o pipeline"""
-    logger.info("Iniciando Pipeline de Streaming...")
-    if not os.path.exists('modelos'):
-        os.makedirs('modelos')
-        logger.info("Diretório 'modelos' criado")
-    for service in SERVICES:
-        service['process'] = start_service(service)
-        time.sleep(wait_time)
-
-def stop_pipeline():
-    """Para todo o pipeline"""
-    logger.info("Finalizando Pipeline de Streaming...")
-    for service in reversed(SERVICES):
-        stop_service(service)
+    if process:
+        matar_grupo(process)  # filhos que sobreviveram ao encerramento do processo principal
+    service['process'] = None
+
+
+class SupervisorPipeline:
+    """Sobe, vigia e reinicia os serviços do pipeline em um único event loop.
 
-def signal_handler(signum, frame):
-    """Manipulador de sinais para parada graciosa"""
-    logger.info("Sinal de interrupção recebido. Iniciando parada graciosa...")
-    stop_pipeline()
-    sys.exit(0)
+    Cada serviço tem uma tarefa própria: espera os serviços de `depends_on` ficarem prontos
+    (porta aberta e `/status` respondendo), inicia o processo e, se ele cair, o reinicia com
+    espera exponencial (`retry_delay`, 2×, 4×...) até `max_retries` quedas seguidas. Serviços
+    sem dependência pendente sobem em paralelo, e a verificação de saúde roda ao lado. Um
+    serviço que desiste marca `falhas`, e os que dependem dele também desistem em vez de esperar.
+    """
 
-def monitor_services():
-    """Monitora os serviços e reinicia se necessário"""
-    while True:
+    def __init__(self):
+        self.prontos = {service['file']: asyncio.Event() for service in SERVICES}
+        self.falhas = {service['file']: asyncio.Event() for service in SERVICES}  # desistiu de subir o serviço
+        self.parando = asyncio.Event()
+        self.falhas_saude = {service['file']: 0 for service in SERVICES}
+        self.no_ar = set()  # serviços cujo processo atual já respondeu /status (os verificados pela saúde)
+        self.cliente = None
+        self.reinicios = {service['file']: 0 for service in SERVICES}
         for service in SERVICES:
-            if service['process'] and service['process'].poll() is not None:
-                logger.warning(f"{service['name']} caiu! Tentando reiniciar...")
-                service['process'] = start_service(service)
-        time.sleep(10)
+            service['logs'] = LogsServico(service['file'])
+            service['drenos'] = []
 
-async def monitor_pipeline():
-    while True:
+    async def status_ok(self, service):
         try:
-            response = requests.get("http://localhost:12780/status", timeout=5)
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            status = response.json()
-            logger.info(f"Último consumo: {status['ultima_predicao']} em {status['ultima_tentativa']}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro ao monitorar pipeline: {e}")
-        except KeyError as e:
-            logger.error(f"Resposta do consumidor inválida: {e}")
-        except Exception as e:
-            logger.exception(f"Erro inesperado ao monitorar pipeline: {e}")
-        await asyncio.sleep(60)
+            response = await self.cliente.get(f"http://localhost:{service['port']}{service['status_path']}")
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    async def aguardar_pronto(self, service, inicio):
+        """Espera a porta abrir e o `/status` responder 200, até TIMEOUT_PRONTIDAO segundos."""
+        loop = asyncio.get_running_loop()
+        process = service['process']
+        while loop.time() - inicio < TIMEOUT_PRONTIDAO:
+            if process.returncode is not None:
+                return False
+            if check_port(service['port']) and await self.status_ok(service):
+                return True
+            await asyncio.sleep(INTERVALO_PRONTIDAO)
+        return False
+
+    async def esperar(self, segundos):
+        """Dorme `segundos` ou até o encerramento; retorna True se o pipeline está parando."""
+        try:
+            await asyncio.wait_for(self.parando.wait(), timeout=segundos)
+        except asyncio.TimeoutError:
+            pass
+        return self.parando.is_set()
+
+    async def aguardar_servico(self, arquivo):
+        """Espera o serviço ficar pronto ou ser abandonado; retorna True se ficou pronto."""
+        esperas = [asyncio.create_task(self.prontos[arquivo].wait()), asyncio.create_task(self.falhas[arquivo].wait())]
+        try:
+            await asyncio.wait(esperas, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for espera in esperas:
+                espera.cancel()
+        return self.prontos[arquivo].is_set()
+
+    async def supervisionar(self, service):
+        for dependencia in service['depends_on']:
+            if not await self.aguardar_servico(dependencia):
+                logger.error(f"{service['name']} não será iniciado: a dependência {dependencia} falhou")
+                self.falhas[service['file']].set()
+                return
+        if check_port(service['port']):
+            # Outra instância já ocupa a porta: usa a existente se ela responder, sem supervisioná-la
+            if await self.status_ok(service):
+                logger.warning(f"Porta {service['port']} já em uso; usando a instância existente de {service['name']}")
+                self.prontos[service['file']].set()
+            else:
+                logger.error(f"Porta {service['port']} ocupada por outro processo; {service['name']} não será iniciado")
+                self.falhas[service['file']].set()
+            return
+
+        loop = asyncio.get_running_loop()
+        quedas = 0
+        while not self.parando.is_set():
+            inicio = loop.time()
+            service['process'] = await start_service(service)
+            if service['process'] is not None:
+                if await self.aguardar_pronto(service, inicio):
+                    self.falhas_saude[service['file']] = 0
+                    self.prontos[service['file']].set()
+                    self.no_ar.add(service['file'])
+                    logger.info(f"{service['name']} pronto em {loop.time() - inicio:.1f} s")
+                elif service['process'].returncode is None:
+                    logger.error(f"{service['name']} não respondeu {service['status_path']} em {TIMEOUT_PRONTIDAO:.0f} s; reiniciando")
+                    matar_grupo(service['process'])
+                codigo = await wait_process(service)
+                matar_grupo(service['process'])  # workers ou pools órfãos do processo que caiu
+                self.no_ar.discard(service['file'])
+                if self.parando.is_set():
+                    return
+                if loop.time() - inicio > TEMPO_ESTAVEL:
+                    quedas = 0  # rodou estável: a queda não conta como falha seguida
+                logger.warning(f"{service['name']} caiu (código {codigo})")
+            quedas += 1
+            self.reinicios[service['file']] += 1
+            if quedas > service['max_retries']:
+                logger.error(f"{service['name']} falhou {quedas} vezes seguidas; desistindo de reiniciar")
+                self.falhas[service['file']].set()
+                return
+            espera = service['retry_delay'] * 2 ** (quedas - 1)
+            logger.warning(f"Reiniciando {service['name']} em {espera:.0f} s (tentativa {quedas}/{service['max_retries']})")
+            if await self.esperar(espera):
+                return
+
+    async def verificar_saude(self, service):
+        """Um `/status`; após FALHAS_SAUDE falhas seguidas, encerra o processo para que seja reiniciado."""
+        process = service['process']
+        if service['file'] not in self.no_ar or process.returncode is not None:
+            return
+        try:
+            response = await self.cliente.get(f"http://localhost:{service['port']}{service['status_path']}")
+            response.raise_for_status()
+            self.falhas_saude[service['file']] = 0
+            if service['file'] == 'consumidor_stream':
+                status = response.json()
+                logger.info(f"Último consumo: {status['ultima_predicao']} em {status['ultima_tentativa']}")
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            self.falhas_saude[service['file']] += 1
+            falhas = self.falhas_saude[service['file']]
+            logger.warning(f"{service['name']} sem resposta em {service['status_path']} ({falhas}/{FALHAS_SAUDE}): {e!r}")
+            if falhas >= FALHAS_SAUDE and process.returncode is None:
+                logger.error(f"{service['name']} travado; encerrando o processo para reiniciar")
+                self.falhas_saude[service['file']] = 0
+                matar_grupo(process)
+
+    async def monitorar_saude(self):
+        while not await self.esperar(INTERVALO_SAUDE):
+            await asyncio.gather(*(self.verificar_saude(service) for service in SERVICES))
+
+    async def registrar_partida(self, inicio):
+        prontos = await asyncio.gather(*(self.aguardar_servico(service['file']) for service in SERVICES))
+        falharam = [service['name'] for service, pronto in zip(SERVICES, prontos) if not pronto]
+        if falharam:
+            logger.error(f"Pipeline incompleto: {', '.join(falharam)} não subiram")
+            return
+        logger.info(f"Pipeline pronto em {asyncio.get_running_loop().time() - inicio:.1f} s")
+
+    async def executar(self):
+        """Sobe o pipeline e o mantém até SIGINT/SIGTERM; então encerra os serviços na ordem inversa."""
+        logger.info(f"Iniciando Pipeline de Streaming (modo {MODO_PIPELINE}, transporte {TRANSPORTE_DADOS})...")
+        if not os.path.exists('modelos'):
+            os.makedirs('modelos')
+            logger.info("Diretório 'modelos' criado")
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sinal, self.parando.set)
+
+        app.state.supervisor = self
+        servidor = ServidorLauncher(uvicorn.Config(app, host='127.0.0.1', port=PORTA_LAUNCHER, log_level='warning'))
+        async with httpx.AsyncClient(timeout=TIMEOUT_STATUS) as self.cliente:
+            tarefas = [asyncio.create_task(self.supervisionar(service)) for service in SERVICES]
+            tarefas.append(asyncio.create_task(self.monitorar_saude()))
+            tarefas.append(asyncio.create_task(self.registrar_partida(loop.time())))
+            api = asyncio.create_task(servidor.serve())
+            await self.parando.wait()
+            logger.info("Sinal de interrupção recebido. Iniciando parada graciosa...")
+            for tarefa in tarefas:
+                tarefa.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+            await stop_pipeline()
+            servidor.should_exit = True
+            await api
+        for service in SERVICES:
+            service['logs'].fechar()
+
+
+class ServidorLauncher(uvicorn.Server):
+    """uvicorn da API do lançador, rodando no mesmo event loop; os sinais ficam com o supervisor."""
+
+    @contextmanager
+    def capture_signals(self):
+        yield
+
+
+app = FastAPI(title="Lançador do Pipeline")
+
+@app.get("/status")
+async def get_status():
+    """Processos supervisionados: PID, se está no ar, se o lançador desistiu dele e quantas vezes foi reiniciado."""
+    supervisor = app.state.supervisor
+    return {
+        service['file']: {
+            "pid": service['process'].pid if service['process'] else None,
+            "no_ar": service['file'] in supervisor.no_ar,
+            "falhou": supervisor.falhas[service['file']].is_set(),
+            "reinicios": supervisor.reinicios[service['file']],
+            "linhas_log": service['logs'].total_linhas,
+            "arquivo_log": service['logs'].caminho,
+        }
+        for service in SERVICES
+    }
+
+@app.get("/logs")
+async def get_logs(
+    linhas: int = Query(50, ge=0, le=10_000, description="Máximo de linhas retornadas"),
+    servico: str | None = Query(None, description="Arquivo do serviço (ex.: gerador_stream); padrão: todos"),
+    nivel: str | None = Query(None, description="Só linhas deste nível (INFO, WARNING, ERROR...)"),
+):
+    """Últimas linhas de log dos serviços (cauda em memória), em ordem cronológica."""
+    servicos = [service for service in SERVICES if servico in (None, service['file'])]
+    if not servicos:
+        raise HTTPException(status_code=404, detail=f"Serviço desconhecido: {servico}")
+    registros = [r for service in servicos for r in service['logs'].ultimas(linhas, nivel)]
+    registros.sort(key=lambda r: r["timestamp"])
+    return {"linhas": registros[-linhas:] if linhas else []}
+
+async def stop_pipeline():
+    """Para todo o pipeline"""
+    logger.info("Finalizando Pipeline de Streaming...")
+    for service in reversed(SERVICES):
+        await stop_service(service)
 
 if __name__ == "__main__":
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    parser = argparse.ArgumentParser(description='Inicia os serviços do pipeline de streaming.')
+    parser.add_argument('--modo', choices=['polling', 'push'], default=MODO_PIPELINE,
+                        help='polling: cada estágio consulta o anterior em intervalos fixos; push: cada estágio é avisado assim que há dados novos.')
+    parser.add_argument('--transporte', choices=['http', 'shm'], default=TRANSPORTE_DADOS,
+                        help='http: dados no corpo das respostas; shm: lotes publicados em memória compartilhada (mesmo host).')
+    args = parser.parse_args()
+    MODO_PIPELINE = args.modo
+    TRANSPORTE_DADOS = args.transporte
 
     try:
-        start_pipeline()
-        monitor_services() # adicionando monitoramento de serviços
-        asyncio.run(monitor_pipeline())
-    except KeyboardInterrupt:
-        logger.info("Interrupção manual detectada")
-        stop_pipeline()
+        asyncio.run(SupervisorPipeline().executar())
     except Exception as e:
-        logger.error(f"Erro não esperado: {str(e)}")
-        stop_pipeline()
-    finally:
-        logger.info("Pipeline finalizado")
+        logger.exception(f"Erro não esperado: {str(e)}")
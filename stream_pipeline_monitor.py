@@ -13,10 +13,29 @@ import os
 import asyncio
 from typing import Dict
 import json
+import logging
+from collections import deque
 import aiohttp
 
 # Configuração inicial
 console = Console()
+logger = logging.getLogger('StreamPipelineMonitor')
+
+# Mesmas portas e rotas de status de stream_pipeline_launcher.SERVICES
+SERVICES = [
+    {'name': 'Gerador de Dados', 'port': 12777, 'status_path': '/status'},
+    {'name': 'Normalizador', 'port': 12778, 'status_path': '/status'},
+    {'name': 'Treinador', 'port': 12779, 'status_path': '/status'},
+    {'name': 'Consumidor', 'port': 12780, 'status_path': '/api/status'},
+]
+
+INTERVALO_SONDAGEM = float(os.environ.get("INTERVALO_SONDAGEM", 10))  # segundos entre rodadas de sondagem de status
+TIMEOUT_SONDAGEM = float(os.environ.get("TIMEOUT_SONDAGEM", 2))
+HISTORICO_RTT = int(os.environ.get("HISTORICO_RTT", 30))  # sondagens guardadas por serviço para o gráfico de RTT
+BARRAS_RTT = "▁▂▃▄▅▆▇█"
+PORTA_LAUNCHER = int(os.environ.get("PORTA_LAUNCHER", 12781))  # API de logs do stream_pipeline_launcher
+LINHAS_LOG_MONITOR = int(os.environ.get("LINHAS_LOG_MONITOR", 10))  # últimas linhas de log exibidas
+CORES_NIVEL = {'WARNING': 'yellow', 'ERROR': 'red', 'CRITICAL': 'bold red', 'DEBUG': 'dim'}
 
 # Emojis e símbolos para status
 STATUS_SYMBOLS = {
@@ -45,33 +64,75 @@ class ServiceMonitor:
         for service in SERVICES:
             self.services[service['name']] = {
                 'port': service['port'],
+                'status_path': service['status_path'],
                 'status': 'offline',
                 'last_check': None,
-                'metrics': {}
+                'metrics': {},
+                'rtt': deque(maxlen=HISTORICO_RTT),  # ms por sondagem; None quando não houve resposta
             }
+        self.logs = []  # últimas linhas de todos os serviços, via GET /logs do lançador
+        self.logs_erro = "aguardando o lançador"
+        self.last_update = datetime.now()
+
+    async def probe_service(self, session, service_name, service_info):
+        """Consulta a rota de status de um serviço e registra o tempo de ida e volta da sondagem."""
+        inicio = time.perf_counter()
+        try:
+            async with session.get(f"http://localhost:{service_info['port']}{service_info['status_path']}") as response:
+                if response.status == 200:
+                    service_info['metrics'] = await response.json()
+                    service_info['status'] = 'online'
+                else:
+                    service_info['metrics'] = {'erro': f"HTTP {response.status}"}
+                    service_info['status'] = 'error'
+            service_info['rtt'].append((time.perf_counter() - inicio) * 1000)
+        except Exception as e:
+            service_info['rtt'].append(None)
+            service_info['metrics'] = {'erro': str(e) or type(e).__name__}
+            service_info['status'] = 'offline'
+            logger.debug(f"Erro ao verificar {service_name}: {e!r}")
+        service_info['last_check'] = datetime.now()
+
+    async def probe_logs(self, session):
+        """Busca no lançador as últimas linhas de log de todos os serviços (cauda em memória)."""
+        try:
+            async with session.get(f"http://localhost:{PORTA_LAUNCHER}/logs", params={'linhas': LINHAS_LOG_MONITOR}) as response:
+                response.raise_for_status()
+                self.logs = (await response.json())['linhas']
+                self.logs_erro = None
+        except Exception as e:
+            self.logs_erro = f"lançador indisponível na porta {PORTA_LAUNCHER} ({str(e) or type(e).__name__})"
+            logger.debug(f"Erro ao buscar logs: {e!r}")
 
     async def check_services(self):
-        """Verifica o status de todos os serviços"""
-        while True:
-            for service_name, service_info in self.services.items():
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(
-                            f"http://localhost:{service_info['port']}/status",
-                            timeout=2
-                        ) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                service_info['status'] = 'online'
-                                service_info['last_check'] = datetime.now()
-                                service_info['metrics'] = data
-                            else:
-                                service_info['status'] = 'error'
-                except Exception as e:
-                    service_info['status'] = 'offline'
-                    logger.error(f"Erro ao verificar {service_name}: {str(e)}")
-            
-            await asyncio.sleep(10)  # Verifica a cada 10 segundos
+        """Sonda todos os serviços a cada INTERVALO_SONDAGEM segundos.
+
+        Uma única sessão (pool de conexões keep-alive) é reaproveitada em todas as rodadas, e as
+        sondagens de uma rodada saem juntas com `asyncio.gather`: a rodada dura o RTT do serviço
+        mais lento, não a soma de todos. Roda como tarefa própria, separada da renderização.
+        """
+        timeout = aiohttp.ClientTimeout(total=TIMEOUT_SONDAGEM)
+        connector = aiohttp.TCPConnector(limit=len(self.services) + 1, keepalive_timeout=INTERVALO_SONDAGEM * 3)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            while True:
+                await asyncio.gather(self.probe_logs(session), *(
+                    self.probe_service(session, service_name, service_info)
+                    for service_name, service_info in self.services.items()
+                ))
+                await asyncio.sleep(INTERVALO_SONDAGEM)
+
+    def format_rtt(self, historico) -> str:
+        """Último RTT e histórico em barras (✕ = sondagem sem resposta)."""
+        if not historico:
+            return "-"
+        validos = [rtt for rtt in historico if rtt is not None]
+        maximo = max(validos, default=0) or 1
+        barras = "".join(
+            "✕" if rtt is None else BARRAS_RTT[min(int(rtt / maximo * len(BARRAS_RTT)), len(BARRAS_RTT) - 1)]
+            for rtt in historico
+        )
+        ultimo = f"{historico[-1]:.1f} ms" if historico[-1] is not None else "sem resposta"
+        return f"{ultimo}\n{barras}"
 
     def create_status_table(self) -> Table:
         """Cria tabela de status dos serviços"""
@@ -81,6 +142,7 @@ class ServiceMonitor:
         table.add_column("Serviço", style="cyan", justify="left")
         table.add_column("Status", justify="center")
         table.add_column("Porta", justify="center")
+        table.add_column("RTT", justify="left", max_width=HISTORICO_RTT + 2)
         table.add_column("Métricas", justify="left", max_width=60) # Limita a largura
         table.add_column("Última Atualização", justify="right")
 
@@ -92,8 +154,9 @@ class ServiceMonitor:
                 f"{service_name.title()}",
                 f"{status_emoji} {info['status'].upper()}",
                 str(info['port']),
+                self.format_rtt(info['rtt']),
                 metrics_str,
-                datetime.now().strftime("%H:%M:%S")
+                info['last_check'].strftime("%H:%M:%S") if info['last_check'] else "-"
             )
 
         return table
@@ -116,6 +179,22 @@ class ServiceMonitor:
             padding=(1, 2)
         )
 
+    def create_logs_panel(self) -> Panel:
+        """Cria painel com as últimas linhas de log dos serviços"""
+        if self.logs_erro:
+            conteudo = Text(self.logs_erro, style="dim")
+        elif not self.logs:
+            conteudo = Text("Sem logs", style="dim")
+        else:
+            conteudo = Text(no_wrap=True, overflow="ellipsis")
+            for i, linha in enumerate(self.logs):
+                if i:
+                    conteudo.append("\n")
+                conteudo.append(f"{linha['timestamp'][11:19]} {linha['servico']:<20} ", style="cyan")
+                conteudo.append(f"{linha['nivel']:<8} ", style=CORES_NIVEL.get(linha['nivel'], 'green'))
+                conteudo.append(linha['mensagem'])
+        return Panel(conteudo, title="📜 Logs", border_style="magenta")
+
     def format_metrics(self, metrics: Dict) -> str:
         """Formata as métricas para exibição"""
         if not metrics:
@@ -140,6 +219,7 @@ class ServiceMonitor:
         layout.split(
             Layout(name="header", size=3),
             Layout(name="main"),
+            Layout(name="logs", size=LINHAS_LOG_MONITOR + 2),
             Layout(name="footer", size=5)
         )
         
@@ -151,6 +231,9 @@ class ServiceMonitor:
         
         # Main content
         layout["main"].update(self.create_status_table())
+
+        # Logs
+        layout["logs"].update(self.create_logs_panel())
         
         # Footer
         layout["footer"].update(self.create_system_panel())
@@ -160,11 +243,14 @@ class ServiceMonitor:
 async def main():
     monitor = ServiceMonitor()
     
-    with Live(monitor.create_layout(), refresh_per_second=1, screen=True) as live:
-        while True:
-            await monitor.check_services()
-            live.update(monitor.create_layout())
-            await asyncio.sleep(1)
+    sondagem = asyncio.create_task(monitor.check_services())
+    try:
+        with Live(monitor.create_layout(), refresh_per_second=1, screen=True) as live:
+            while True:
+                live.update(monitor.create_layout())
+                await asyncio.sleep(1)
+    finally:
+        sondagem.cancel()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,109 @@
+import hashlib
+import io
+import json
+
+import pandas as pd
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from memoria_compartilhada import MIME_SHM, ler_segmentos, shm_ativo
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional: sem ele os serviços falam apenas JSON
+    pa = None
+
+MIME_ARROW = "application/vnd.apache.arrow.stream"
+MIME_PARQUET = "application/vnd.apache.parquet"
+MIME_JSON = "application/json"
+
+# Accept enviado pelos consumidores: formatos colunares primeiro, JSON como fallback
+ACCEPT_COLUNAR = f"{MIME_ARROW}, {MIME_PARQUET};q=0.9, {MIME_JSON};q=0.5"
+# Accept dos consumidores de dados: com TRANSPORTE_DADOS=shm, pede primeiro a referência em memória compartilhada
+ACCEPT_DADOS = f"{MIME_SHM}, {ACCEPT_COLUNAR}" if shm_ativo() else ACCEPT_COLUNAR
+
+
+def negociar_formato(accept):
+    """Escolhe o formato de resposta a partir do cabeçalho Accept (JSON se nada colunar for aceito)."""
+    if pa is None or not accept:
+        return MIME_JSON
+    preferidos = []
+    for posicao, item in enumerate(accept.split(",")):
+        partes = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for parametro in partes[1:]:
+            if parametro.startswith("q="):
+                try:
+                    q = float(parametro[2:])
+                except ValueError:
+                    q = 0.0
+        preferidos.append((-q, posicao, partes[0].lower()))
+    for _, _, tipo in sorted(preferidos):
+        if tipo in (MIME_ARROW, MIME_PARQUET, MIME_JSON):
+            return tipo
+    return MIME_JSON
+
+
+def responder_dataframe(df, accept, headers=None):
+    """Serializa o DataFrame no formato negociado (Arrow IPC, Parquet ou JSON)."""
+    formato = negociar_formato(accept)
+    if formato == MIME_JSON:
+        # Ausentes (NaN em colunas numéricas ou categóricas) viram null
+        return JSONResponse(df.astype(object).where(df.notna(), None).to_dict(orient='records'), headers=headers)
+    return Response(content=serializar_dataframe(df, formato), media_type=formato, headers=headers)
+
+
+def responder_referencia_shm(segmentos, headers=None):
+    """Responde só a referência aos lotes publicados em memória compartilhada (ver `PublicadorShm`)."""
+    return Response(content=json.dumps({"segmentos": segmentos}), media_type=MIME_SHM, headers=headers)
+
+
+def ler_dataframe(response, colunas=None):
+    """Reconstrói o DataFrame de uma resposta HTTP de acordo com o Content-Type.
+
+    Nos formatos colunares e na referência em memória compartilhada, apenas `colunas` (se
+    informadas) são convertidas para pandas.
+    """
+    content_type = response.headers.get("content-type", "")
+    if content_type.split(";")[0].strip() == MIME_SHM:
+        return ler_segmentos(response.content, colunas)
+    if formato_colunar(content_type):
+        return ler_dataframe_bytes(response.content, content_type, colunas)
+    df = pd.DataFrame(response.json())
+    return df[colunas] if colunas and not df.empty else df
+
+
+def formato_colunar(content_type):
+    """Indica se o Content-Type é um formato colunar legível (Arrow IPC ou Parquet)."""
+    return pa is not None and content_type.split(";")[0].strip() in (MIME_ARROW, MIME_PARQUET)
+
+
+def ler_dataframe_bytes(conteudo, content_type, colunas=None):
+    """Lê um corpo Arrow IPC ou Parquet (de resposta ou requisição) como DataFrame."""
+    if content_type.split(";")[0].strip() == MIME_ARROW:
+        tabela = pa.ipc.open_stream(pa.py_buffer(conteudo)).read_all()
+    else:
+        tabela = pq.read_table(pa.BufferReader(conteudo), columns=colunas)
+    if colunas:
+        tabela = tabela.select(colunas)
+    return tabela.to_pandas()
+
+
+def serializar_dataframe(df, formato):
+    """Serializa o DataFrame em Arrow IPC ou Parquet (bytes)."""
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    buffer = io.BytesIO()
+    if formato == MIME_ARROW:
+        with pa.ipc.new_stream(buffer, tabela.schema) as writer:
+            writer.write_table(tabela)
+    else:
+        pq.write_table(tabela, buffer)
+    return buffer.getvalue()
+
+
+def impressao_digital(df, colunas):
+    """Hash rápido do conteúdo das colunas indicadas (identifica lotes repetidos)."""
+    hashes = pd.util.hash_pandas_object(df[colunas], index=False).to_numpy()
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
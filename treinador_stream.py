@@ -1,25 +1,75 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 import pandas as pd
-import requests
+import numpy as np
+import httpx
 import asyncio
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import SGDRegressor
 import joblib
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import os
 import uuid
+import json
 import time
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import functools
+from collections import deque
 from fastapi.middleware.cors import CORSMiddleware
+from transporte import ACCEPT_COLUNAR, ACCEPT_DADOS, MIME_JSON, formato_colunar, impressao_digital, ler_dataframe, ler_dataframe_bytes, negociar_formato, responder_dataframe
+from cliente_http import ClienteServico, URL_NORMALIZADOR, espera_backoff
+from micro_lote import AgrupadorPredicoes
+from registro_modelos import ArtefatoInvalido, RegistroModelos
+from armazenamento_dados import ArmazenamentoDados
+from eventos import MODO_PIPELINE, CanalEventos, Gatilho, assinar_eventos
+from metricas import RegistroMetricas, instrumentar
+from modelo_compartilhado import ARQUIVO_GERACAO, ARQUIVO_TREINO, INTERVALO_VERIFICACAO_MODELO, WORKERS_TREINADOR, ContadorGeracao, assumir_treino, caminho_floresta, exportar_floresta
+from sklearn.metrics import mean_squared_error, r2_score
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Código executado na inicialização
-    asyncio.create_task(treinar_modelo())
+    estado.cliente_normalizador = ClienteServico(URL_NORMALIZADOR)
+    estado.executor_predicao = ThreadPoolExecutor(max_workers=WORKERS_PREDICAO, thread_name_prefix="predicao")
+    estado.registro = RegistroModelos()
+    if WORKERS_TREINADOR > 1:
+        # Vários workers: só o que obtiver a trava treina; todos servem o modelo publicado no contador
+        estado.contador = ContadorGeracao(os.path.join(estado.registro.diretorio, ARQUIVO_GERACAO))
+        estado.trava_treino = assumir_treino(os.path.join(estado.registro.diretorio, ARQUIVO_TREINO))
+        estado.treina = estado.trava_treino is not None
+        logger.info(f"Worker {os.getpid()}: {'treina e prediz' if estado.treina else 'só prediz'}")
+    if JANELA_TEMPO_TREINO > 0 and estado.treina:
+        estado.armazenamento = ArmazenamentoDados()
+    await carregar_modelo_inicial()
+    tarefas = []
+    if estado.treina:
+        if TREINO_EM_PROCESSO:
+            estado.executor_treino = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        tarefas.append(asyncio.create_task(treinar_modelo()))
+        if MODO_PIPELINE == "push":
+            tarefas.append(asyncio.create_task(assinar_eventos(estado.cliente_normalizador, estado.gatilho)))
+    if estado.contador is not None:
+        tarefas.append(asyncio.create_task(acompanhar_geracao()))
+    if MICRO_LOTE:
+        estado.agrupador = AgrupadorPredicoes(prever_idades, estado.executor_predicao, MICRO_LOTE_TAMANHO, MICRO_LOTE_ESPERA_MS, WORKERS_PREDICAO)
+        tarefas.append(asyncio.create_task(estado.agrupador.executar()))
     yield
-    # Código executado no encerramento (se necessário)
+    # Código executado no encerramento
+    estado.eventos.fechar()
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await estado.cliente_normalizador.fechar()
+    if estado.armazenamento is not None:
+        estado.armazenamento.fechar()
+    estado.executor_predicao.shutdown(wait=False)
+    if estado.executor_treino is not None:
+        estado.executor_treino.shutdown(wait=False, cancel_futures=True)
+    if estado.contador is not None:
+        estado.contador.fechar()
 
 app = FastAPI(title="Treinador", lifespan=lifespan)
 logger = logging.getLogger(__name__)
@@ -34,15 +84,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class ModeloServido:
+    """Modelo treinado, parâmetros do scaler e tabela de predições, trocados juntos em estado.modelo_atual.
+
+    A tabela cobre todas as idades inteiras válidas (0 a IDADE_MAXIMA); com PASSO_GRADE > 0,
+    uma grade fina permite responder idades fracionárias por interpolação, sem tocar no sklearn.
+    """
+
+    def __init__(self, modelo, scaler, versao, passo_grade=0.0, timestamp=None):
+        self.modelo = modelo
+        self.scaler = scaler
+        self.versao = versao
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.tabela = self._prever_modelo(np.arange(IDADE_MAXIMA + 1, dtype=float))
+        self.grade_idades = self.grade_predicoes = None
+        if passo_grade > 0:
+            self.grade_idades = np.linspace(0, IDADE_MAXIMA, int(round(IDADE_MAXIMA / passo_grade)) + 1)
+            self.grade_predicoes = self._prever_modelo(self.grade_idades)
+
+    def _prever_modelo(self, idades):
+        return desnormalizar_salario(self.modelo.predict(normalizar_idade(idades, self.scaler).reshape(-1, 1)), self.scaler)
+
+    def responde_sem_modelo(self, idade):
+        """Indica se a idade pode ser respondida pela tabela/grade em O(1)."""
+        return float(idade).is_integer() or self.grade_idades is not None
+
+    def prever_uma(self, idade):
+        if float(idade).is_integer():
+            return self.tabela[int(idade)]
+        return np.interp(idade, self.grade_idades, self.grade_predicoes)
+
+    def prever(self, idades):
+        """Prediz um array de idades: inteiras pela tabela, fracionárias pela grade ou pelo modelo."""
+        inteiras = idades == np.floor(idades)
+        if inteiras.all():
+            return self.tabela[idades.astype(np.intp)]
+        resultado = np.empty_like(idades, dtype=float)
+        resultado[inteiras] = self.tabela[idades[inteiras].astype(np.intp)]
+        fracionarias = idades[~inteiras]
+        if self.grade_idades is not None:
+            resultado[~inteiras] = np.interp(fracionarias, self.grade_idades, self.grade_predicoes)
+        else:
+            resultado[~inteiras] = self._prever_modelo(fracionarias)
+        return resultado
+
 class EstadoTreinador:
     def __init__(self):
-        self.modelo_atual = None
+        self.modelo_atual = None  # ModeloServido
         self.ultima_atualizacao = None
         self.total_treinamentos = 0
         self.total_predicoes = 0
         self.status = "iniciando"
+        self.etag_normalizador = None  # ETag do último lote normalizado usado no treino
+        self.cliente_normalizador = None
+        self.executor_predicao = None
+        self.executor_treino = None  # processo dedicado ao fit (None = treino no event loop)
+        self.registro = None  # RegistroModelos de modelos/
+        self.impressao_dados = None  # impressão digital dos dados do último treino
+        self.ciclos_ignorados = 0  # ciclos sem treino (304 do normalizador ou dados repetidos)
+        self.acertos_impressao = 0  # dos ignorados, os que tinham a mesma impressão digital
+        self.janela = deque()  # lotes (X, y) recentes para o refit completo, limitados por JANELA_TREINO
+        self.armazenamento = None  # histórico normalizado em SQLite (quando JANELA_TEMPO_TREINO > 0)
+        self.agrupador = None  # micro-batching de /predict (None = predição direta)
+        self.gatilho = Gatilho()  # em modo push, disparado pelos eventos do normalizador
+        self.eventos = CanalEventos()  # avisa os assinantes de /eventos a cada troca de modelo
+        self.metricas = RegistroMetricas("treinador")  # exposto em /metrics
+        self.treina = True  # com WORKERS_TREINADOR > 1, só o worker com a trava de treino
+        self.trava_treino = None  # descritor da trava (mantido aberto enquanto o worker treina)
+        self.contador = None  # ContadorGeracao compartilhado pelos workers (None = um único processo)
+        self.geracao = None  # última geração do contador já aplicada neste worker
 
 estado = EstadoTreinador()
+instrumentar(app, estado.metricas)
 
 class PredictRequest(BaseModel):
     idade: int
@@ -58,71 +171,328 @@ class StatusResponse(BaseModel):
     total_treinamentos: int
     total_predicoes: int
     modelo_disponivel: bool
+    ciclos_ignorados: int
+    acertos_impressao: int
+    treina: bool
 
 INTERVALO_TREINAMENTO = int(os.environ.get("INTERVALO_TREINAMENTO", 60)) # segundos
+MAX_LOTE_PREDICAO = int(os.environ.get("MAX_LOTE_PREDICAO", 1_000_000)) # idades por chamada de /predict/batch
+MICRO_LOTE = os.environ.get("MICRO_LOTE", "1") == "1" # agrupa chamadas concorrentes de /predict
+MICRO_LOTE_TAMANHO = int(os.environ.get("MICRO_LOTE_TAMANHO", 256)) # máximo de idades por lote agrupado
+MICRO_LOTE_ESPERA_MS = float(os.environ.get("MICRO_LOTE_ESPERA_MS", 2)) # espera máxima para completar um lote
+WORKERS_PREDICAO = int(os.environ.get("WORKERS_PREDICAO", 2)) # threads que executam o predict
+IDADE_MAXIMA = 120
+PASSO_GRADE = float(os.environ.get("PASSO_GRADE", 0)) # passo da grade para idades fracionárias (0 = usa o modelo)
+TREINO_EM_PROCESSO = os.environ.get("TREINO_EM_PROCESSO", "1") == "1" # fit em processo separado do /predict
+N_ESTIMADORES = int(os.environ.get("N_ESTIMADORES", 100))
+N_JOBS_TREINO = int(os.environ.get("N_JOBS_TREINO", 1)) # n_jobs do RandomForestRegressor (-1 = todos os núcleos)
+MODO_TREINO = os.environ.get("MODO_TREINO", "completo") # "completo", "warm_start" ou "sgd"
+ARVORES_POR_LOTE = int(os.environ.get("ARVORES_POR_LOTE", 10)) # warm_start: árvores novas por lote (as mais antigas saem)
+JANELA_TREINO = int(os.environ.get("JANELA_TREINO", 0)) # completo: registros recentes usados no refit (0 = só o último lote)
+JANELA_TEMPO_TREINO = float(os.environ.get("JANELA_TEMPO_TREINO", 0)) # completo: segundos de histórico lidos do banco (0 = desativado)
+
+def normalizar_idade(idade, scaler):
+    """Aplica à idade bruta a mesma transformação usada pelo normalizador no treino."""
+    if scaler is None:
+        return idade
+    return (idade - scaler["media"]["idade"]) / scaler["escala"]["idade"]
+
+def desnormalizar_salario(valor, scaler):
+    """Converte a predição (salário normalizado) de volta para a escala original."""
+    if scaler is None:
+        return valor
+    return valor * scaler["escala"]["salario"] + scaler["media"]["salario"]
+
+def desnormalizar_idade(valor, scaler):
+    if scaler is None:
+        return valor
+    return valor * scaler["escala"]["idade"] + scaler["media"]["idade"]
+
+def normalizar_salario(salario, scaler):
+    if scaler is None:
+        return salario
+    return (salario - scaler["media"]["salario"]) / scaler["escala"]["salario"]
+
+def reescalar(X, y, origem, destino):
+    """Reexpressa idades e salários normalizados com o scaler `origem` na escala do scaler `destino`."""
+    if origem == destino:
+        return X, y
+    return normalizar_idade(desnormalizar_idade(X, origem), destino), normalizar_salario(desnormalizar_salario(y, origem), destino)
+
+def ajustar_e_salvar(X, y, modelo_path, n_estimadores, n_jobs, modo="completo", caminho_anterior=None, arvores_por_lote=ARVORES_POR_LOTE):
+    """Ajusta o modelo e o grava em disco; no modo em processo, o modelo volta ao servidor pelo arquivo.
+
+    Nos modos incrementais, parte do modelo em `caminho_anterior`: "warm_start" acrescenta
+    `arvores_por_lote` árvores ajustadas no lote e descarta as mais antigas além de `n_estimadores`;
+    "sgd" aplica `partial_fit` de um SGDRegressor. Retorna as métricas de treino, com as durações
+    do ajuste e do `joblib.dump` (medidas aqui, já que podem rodar em outro processo).
+    """
+    inicio = time.perf_counter()
+    anterior = joblib.load(caminho_anterior) if modo != "completo" and caminho_anterior else None
+    if modo == "sgd":
+        modelo = anterior if isinstance(anterior, SGDRegressor) else SGDRegressor(random_state=42)
+        modelo.partial_fit(X, y)
+    elif modo == "warm_start" and isinstance(anterior, RandomForestRegressor):
+        modelo = anterior
+        if not isinstance(modelo.random_state, np.random.RandomState):
+            # Com semente int e estimators_ podado a n_estimadores, todo ciclo sortearia as mesmas
+            # sementes; o RandomState avança a cada fit e é gravado com o modelo
+            modelo.set_params(random_state=np.random.RandomState(modelo.random_state))
+        modelo.set_params(warm_start=True, n_jobs=n_jobs, n_estimators=len(modelo.estimators_) + arvores_por_lote)
+        modelo.fit(X, y)
+        if len(modelo.estimators_) > n_estimadores:
+            modelo.estimators_ = modelo.estimators_[-n_estimadores:]
+            modelo.n_estimators = n_estimadores
+    else:
+        modelo = RandomForestRegressor(n_estimators=n_estimadores, random_state=42, n_jobs=n_jobs)
+        modelo.fit(X, y)
+    fim_ajuste = time.perf_counter()
+    joblib.dump(modelo, modelo_path)
+    exportar_floresta(modelo, caminho_floresta(modelo_path))  # o que os workers mapeiam para predizer
+    fim_dump = time.perf_counter()
+    y_pred = modelo.predict(X)
+    return {
+        "mse_treino": float(mean_squared_error(y, y_pred)),
+        "r2_treino": float(r2_score(y, y_pred)),
+        "n_amostras": int(len(y)),
+        "modo": modo,
+        "tempo_ajuste_s": fim_ajuste - inicio,
+        "tempo_dump_s": fim_dump - fim_ajuste
+    }
+
+async def dados_de_treino(X, y, scaler):
+    """Devolve (X, y, scaler, caminho_anterior) do próximo ajuste, com X e y na escala do scaler devolvido.
+
+    Cada lote chega normalizado com o scaler do seu momento, que muda entre lotes (online) ou é
+    refeito a cada lote (MODO_NORMALIZACAO=lote). O refit completo guarda a janela em memória em
+    valores brutos e a normaliza com o scaler do lote atual. Os modos incrementais continuam um
+    modelo ajustado em outra escala: o lote é convertido para o scaler desse modelo, que segue
+    fixo para o conjunto de árvores (ou coeficientes) até um modelo novo começar do zero.
+    """
+    if MODO_TREINO != "completo":
+        anterior = modelo_anterior()
+        if anterior is None or (anterior["scaler"] is None) != (scaler is None):
+            return X, y, scaler, None  # sem modelo compatível: começa um novo na escala do lote
+        X, y = reescalar(X, y, scaler, anterior["scaler"])
+        return X, y, anterior["scaler"], estado.registro.caminho(anterior["versao"])
+    if estado.armazenamento is not None:
+        desde = (datetime.now() - timedelta(seconds=JANELA_TEMPO_TREINO)).isoformat()
+        loop = asyncio.get_running_loop()
+        historico = await loop.run_in_executor(estado.armazenamento.executor, functools.partial(
+            estado.armazenamento.ler_janela, "registros_normalizados", desde=desde, colunas=["idade_bruta", "salario_bruto"]
+        ))
+        # Valores brutos normalizados com o scaler atual (linhas de versões sem as colunas brutas ficam de fora)
+        historico = historico.dropna()
+        if len(historico) >= len(y):
+            return normalizar_idade(historico[["idade_bruta"]].values, scaler), normalizar_salario(historico["salario_bruto"].values, scaler), scaler, None
+        logger.warning(f"Janela de {JANELA_TEMPO_TREINO:.0f} s no banco tem {len(historico)} registros (lote atual: {len(y)}). Usando a janela em memória.")
+    estado.janela.append((desnormalizar_idade(X, scaler), desnormalizar_salario(y, scaler)))
+    while len(estado.janela) > 1 and sum(len(lote_y) for _, lote_y in estado.janela) > JANELA_TREINO:
+        estado.janela.popleft()
+    X = np.concatenate([lote_x for lote_x, _ in estado.janela])
+    y = np.concatenate([lote_y for _, lote_y in estado.janela])
+    return normalizar_idade(X, scaler), normalizar_salario(y, scaler), scaler, None
+
+def modelo_anterior():
+    """Entrada do último modelo treinado (ponto de partida dos modos incrementais)."""
+    treinados = [entrada for entrada in estado.registro.listar() if entrada["status"] == "ok"]
+    return treinados[0] if treinados else None
+
+def carregar_servido(versao):
+    """Carrega a versão registrada (a floresta exportada, mapeada do disco) e materializa a tabela de predições."""
+    entrada = estado.registro.indice["modelos"][versao]
+    modelo = estado.registro.carregar(versao)
+    try:
+        return ModeloServido(modelo, entrada["scaler"], versao, PASSO_GRADE, entrada["timestamp"])
+    except (ValueError, TypeError, AttributeError, KeyError) as e:
+        # Desserializou, mas não prediz com o scaler registrado (modelo ou parâmetros incompatíveis)
+        raise ArtefatoInvalido(f"{versao}: {e!r}") from e
+
+def trocar_modelo(servido, publicar=True):
+    # Modelo, scaler e tabela mudam juntos em uma única atribuição
+    estado.modelo_atual = servido
+    estado.ultima_atualizacao = servido.timestamp
+    estado.eventos.publicar("modelo", {"modelo_versao": servido.versao, "timestamp": servido.timestamp})
+    if publicar and estado.contador is not None:
+        # Avisa os outros workers; esta geração já está aplicada aqui
+        estado.geracao = estado.contador.publicar(servido.versao)
+
+async def acompanhar_geracao():
+    """Com vários workers: passa a servir a versão que outro worker publicou no contador de geração.
+
+    A verificação lê 8 bytes mapeados em memória; só quando a geração muda o índice é relido
+    e o modelo carregado (fora do event loop).
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INTERVALO_VERIFICACAO_MODELO)
+        if estado.contador.geracao == estado.geracao:
+            continue
+        lido = estado.contador.ler()
+        if lido is None:  # publicação em andamento
+            continue
+        geracao, versao = lido
+        if versao is not None and (estado.modelo_atual is None or estado.modelo_atual.versao != versao):
+            try:
+                estado.registro.recarregar()
+                servido = await loop.run_in_executor(estado.executor_predicao, carregar_servido, versao)
+            except Exception as e:
+                logger.error(f"Falha ao carregar o modelo {versao} publicado por outro worker: {e}")
+            else:
+                trocar_modelo(servido, publicar=False)
+                logger.info(f"Modelo {versao} (geração {geracao}) publicado por outro worker carregado")
+        estado.geracao = geracao
+
+async def carregar_modelo_inicial():
+    """Na inicialização, serve a versão fixada ou a mais recente válida do registro."""
+    loop = asyncio.get_running_loop()
+    for entrada in estado.registro.candidatos():
+        try:
+            servido = await loop.run_in_executor(estado.executor_predicao, carregar_servido, entrada["versao"])
+        except ArtefatoInvalido as e:
+            logger.error(f"Modelo {entrada['versao']} inválido: {e}. Marcado como corrompido; tentando a versão anterior.")
+            estado.registro.marcar_corrompido(entrada["versao"])
+            continue
+        except Exception as e:
+            logger.error(f"Falha ao carregar o modelo {entrada['versao']}: {e}. Tentando a versão anterior.")
+            continue
+        trocar_modelo(servido, publicar=estado.treina)
+        estado.impressao_dados = entrada.get("impressao")
+        logger.info(f"Modelo {servido.versao} ({entrada['timestamp']}) carregado do registro")
+        return
+    logger.info("Nenhum modelo registrado; aguardando o primeiro treinamento")
+
+async def treinar_e_trocar(X, y, scaler, treinamento_id, impressao=None):
+    """Treina fora do event loop, registra a versão e troca o modelo servido; retorna o caminho do modelo."""
+    modelo_path = os.path.join(estado.registro.diretorio, f"modelo_{treinamento_id}.joblib")
+    loop = asyncio.get_running_loop()
+    X, y, scaler, caminho_anterior = await dados_de_treino(X, y, scaler)
+    ajuste = functools.partial(
+        ajustar_e_salvar, X, y, modelo_path, N_ESTIMADORES, N_JOBS_TREINO,
+        modo=MODO_TREINO, caminho_anterior=caminho_anterior
+    )
+    if estado.executor_treino is not None:
+        metricas = await loop.run_in_executor(estado.executor_treino, ajuste)
+    else:
+        metricas = ajuste()
+    estado.metricas.observar_estagio("ajuste", metricas["tempo_ajuste_s"])
+    estado.metricas.observar_estagio("dump_modelo", metricas["tempo_dump_s"])
+    estado.registro.registrar(treinamento_id, modelo_path, metricas, scaler, impressao)
+
+    if estado.registro.fixado is not None:
+        logger.info(f"Versão {estado.registro.fixado} fixada; modelo {treinamento_id} registrado mas não servido")
+        return modelo_path
+    if estado.executor_treino is not None:
+        servido = await loop.run_in_executor(estado.executor_predicao, carregar_servido, treinamento_id)
+    else:
+        servido = carregar_servido(treinamento_id)
+    trocar_modelo(servido)
+    return modelo_path
+
+def prever_idades(idades):
+    """Prediz salários (escala original) para um array de idades brutas."""
+    return estado.modelo_atual.prever(idades)
+
+def scaler_do_lote(response):
+    """Parâmetros do scaler enviados com o lote em /dados_normalizados (None se o normalizador não os enviar)."""
+    cabecalho = response.headers.get("X-Scaler")
+    return json.loads(cabecalho) if cabecalho else None
+
+async def obter_scaler():
+    """Busca os parâmetros do scaler no normalizador (None se indisponível)."""
+    try:
+        response = await estado.cliente_normalizador.get("/scaler")
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        logger.warning(f"Parâmetros do scaler indisponíveis; /predict usará a escala normalizada. Detalhes: {e}")
+        return None
 
 async def treinar_modelo():
-    os.makedirs("modelos", exist_ok=True)
     while True:
         try:
             treinamento_id = str(uuid.uuid4())
             logger.info(f"Treinamento ID: {treinamento_id} - Iniciando treinamento do modelo.")
-            logger.info("Tentando conectar ao normalizador em http://localhost:8002")
+            logger.info(f"Tentando conectar ao normalizador em {URL_NORMALIZADOR}")
 
             # Verificação de status do normalizador
             for attempt in range(3):
                 try:
                     logger.info(f"Tentativa {attempt+1}/3 de conexão com o normalizador")
-                    status_response = requests.get("http://localhost:8002/status", timeout=5)
+                    status_response = await estado.cliente_normalizador.get("/status")
                     status_response.raise_for_status()
                     status = status_response.json()
                     if status["status"] == "ativo":
                         logger.info("Conexão com normalizador estabelecida com sucesso")
-                        dados_response = requests.get("http://localhost:8002/dados_normalizados", timeout=5)
+                        headers = {"Accept": ACCEPT_DADOS}
+                        if estado.etag_normalizador:
+                            headers["If-None-Match"] = estado.etag_normalizador
+                        dados_response = await estado.cliente_normalizador.get("/dados_normalizados", headers=headers)
+                        if dados_response.status_code == 304:
+                            estado.ciclos_ignorados += 1
+                            logger.info("Dados normalizados inalterados desde o último treino. Treinamento ignorado.")
+                            break
                         dados_response.raise_for_status()
-                        dados_normalizados = dados_response.json()
+                        try:
+                            df = ler_dataframe(dados_response, colunas=['idade', 'salario'])
+                        except FileNotFoundError:
+                            # Lote já descartado da memória compartilhada: pede os dados no corpo da resposta
+                            dados_response = await estado.cliente_normalizador.get("/dados_normalizados", headers={"Accept": ACCEPT_COLUNAR})
+                            dados_response.raise_for_status()
+                            df = ler_dataframe(dados_response, colunas=['idade', 'salario'])
                         
-                        if not dados_normalizados:
+                        if df.empty:
                             logger.warning("Nenhum dado normalizado disponível. Aguardando próximo ciclo.")
-                            await asyncio.sleep(INTERVALO_TREINAMENTO)
+                            await estado.gatilho.aguardar(INTERVALO_TREINAMENTO)
                             continue
                             
+                        impressao = impressao_digital(df, ['idade', 'salario'])
+                        if impressao == estado.impressao_dados:
+                            # Mesmo lote do último treino (ex.: normalizador reiniciado): mantém o modelo atual
+                            estado.etag_normalizador = dados_response.headers.get("ETag")
+                            estado.ciclos_ignorados += 1
+                            estado.acertos_impressao += 1
+                            logger.info(f"Dados idênticos aos do último treino (impressão {impressao}). Treinamento ignorado.")
+                            break
+
+                        scaler = scaler_do_lote(dados_response)
+                        if scaler is None:
+                            scaler = await obter_scaler()
+                            lote_id = (dados_response.headers.get("ETag") or "").strip('"')
+                            if scaler is not None and scaler.get("normalizacao_id") != lote_id:
+                                # Outro lote foi normalizado entre as duas requisições: busca lote e scaler de novo
+                                logger.warning(f"Scaler do lote {scaler.get('normalizacao_id')} não corresponde aos dados ({lote_id}). Buscando novamente.")
+                                continue
+
                         # Processamento dos dados normalizados
-                        df = pd.DataFrame(dados_normalizados)
                         X = df[['idade']].values
                         y = df['salario'].values
                         
-                        # Treinamento do modelo
-                        modelo = RandomForestRegressor(n_estimators=100, random_state=42)
-                        modelo.fit(X, y)
-                        
-                        # Salvar o modelo
-                        modelo_path = os.path.join("modelos", f"modelo_{treinamento_id}.joblib")
-                        joblib.dump(modelo, modelo_path)
-                        
-                        estado.modelo_atual = modelo
-                        estado.ultima_atualizacao = datetime.now().isoformat()
+                        # Treinamento (em processo separado) e troca do modelo servido
+                        modelo_path = await treinar_e_trocar(X, y, scaler, treinamento_id, impressao)
+                        estado.etag_normalizador = dados_response.headers.get("ETag")
+                        estado.impressao_dados = impressao
                         estado.total_treinamentos += 1
                         
                         logger.info(f"Modelo treinado e salvo com sucesso: {modelo_path}")
                         break
                         
                     logger.warning(f"Normalizador não está ativo. Status atual: {status['status']}")
-                    time.sleep(5)
+                    await asyncio.sleep(espera_backoff(attempt))
                     
-                except requests.exceptions.ConnectionError as e:
-                    logger.error(f"Erro de conexão: Verifique se o normalizador está rodando na porta 8002. Detalhes: {str(e)}")
-                    time.sleep(5)
-                except requests.exceptions.RequestException as e:
+                except httpx.TransportError as e:
+                    logger.error(f"Erro de conexão: Verifique se o normalizador está rodando em {URL_NORMALIZADOR}. Detalhes: {str(e)}")
+                    await asyncio.sleep(espera_backoff(attempt))
+                except httpx.HTTPError as e:
                     logger.error(f"Erro ao acessar o normalizador: {str(e)}")
-                    time.sleep(5)
+                    await asyncio.sleep(espera_backoff(attempt))
             else:
                 logger.error("Normalizador indisponível após múltiplas tentativas. Aguardando próximo ciclo.")
                 
         except Exception as e:
             logger.exception(f"Erro inesperado durante o treinamento: {str(e)}")
             
-        await asyncio.sleep(INTERVALO_TREINAMENTO)
+        await estado.gatilho.aguardar(INTERVALO_TREINAMENTO)
 
 @app.post("/predict")
 async def predict(dados: dict):
@@ -149,14 +519,20 @@ async def predict(dados: dict):
                 detail="Idade deve ser um número"
             )
             
-        if idade < 0 or idade > 120:
+        if idade < 0 or idade > IDADE_MAXIMA:
             raise HTTPException(
                 status_code=400, 
                 detail="Idade deve estar entre 0 e 120 anos"
             )
             
-        # Fazer predição
-        predicao = estado.modelo_atual.predict([[idade]])[0]
+        # Fazer predição (idade e salário na escala original)
+        servido = estado.modelo_atual
+        if servido.responde_sem_modelo(idade):
+            predicao = servido.prever_uma(idade)
+        elif estado.agrupador is not None:
+            predicao = await estado.agrupador.prever(idade)
+        else:
+            predicao = servido.prever(np.array([idade], dtype=float))[0]
         
         # Incrementar contador de predições
         estado.total_predicoes += 1
@@ -166,7 +542,8 @@ async def predict(dados: dict):
             "predicao": float(predicao),
             "idade": idade,
             "timestamp": datetime.now().isoformat(),
-            "modelo_id": estado.ultima_atualizacao
+            "modelo_id": servido.timestamp,
+            "modelo_versao": servido.versao
         }
         
     except HTTPException:
@@ -178,6 +555,121 @@ async def predict(dados: dict):
             detail=f"Erro ao realizar predição: {str(e)}"
         )
 
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    """Prediz um lote de idades com uma única chamada vetorizada ao modelo.
+
+    Aceita JSON ({"idades": [...]}) ou uma tabela Arrow IPC/Parquet com a coluna 'idade';
+    a resposta segue o cabeçalho Accept (JSON ou tabela com as colunas 'idade' e 'predicao').
+    """
+    try:
+        if estado.modelo_atual is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Modelo ainda não está disponível"
+            )
+
+        corpo = await request.body()
+        content_type = request.headers.get("content-type", "")
+        if formato_colunar(content_type):
+            tabela = ler_dataframe_bytes(corpo, content_type)
+            if "idade" not in tabela.columns:
+                raise HTTPException(status_code=400, detail="Coluna 'idade' é obrigatória")
+            idades = tabela["idade"]
+        else:
+            dados = json.loads(corpo or b"{}")
+            if not isinstance(dados, dict) or "idades" not in dados:
+                raise HTTPException(status_code=400, detail="Campo 'idades' é obrigatório")
+            idades = dados["idades"]
+
+        try:
+            idades = np.asarray(idades, dtype=float).ravel()
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Idades devem ser números")
+
+        if idades.size == 0:
+            raise HTTPException(status_code=400, detail="Lista de idades vazia")
+        if idades.size > MAX_LOTE_PREDICAO:
+            raise HTTPException(status_code=413, detail=f"Lote excede o máximo de {MAX_LOTE_PREDICAO} idades")
+        if np.isnan(idades).any() or (idades < 0).any() or (idades > IDADE_MAXIMA).any():
+            raise HTTPException(status_code=400, detail="Idades devem estar entre 0 e 120 anos")
+
+        servido = estado.modelo_atual
+        predicoes = await asyncio.get_running_loop().run_in_executor(estado.executor_predicao, servido.prever, idades)
+        estado.total_predicoes += int(idades.size)
+
+        accept = request.headers.get("accept")
+        if negociar_formato(accept) == MIME_JSON:
+            return {
+                "predicoes": predicoes.tolist(),
+                "total": int(idades.size),
+                "timestamp": datetime.now().isoformat(),
+                "modelo_id": servido.timestamp,
+                "modelo_versao": servido.versao
+            }
+        return responder_dataframe(
+            pd.DataFrame({"idade": idades, "predicao": predicoes}),
+            accept,
+            headers={"X-Modelo-Id": servido.timestamp, "X-Modelo-Versao": servido.versao}
+        )
+
+    except HTTPException:
+        raise
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    except Exception as e:
+        logger.exception("Erro durante predição em lote")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao realizar predição em lote: {str(e)}"
+        )
+
+@app.get("/modelos")
+async def listar_modelos():
+    """Lista as versões registradas com metadados (timestamp, métricas, tamanho)."""
+    if estado.contador is not None:
+        estado.registro.recarregar()  # versões registradas pelo worker que treina
+    return {
+        "servido": estado.modelo_atual.versao if estado.modelo_atual is not None else None,
+        "fixado": estado.registro.fixado,
+        "modelos": [
+            {chave: valor for chave, valor in entrada.items() if chave != "scaler"}
+            for entrada in estado.registro.listar()
+        ]
+    }
+
+@app.post("/modelos/{versao}/fixar")
+async def fixar_modelo(versao: str):
+    """Passa a servir a versão indicada e a mantém até ser desafixada (novos treinos só são registrados)."""
+    if estado.contador is not None:
+        estado.registro.recarregar()
+    entrada = estado.registro.indice["modelos"].get(versao)
+    if entrada is None:
+        raise HTTPException(status_code=404, detail=f"Modelo {versao} não encontrado")
+    if entrada["status"] != "ok":
+        raise HTTPException(status_code=409, detail=f"Modelo {versao} não pode ser servido (status: {entrada['status']})")
+    try:
+        servido = await asyncio.get_running_loop().run_in_executor(estado.executor_predicao, carregar_servido, versao)
+    except ArtefatoInvalido as e:
+        estado.registro.marcar_corrompido(versao)
+        raise HTTPException(status_code=500, detail=f"Modelo {versao} inválido: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Erro ao carregar o modelo {versao}: {e}")
+    estado.registro.fixar(versao)
+    trocar_modelo(servido)
+    return {"servido": versao, "fixado": versao}
+
+@app.delete("/modelos/fixado")
+async def desafixar_modelo():
+    """Remove a fixação: o próximo treino volta a substituir o modelo servido."""
+    estado.registro.fixar(None)
+    return {"servido": estado.modelo_atual.versao if estado.modelo_atual is not None else None, "fixado": None}
+
+@app.get("/eventos")
+async def get_eventos():
+    """Stream SSE com um evento `modelo` a cada troca do modelo servido (usado pelo consumidor em modo push)."""
+    return estado.eventos.resposta()
+
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
     return {
@@ -185,8 +677,11 @@ async def get_status():
         "ultima_atualizacao": estado.ultima_atualizacao or datetime.now().isoformat(),
         "total_treinamentos": estado.total_treinamentos,
         "total_predicoes": estado.total_predicoes,
-        "modelo_disponivel": estado.modelo_atual is not None
+        "modelo_disponivel": estado.modelo_atual is not None,
+        "ciclos_ignorados": estado.ciclos_ignorados,
+        "acertos_impressao": estado.acertos_impressao,
+        "treina": estado.treina
     }
 
 if __name__ == "__main__":
-    uvicorn.run("treinador_stream:app", host="0.0.0.0", port=12779, reload=False)
+    uvicorn.run("treinador_stream:app", host="0.0.0.0", port=12779, reload=False, workers=WORKERS_TREINADOR)